@@ -0,0 +1,214 @@
+"""Run feedmailer end to end against synthetic feeds and write a JSON report.
+
+Run with: python -m benchmarks.end_to_end --feeds 200 --output report.json
+
+Every repetition runs main.py twice in a fresh interpreter, with a new status
+file: a cold run that mails every entry, and a warm run on the status the cold
+run left, with nothing new. Mail goes to a local SMTP server. The report has
+the median wall time, peak RSS and feeds per second of each scenario, and the
+phase timings feedmailer recorded; pass --compare with an earlier report to
+print the changes against it.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import FeedServer, make_feeds
+from feedmailer.tests.smtp_server import LocalSMTPServer
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(__file__)), "main.py")
+SCENARIOS = ("cold", "warm")
+# Report keys compared by --compare, and whether higher is better.
+COMPARED = {"wall": False, "peak_rss_kb": False, "feeds_per_sec": True}
+
+
+def _write_config(directory, urls, smtp_port, args):
+    path = os.path.join(directory, "config.json")
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "urls": urls,
+                "from": "feedmailer@localhost",
+                "to": "benchmark@localhost",
+                "mail_backend": "smtp",
+                "smtp": {"host": "127.0.0.1", "port": smtp_port, "use_tls": False},
+                "fetch": {
+                    "max_concurrency": args.concurrency,
+                    "max_per_host": args.concurrency,
+                },
+                "parse": {"engine": args.engine, "executor": args.executor},
+                "storage": {"backend": args.storage},
+                "metrics": {"json": os.path.join(directory, "metrics.json")},
+            },
+            f,
+        )
+    return path
+
+
+def _run_main(config, status):
+    """Run main.py; return its wall time in seconds and peak RSS in KB."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, MAIN, config, status])
+    _, wait_status, rusage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(wait_status)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    divisor = 1024 if sys.platform == "darwin" else 1
+    return wall, rusage.ru_maxrss // divisor
+
+
+async def _run_scenario(directory, config, status, server, smtp_server):
+    requests = server.requests
+    messages = len(smtp_server.messages)
+    wall, peak_rss_kb = await asyncio.get_running_loop().run_in_executor(
+        None, _run_main, config, status
+    )
+    with open(os.path.join(directory, "metrics.json")) as f:
+        metrics = json.load(f)
+    feeds = len(server.feeds)
+    return {
+        "wall": wall,
+        "peak_rss_kb": peak_rss_kb,
+        "feeds_per_sec": feeds / wall,
+        "requests": server.requests - requests,
+        "errors": sum("error" in record for record in metrics["feeds"].values()),
+        "new_entries": sum(
+            record.get("new_entries", 0) for record in metrics["feeds"].values()
+        ),
+        "mails": len(smtp_server.messages) - messages,
+        "phases": metrics["phases"],
+    }
+
+
+def _summarize(runs):
+    phases = sorted({phase for run in runs for phase in run["phases"]})
+    summary = {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("wall", "peak_rss_kb", "feeds_per_sec")
+    }
+    summary["phases"] = {
+        phase: statistics.median(run["phases"].get(phase, 0) for run in runs)
+        for phase in phases
+    }
+    summary["runs"] = runs
+    return summary
+
+
+async def _run(args):
+    feeds = make_feeds(args.feeds, args.entries, args.summary_size, args.atom_ratio)
+    runs = {scenario: [] for scenario in SCENARIOS}
+    server = FeedServer(
+        feeds,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        etag=True,
+        seed=args.seed,
+    )
+    async with server:
+        with LocalSMTPServer() as smtp_server:
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as directory:
+                    config = _write_config(
+                        directory, server.urls, smtp_server.port, args
+                    )
+                    status = os.path.join(directory, "status")
+                    for scenario in SCENARIOS:
+                        runs[scenario].append(
+                            await _run_scenario(
+                                directory, config, status, server, smtp_server
+                            )
+                        )
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+        "scenarios": {scenario: _summarize(runs[scenario]) for scenario in SCENARIOS},
+    }
+
+
+def _print_report(report):
+    for scenario, summary in report["scenarios"].items():
+        phases = ", ".join(
+            f"{phase} {seconds:.3f}s" for phase, seconds in summary["phases"].items()
+        )
+        print(
+            f"{scenario:>5}: {summary['wall']:7.3f}s, "
+            f"{summary['peak_rss_kb'] / 1024:6.1f} MB peak RSS, "
+            f"{summary['feeds_per_sec']:8.1f} feeds/s ({phases})"
+        )
+
+
+def _compare(baseline, report):
+    if baseline["parameters"] != report["parameters"]:
+        print("Warning: the baseline was run with other parameters")
+    for scenario, summary in report["scenarios"].items():
+        if scenario not in baseline["scenarios"]:
+            continue
+        before = baseline["scenarios"][scenario]
+        for key, higher_is_better in COMPARED.items():
+            change = (summary[key] - before[key]) / before[key] * 100
+            better = (change > 0) == higher_is_better
+            print(
+                f"{scenario:>5} {key:>13}: {before[key]:10.3f} -> "
+                f"{summary[key]:10.3f} ({change:+6.1f}%"
+                f"{', better' if better and change else ''})"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--feeds", type=int, default=100)
+    parser.add_argument("--entries", type=int, default=50)
+    parser.add_argument("--summary-size", type=int, default=500)
+    parser.add_argument(
+        "--atom-ratio", type=float, default=0.5, help="fraction of Atom feeds"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds before each response"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of the feeds answering with HTTP 500",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--engine", choices=("feedparser", "native"), default="native")
+    parser.add_argument(
+        "--executor", choices=("none", "thread", "process"), default="thread"
+    )
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="an earlier report to compare with")
+    args = parser.parse_args()
+
+    report = asyncio.run(_run(args))
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            _compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
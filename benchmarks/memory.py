@@ -0,0 +1,62 @@
+"""Measure the memory a run with many new entries holds on to.
+
+Run with: python -m benchmarks.memory --feeds 100 --entries 100
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+
+from benchmarks.synthetic import FeedServer, make_rss
+from feedmailer.config import Config
+from feedmailer.feed_processor import FeedProcessor
+
+
+def _config(urls, engine):
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(
+            {
+                "urls": urls,
+                "fetch": {"max_concurrency": 50, "max_per_host": 50},
+                "parse": {"engine": engine, "executor": "none"},
+            },
+            f,
+        )
+    try:
+        return Config(f.name)
+    finally:
+        os.unlink(f.name)
+
+
+async def _run(args):
+    feeds = [make_rss(i, args.entries, args.summary_size) for i in range(args.feeds)]
+    async with FeedServer(feeds) as server:
+        print(f"{args.feeds} feeds, {args.entries} new entries each")
+        for engine in ("feedparser", "native"):
+            processor = FeedProcessor(_config(server.urls, engine), set())
+            gc.collect()
+            tracemalloc.start()
+            await processor.collect_async()
+            gc.collect()
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"{engine:>10}: {retained / 1024 / 1024:7.1f} MB retained, "
+                f"{peak / 1024 / 1024:7.1f} MB peak, {len(processor.found)} entries"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--feeds", type=int, default=100)
+    parser.add_argument("--entries", type=int, default=100)
+    parser.add_argument("--summary-size", type=int, default=2000)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
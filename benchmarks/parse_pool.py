@@ -0,0 +1,60 @@
+"""Compare wall-clock time of FeedProcessor with and without a parse pool.
+
+Run with: python -m benchmarks.parse_pool --feeds 200 --entries 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import FeedServer, make_rss
+from feedmailer.config import Config
+from feedmailer.feed_processor import FeedProcessor
+
+
+def _config(urls, executor, workers):
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(
+            {
+                "urls": urls,
+                "fetch": {"max_concurrency": 50, "max_per_host": 50},
+                "parse": {"executor": executor, "workers": workers},
+            },
+            f,
+        )
+    try:
+        return Config(f.name)
+    finally:
+        os.unlink(f.name)
+
+
+async def _run(args):
+    feeds = [make_rss(i, args.entries) for i in range(args.feeds)]
+    async with FeedServer(feeds, latency=args.latency) as server:
+        print(f"{args.feeds} feeds, {args.entries} entries each")
+        for executor in ("none", "thread", "process"):
+            config = _config(server.urls, executor, args.workers)
+            processor = FeedProcessor(config, set())
+            start = time.perf_counter()
+            await processor.collect_async()
+            elapsed = time.perf_counter() - start
+            print(
+                f"{executor:>8}: {elapsed:7.3f}s, {len(processor.found)} entries, "
+                f"{len(processor.context['zero_links'])} errors"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--feeds", type=int, default=100)
+    parser.add_argument("--entries", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=None)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
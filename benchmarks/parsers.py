@@ -0,0 +1,63 @@
+"""Compare the throughput of the feedparser and native feed parsers.
+
+Run with: python -m benchmarks.parsers --corpus path/to/recorded/feeds
+Without a corpus, synthetic feeds are parsed.
+"""
+
+import argparse
+import os
+import time
+
+from benchmarks.synthetic import make_rss
+from feedmailer.utils.feed_parsers.native import NativeParser
+from feedmailer.utils.feed_parsers.universal import UniversalParser
+
+
+def load_corpus(path):
+    """Read every file in path as a recorded feed."""
+    feeds = []
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), "rb") as f:
+            feeds.append(f.read())
+    return feeds
+
+
+def measure(parser, feeds, repeat):
+    """Return the best time of parsing all feeds, and the entries found."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        entries = sum(len(parser.parse(content).entries) for content in feeds)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="Directory of recorded feed documents")
+    parser.add_argument("--feeds", type=int, default=50)
+    parser.add_argument("--entries", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        feeds = load_corpus(args.corpus)
+    else:
+        feeds = [make_rss(i, args.entries) for i in range(args.feeds)]
+    size = sum(map(len, feeds)) / 1024 / 1024
+    print(f"{len(feeds)} feeds, {size:.1f} MB")
+
+    for name, feed_parser in (
+        ("feedparser", UniversalParser()),
+        ("native", NativeParser()),
+    ):
+        elapsed, entries = measure(feed_parser, feeds, args.repeat)
+        print(
+            f"{name:>10}: {elapsed:7.3f}s, {len(feeds) / elapsed:8.1f} feeds/s, "
+            f"{size / elapsed:6.2f} MB/s, {entries} entries"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Measure how long rendering the email templates takes.
+
+Run with: python -m benchmarks.render --processors 1000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from feedmailer.feed_processor import Entry, FeedProcessor
+
+FIRST_RENDER = """
+import time
+start = time.perf_counter()
+from benchmarks.render import render
+imported = time.perf_counter()
+render()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def render():
+    """Render both templates of a small digest with a new processor."""
+    processor = FeedProcessor(mock.Mock(urls=[]), set())
+    processor.context["feeds"] = [
+        {
+            "name": "Feed",
+            "entries": [
+                Entry(f"https://example.com/{n}", f"Entry {n}") for n in range(10)
+            ],
+        }
+    ]
+    return processor.as_html(), processor.as_text()
+
+
+def first_render(env):
+    """Seconds a fresh interpreter takes to import feedmailer and to render."""
+    output = subprocess.run(
+        [sys.executable, "-c", FIRST_RENDER],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return [float(seconds) for seconds in output.split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processors", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # A fresh temporary directory gives an empty bytecode cache.
+        env = dict(os.environ, TMPDIR=cache_dir)
+        for cache in ("cold", "warm"):
+            imported, rendered = first_render(env)
+            print(
+                f"first render, {cache} cache: {imported * 1000:7.1f} ms import, "
+                f"{rendered * 1000:7.1f} ms render"
+            )
+
+    start = time.perf_counter()
+    for _ in range(args.processors):
+        render()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{args.processors} processors: {elapsed:7.3f}s, "
+        f"{elapsed / args.processors * 1000:.2f} ms per digest"
+    )
+
+
+if __name__ == "__main__":
+    main()
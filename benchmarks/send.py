@@ -0,0 +1,68 @@
+"""Measure the peak memory of rendering and sending one large digest.
+
+Run with: python -m benchmarks.send --entries 20000
+"""
+
+import argparse
+import gc
+import os
+import tracemalloc
+from unittest import mock
+
+from feedmailer.feed_processor import Entry, FeedProcessor
+from feedmailer.utils.mail_backends.sendmail import SendmailBackend
+
+
+class _NullSendmail:
+    """Stands in for the sendmail process, discarding what it is sent."""
+
+    def __init__(self, *args, **kwargs):
+        self.stdin = open(os.devnull, "wb")
+
+    def wait(self):
+        return 0
+
+
+def _processor(entries):
+    processor = FeedProcessor(mock.Mock(urls=[]), set())
+    processor.context["feeds"] = [
+        {
+            "name": f"Feed {feed}",
+            "entries": [
+                Entry(
+                    f"https://example.com/{feed}/{n}",
+                    f"Entry {n} of feed {feed}, with a longer title",
+                )
+                for n in range(entries // 10)
+            ],
+        }
+        for feed in range(10)
+    ]
+    return processor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20000)
+    args = parser.parse_args()
+
+    processor = _processor(args.entries)
+    backend = SendmailBackend()
+    print(f"digest of {args.entries} entries")
+    for mode in ("rendered", "streamed"):
+        gc.collect()
+        tracemalloc.start()
+        with mock.patch("subprocess.Popen", _NullSendmail):
+            if mode == "rendered":
+                bodies = processor.as_html(), processor.as_text()
+            else:
+                bodies = processor.generate_html(), processor.generate_text()
+            backend.send("from@example.com", "to@example.com", "Digest", *bodies)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del bodies
+        print(f"{mode:>10}: {peak / 1024:9.0f} KB peak")
+
+
+if __name__ == "__main__":
+    main()
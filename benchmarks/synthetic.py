@@ -0,0 +1,121 @@
+"""Synthetic RSS feeds and a local HTTP server to serve them."""
+
+import asyncio
+import hashlib
+import random
+from email.utils import formatdate
+
+from aiohttp import web
+
+
+def make_rss(index, entries=50, summary_size=500):
+    """Build a synthetic RSS 2.0 feed as bytes."""
+    summary = "Lorem ipsum dolor sit amet. " * (summary_size // 28 + 1)
+    items = "".join(
+        f"<item><title>Feed {index} entry {n}</title>"
+        f"<link>https://feed{index}.example.com/entry/{n}</link>"
+        f"<guid>urn:feed{index}:entry{n}</guid>"
+        f"<pubDate>{formatdate(1700000000 - n * 3600, usegmt=True)}</pubDate>"
+        f"<description>{summary[:summary_size]}</description></item>"
+        for n in range(entries)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+        f"<title>Synthetic feed {index}</title>"
+        f"<link>https://feed{index}.example.com/</link>{items}</channel></rss>"
+    ).encode("utf-8")
+
+
+def make_atom(index, entries=50, summary_size=500):
+    """Build a synthetic Atom 1.0 feed as bytes."""
+    summary = "Lorem ipsum dolor sit amet. " * (summary_size // 28 + 1)
+    items = "".join(
+        f"<entry><title>Feed {index} entry {n}</title>"
+        f'<link rel="alternate" href="https://feed{index}.example.com/entry/{n}"/>'
+        f"<id>urn:feed{index}:entry{n}</id>"
+        f"<updated>2023-11-{14 - n // 24 % 14:02d}T{23 - n % 24:02d}:00:00Z</updated>"
+        f"<summary>{summary[:summary_size]}</summary></entry>"
+        for n in range(entries)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f"<title>Synthetic feed {index}</title><id>urn:feed{index}</id>"
+        "<updated>2023-11-14T23:00:00Z</updated>"
+        f'<link rel="alternate" href="https://feed{index}.example.com/"/>'
+        f"{items}</feed>"
+    ).encode("utf-8")
+
+
+def make_feeds(count, entries=50, summary_size=500, atom_ratio=0.0):
+    """Build count synthetic feeds, every 1/atom_ratio-th of them Atom."""
+    return [
+        (
+            make_atom
+            if atom_ratio and int(i * atom_ratio) != int((i + 1) * atom_ratio)
+            else make_rss
+        )(i, entries, summary_size)
+        for i in range(count)
+    ]
+
+
+class FeedServer:
+    """Serve synthetic feeds on localhost at /feed/<index>.xml."""
+
+    def __init__(self, feeds, latency=0.0, error_rate=0.0, etag=False, seed=0):
+        """Initialize the server.
+
+        Args:
+            feeds: List of feed bodies (bytes), served by their index
+            latency: Seconds to wait before answering each request
+            error_rate: Fraction of the feeds that answer with HTTP 500. The
+                failing feeds are picked at random, reproducibly by seed
+            etag: Whether to send an ETag and answer If-None-Match with 304
+            seed: Seed of the random choice of failing feeds
+        """
+        self.feeds = feeds
+        self.latency = latency
+        self.etag = etag
+        rng = random.Random(seed)
+        self.failing = {i for i in range(len(feeds)) if rng.random() < error_rate}
+        self.requests = 0
+        self.runner = None
+        self.base_url = None
+
+    async def _handle(self, request):
+        self.requests += 1
+        index = int(request.match_info["index"])
+        if index >= len(self.feeds):
+            raise web.HTTPNotFound()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if index in self.failing:
+            raise web.HTTPInternalServerError()
+        body = self.feeds[index]
+        headers = {}
+        if self.etag:
+            headers["ETag"] = f'"{hashlib.md5(body).hexdigest()}"'
+            if request.headers.get("If-None-Match") == headers["ETag"]:
+                return web.Response(status=304, headers=headers)
+        content_type = (
+            "application/atom+xml" if b"<feed" in body[:200] else "application/rss+xml"
+        )
+        return web.Response(body=body, headers=headers, content_type=content_type)
+
+    @property
+    def urls(self):
+        return [f"{self.base_url}/feed/{index}.xml" for index in range(len(self.feeds))]
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/feed/{index:\\d+}.xml", self._handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.runner.cleanup()
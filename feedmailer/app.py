@@ -1,30 +1,358 @@
 import argparse
+import asyncio
+import logging
+import os
+import random
+import signal
+from contextlib import AsyncExitStack
 
-from feedmailer.config import Config
-from feedmailer.feed_processor import FeedProcessor
+from feedmailer.config import Config, status_name
+from feedmailer.feed_processor import FeedProcessor, create_executor, create_session
 from feedmailer.mailer import Mailer
 from feedmailer.storage import Storage
+from feedmailer.utils.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """A recipient with its own feeds and its own status file."""
+
+    def __init__(self, name, recipient, urls, storage):
+        self.name = name
+        self.recipient = recipient
+        self.urls = urls
+        self.storage = storage
+        self.seen = storage.load()
 
 
 class App:
     def __init__(self):
-        args = self._parse_args()
-        self.config = Config(args.config)
-        self.storage = Storage(args.status)
-        self.seen = self.storage.load()
+        self.args = self._parse_args()
+        self.config = Config(self.args.config)
+        # Timings of the current run; a new one for every run of the daemon.
+        self.metrics = Metrics()
+        # The daemon samples every one of its runs on its own.
+        self.profiler = None if self.args.daemon else self._sample_profiler()
+        if self.profiler is not None:
+            self.profiler.start()
+        with self.metrics.phase("load"):
+            self.storage = Storage(self.args.status, self.config)
+            self.seen = self.storage.load()
+            self.subscribers = [
+                Subscriber(
+                    subscriber["name"],
+                    subscriber["to"],
+                    subscriber["urls"],
+                    Storage(self._subscriber_status(subscriber["name"]), self.config),
+                )
+                for subscriber in self.config.subscribers
+            ]
+        self.mailer = Mailer(self.config)
+        self._stopping = None
+
+    def _subscriber_status(self, name):
+        """Path of a subscriber's status file, next to the main status file."""
+        root, ext = os.path.splitext(self.args.status)
+        return f"{root}.{status_name(name)}{ext}"
 
     def _parse_args(self):
         parser = argparse.ArgumentParser()
         parser.add_argument("config")
         parser.add_argument("status")
-        return parser.parse_args()
+        parser.add_argument(
+            "--daemon",
+            action="store_true",
+            help="keep running and check the feeds every daemon.interval seconds",
+        )
+        parser.add_argument(
+            "--flush",
+            action="store_true",
+            help="only deliver the mails waiting in the spool",
+        )
+        parser.add_argument(
+            "--profile",
+            metavar="DIRECTORY",
+            help="write cProfile stats and event loop timings of the run here",
+        )
+        parser.add_argument(
+            "--profile-rate",
+            type=int,
+            default=1,
+            metavar="N",
+            help="profile only one run in N, picked at random",
+        )
+        parser.add_argument(
+            "--slow-callback",
+            type=float,
+            default=0.1,
+            metavar="SECONDS",
+            help="report event loop callbacks that block longer than this",
+        )
+        args = parser.parse_args()
+        if args.profile_rate < 1:
+            parser.error("--profile-rate must be at least 1")
+        return args
+
+    def _sample_profiler(self):
+        """Return a profiler if this run is to be profiled, else None."""
+        if not self.args.profile or random.randrange(self.args.profile_rate):
+            return None
+        from feedmailer.utils.profiling import Profiler
+
+        return Profiler(self.args.profile, self.args.slow_callback)
+
+    def _write_profile(self, profiler):
+        profiler.stop()
+        try:
+            profiler.write()
+        except OSError:
+            logger.exception("Writing the profile failed")
 
     def run(self):
-        processor = FeedProcessor(self.config, self.seen)
-        if processor.collect():
-            Mailer(self.config).send(processor.as_html(), processor.as_text())
+        if self.args.daemon:
+            asyncio.run(self.run_daemon())
+            return
+
+        try:
+            if not self.args.flush:
+                processor = self._create_processor()
+                with self.metrics.phase("fetch"):
+                    result = processor.collect()
+                for subscriber in self.subscribers:
+                    self._handle_subscriber(processor, subscriber)
+                self._handle(processor, result)
+            with self.metrics.phase("send"):
+                self.mailer.flush()
+        finally:
+            self.mailer.close()
+            self._write_metrics()
+            if self.profiler is not None:
+                self._write_profile(self.profiler)
+
+    def _create_processor(self):
+        """Create a processor that fetches the feeds of all subscribers once."""
+        processor = FeedProcessor(
+            self.config,
+            self.seen,
+            self.storage.feeds,
+            urls=self.config.feed_urls,
+            metrics=self.metrics,
+        )
+        for subscriber in self.subscribers:
+            # A feed new to a subscriber is parsed even if it did not change.
+            processor.refetch(
+                url for url in subscriber.urls if url not in subscriber.storage.feeds
+            )
+        return processor
+
+    def _handle(self, processor, result):
+        """Send the collected entries and store the new state."""
+        if result:
+            try:
+                pages = self._paginate(processor)
+                for number, page in enumerate(pages, 1):
+                    self._send(page)
+                    self._update_page_state(processor, page, number == len(pages))
+            except Exception:
+                self._pages_failed(processor)
+                raise
+        else:
+            self._store(processor)
+
+    async def _handle_async(self, processor, result):
+        """Like _handle, but deliver the mail without blocking the event loop."""
+        if result:
+            try:
+                pages = self._paginate(processor)
+                for number, page in enumerate(pages, 1):
+                    await self._send_async(page)
+                    self._update_page_state(processor, page, number == len(pages))
+            except Exception:
+                self._pages_failed(processor)
+                raise
+        else:
+            self._store(processor)
+
+    def _render(self, page):
+        """Return the bodies of a page, timing their rendering as they stream."""
+        return (
+            self.metrics.timed("render", page.generate_html()),
+            self.metrics.timed("render", page.generate_text()),
+        )
+
+    def _send(self, page, recipient=None):
+        """Send one page; the send time includes rendering it."""
+        with self.metrics.phase("send"):
+            self.mailer.send(
+                *self._render(page), subject=page.subject, recipient=recipient
+            )
+
+    async def _send_async(self, page, recipient=None):
+        with self.metrics.phase("send"):
+            await self.mailer.send_async(
+                *self._render(page), subject=page.subject, recipient=recipient
+            )
+
+    def _paginate(self, processor):
+        """Split a digest into mails within the configured limits."""
+        return processor.paginate(
+            max_entries=self.config.mail_max_entries,
+            max_bytes=self.config.mail_max_bytes,
+        )
+
+    def _update_page_state(self, processor, page, last):
+        """Store what a sent page delivered.
+
+        The feeds' new state is only stored with the last page, so a run
+        killed part-way through fetches them again and sends the rest.
+        """
+        if last:
+            self._update_state(page)
+        else:
+            with processor.previous_state():
+                self._update_state(page)
+
+    def _pages_failed(self, processor):
+        # The feeds' new HTTP validators are still in memory; drop them so
+        # the rest is parsed next run.
+        processor.refetch(processor.observed)
+        with self.metrics.phase("save"):
+            self.storage.commit()
+
+    def _handle_subscriber(self, processor, subscriber):
+        """Send a subscriber its new entries and store its seen links."""
+        view = processor.for_subscriber(
+            subscriber.seen, subscriber.urls, subscriber.storage.feeds
+        )
+        try:
+            if view.found or view.context["zero_links"]:
+                for page in self._paginate(view):
+                    self._send(page, recipient=subscriber.recipient)
+                    self._store_subscriber(subscriber, page)
+            else:
+                self._store_subscriber(subscriber, view)
+        except Exception:
+            self._subscriber_failed(processor, subscriber)
+
+    async def _handle_subscriber_async(self, processor, subscriber):
+        """Like _handle_subscriber, but without blocking the event loop."""
+        view = processor.for_subscriber(
+            subscriber.seen, subscriber.urls, subscriber.storage.feeds
+        )
+        try:
+            if view.found or view.context["zero_links"]:
+                for page in self._paginate(view):
+                    await self._send_async(page, recipient=subscriber.recipient)
+                    self._store_subscriber(subscriber, page)
+            else:
+                self._store_subscriber(subscriber, view)
+        except Exception:
+            self._subscriber_failed(processor, subscriber)
+
+    def _store_subscriber(self, subscriber, view):
+        if view.observed or view.state_changed:
+            with self.metrics.phase("save"):
+                subscriber.storage.commit(view.observed, renamed=view.renamed)
+
+    def _subscriber_failed(self, processor, subscriber):
+        logger.exception(
+            "Mailing subscriber %s failed, retrying next run", subscriber.name
+        )
+        # The shared HTTP validators must not hide these entries next run.
+        processor.refetch(subscriber.urls)
+        subscriber.seen = subscriber.storage.load()
+
+    def _store(self, processor):
+        if processor.state_changed or processor.observed:
+            # Nothing was sent, but the feeds were parsed or their state changed.
             self._update_state(processor)
 
     def _update_state(self, processor):
-        new_links = {e.link for e in processor.found}
-        self.storage.save(self.seen | new_links)
+        with self.metrics.phase("save"):
+            self.storage.commit(processor.observed, renamed=processor.renamed)
+
+    def _write_metrics(self):
+        """Write the metrics of the run to the configured files."""
+        try:
+            if self.config.metrics_json:
+                self.metrics.write_json(self.config.metrics_json)
+            if self.config.metrics_prometheus:
+                self.metrics.write_prometheus(self.config.metrics_prometheus)
+        except OSError:
+            logger.exception("Writing the metrics failed")
+
+    async def run_daemon(self):
+        """Check the feeds on a fixed interval until stopped.
+
+        The seen links, the HTTP session, the parse pool and the mail
+        connection are kept between runs; the state is committed after every
+        run.
+        """
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        async with AsyncExitStack() as stack:
+            session = await stack.enter_async_context(create_session(self.config))
+            executor = create_executor(self.config)
+            if executor is not None:
+                stack.callback(executor.shutdown)
+            stack.callback(self.mailer.close)
+
+            while not self._stopping.is_set():
+                started = loop.time()
+                await self._run_once(session, executor)
+                delay = self.config.daemon_interval - (loop.time() - started)
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), max(delay, 0))
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _run_once(self, session, executor):
+        profiler = self._sample_profiler()
+        if profiler is not None:
+            profiler.start()
+        try:
+            await self._check_feeds(session, executor)
+        finally:
+            if profiler is not None:
+                self._write_profile(profiler)
+
+    async def _check_feeds(self, session, executor):
+        processor = self._create_processor()
+        try:
+            with self.metrics.phase("fetch"):
+                result = await processor.collect_async(
+                    session=session, executor=executor
+                )
+            await asyncio.gather(
+                *(
+                    self._handle_subscriber_async(processor, subscriber)
+                    for subscriber in self.subscribers
+                )
+            )
+            await self._handle_async(processor, result)
+        except Exception:
+            logger.exception("Checking the feeds failed, retrying next run")
+            # Drop state the failed run changed in memory but did not commit.
+            with self.metrics.phase("load"):
+                self.seen = self.storage.load()
+
+        try:
+            with self.metrics.phase("send"):
+                await self.mailer.flush_async()
+        except Exception:
+            logger.exception("Delivering the spooled mails failed")
+
+        self._write_metrics()
+        self.metrics = Metrics()
+
+    def stop(self):
+        """Stop the daemon after the current run."""
+        if self._stopping is not None:
+            self._stopping.set()
@@ -1,14 +1,46 @@
 import json
+import re
+
+# Characters replaced in the subscriber names their status files are named by.
+UNSAFE_FILENAME_RE = re.compile(r"[^\w.@+-]")
+
+# Suffixes of the files the storage keeps next to a status file.
+STATUS_FILE_SUFFIXES = ("journal", "bloom", "tmp", "bak")
+
+
+def status_name(name):
+    """The part of a subscriber's status file name taken from its name."""
+    return UNSAFE_FILENAME_RE.sub("_", name)
 
 
 class Config:
     def __init__(self, path):
         with open(path, "r") as f:
             self.data = json.load(f)
-        self.urls = self.data.get("urls", [])
+        # Feeds are given as a url, or as an object with a "url" and options.
+        self.feed_options = {}
+        self.urls = self._read_feeds(self.data.get("urls", []))
         self.sender = self.data.get("from")
         self.recipient = self.data.get("to")
 
+        # Further recipients, each with their own feeds and seen links.
+        self.subscribers = []
+        for subscriber in self.data.get("subscribers", []):
+            self.subscribers.append(
+                {
+                    "name": subscriber.get("name", subscriber["to"]),
+                    "to": subscriber["to"],
+                    "urls": self._read_feeds(subscriber.get("urls", [])),
+                }
+            )
+        self._check_subscriber_names()
+        # Every feed once, however many subscribers it has.
+        self.feed_urls = list(
+            dict.fromkeys(
+                self.urls + [url for s in self.subscribers for url in s["urls"]]
+            )
+        )
+
         self.mail_backend = self.data.get("mail_backend", "sendmail")
         smtp_config = self.data.get("smtp", {})
         self.smtp_host = smtp_config.get("host", "localhost")
@@ -16,3 +48,76 @@ class Config:
         self.smtp_username = smtp_config.get("username")
         self.smtp_password = smtp_config.get("password")
         self.smtp_use_tls = smtp_config.get("use_tls", True)
+
+        mail_config = self.data.get("mail", {})
+        self.mail_max_concurrency = mail_config.get("max_concurrency", 4)
+        self.mail_max_entries = mail_config.get("max_entries")
+        self.mail_max_bytes = mail_config.get("max_bytes", 5 * 1024 * 1024)
+
+        spool_config = self.data.get("spool", {})
+        self.spool_directory = spool_config.get("directory")
+        self.spool_backoff = spool_config.get("backoff", 5 * 60)
+        self.spool_max_backoff = spool_config.get("max_backoff", 6 * 60 * 60)
+
+        fetch_config = self.data.get("fetch", {})
+        self.fetch_max_concurrency = fetch_config.get("max_concurrency", 20)
+        self.fetch_max_per_host = fetch_config.get("max_per_host", 4)
+        self.fetch_host_delay = fetch_config.get("host_delay", 0)
+        self.fetch_adaptive = fetch_config.get("adaptive", False)
+        self.fetch_min_interval = fetch_config.get("min_interval", 0)
+        self.fetch_max_interval = fetch_config.get("max_interval", 24 * 60 * 60)
+        self.fetch_timeout = fetch_config.get("timeout", 30)
+        self.fetch_connect_timeout = fetch_config.get("connect_timeout", 10)
+        self.fetch_read_timeout = fetch_config.get("read_timeout", 30)
+        self.fetch_max_size = fetch_config.get("max_size", 10 * 1024 * 1024)
+        self.fetch_failure_threshold = fetch_config.get("failure_threshold", 3)
+        self.fetch_backoff = fetch_config.get("backoff", 60 * 60)
+        self.fetch_max_backoff = fetch_config.get("max_backoff", 7 * 24 * 60 * 60)
+
+        parse_config = self.data.get("parse", {})
+        self.parse_engine = parse_config.get("engine", "feedparser")
+        self.parse_executor = parse_config.get("executor", "thread")
+        self.parse_workers = parse_config.get("workers")
+
+        storage_config = self.data.get("storage", {})
+        self.storage_backend = storage_config.get("backend", "json")
+        self.storage_retention_days = storage_config.get("retention_days")
+        self.storage_journal = storage_config.get("journal", False)
+        self.storage_compact_after = storage_config.get("compact_after", 50)
+        self.storage_bloom = storage_config.get("bloom", False)
+
+        metrics_config = self.data.get("metrics", {})
+        self.metrics_json = metrics_config.get("json")
+        self.metrics_prometheus = metrics_config.get("prometheus")
+
+        daemon_config = self.data.get("daemon", {})
+        self.daemon_interval = daemon_config.get("interval", 900)
+
+    def _read_feeds(self, feeds):
+        """Return the urls of feeds and remember their options."""
+        urls = []
+        for feed in feeds:
+            if isinstance(feed, dict):
+                urls.append(feed["url"])
+                self.feed_options.setdefault(feed["url"], feed)
+            else:
+                urls.append(feed)
+        return urls
+
+    def _check_subscriber_names(self):
+        """Reject subscribers whose status file would be another's file."""
+        names = {}
+        for subscriber in self.subscribers:
+            name = status_name(subscriber["name"])
+            if name.rpartition(".")[2].lower() in STATUS_FILE_SUFFIXES:
+                msg = f"Subscriber name {subscriber['name']!r} is reserved"
+                raise ValueError(msg)
+            # Case-insensitive file systems would put these in one file, too.
+            key = name.casefold()
+            if key in names:
+                msg = (
+                    f"Subscribers {names[key]!r} and {subscriber['name']!r} "
+                    "would share a status file"
+                )
+                raise ValueError(msg)
+            names[key] = subscriber["name"]
@@ -1,78 +1,624 @@
 import asyncio
 import os
+import time
+from contextlib import AsyncExitStack, contextmanager
 
-import aiohttp
-import feedparser
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+# aiohttp, Jinja2, the feed parsers and the pools are imported where they are
+# first used: a run that finds nothing new never loads Jinja2, and one that
+# only flushes the spool loads none of them.
+from feedmailer.utils.fetch_scheduler import FetchScheduler
+from feedmailer.utils.identity import entry_keys, url_key
+from feedmailer.utils.metrics import Metrics, create_trace_config
+from feedmailer.utils.polling import learn_interval, published_time
+
+# Feeds are due a little before their interval has fully passed, so a feed
+# isn't skipped just because the previous run started a few seconds late.
+DUE_TOLERANCE = 0.1
+
+# Seconds between two updates of the time a feed was last contacted without
+# being parsed, so unchanged feeds don't rewrite their state on every run.
+CONTACT_RESOLUTION = 3600
+
+# Size of the chunks a response body is read in.
+CHUNK_SIZE = 64 * 1024
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+HTML_TEMPLATE = "email/overview.html"
+TEXT_TEMPLATE = "email/overview.txt"
+
+SUBJECT = "Feed Updates"
+
+_jinja_env = None
+
+
+def get_jinja_env():
+    """Return the template environment shared by all processors.
+
+    Compiled templates are kept in memory for the life of the process, and
+    as bytecode in a per-user cache directory so later runs skip compiling.
+    """
+    global _jinja_env
+    if _jinja_env is None:
+        from jinja2 import (
+            Environment,
+            FileSystemBytecodeCache,
+            FileSystemLoader,
+            select_autoescape,
+        )
+
+        try:
+            bytecode_cache = FileSystemBytecodeCache()
+        except (OSError, RuntimeError):
+            # No usable temporary directory; compile on every run instead.
+            bytecode_cache = None
+        _jinja_env = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            autoescape=select_autoescape(["html", "xml"]),
+            bytecode_cache=bytecode_cache,
+        )
+    return _jinja_env
+
+
+def _utf8_len(*texts):
+    return sum(len((text or "").encode("utf-8")) for text in texts)
+
+
+class Entry:
+    """A new feed entry, reduced to what the email templates need."""
+
+    __slots__ = ("feed", "key", "link", "published", "title")
+
+    def __init__(self, link, title, feed=None, published=None, key=None):
+        self.link = link
+        self.title = title
+        self.feed = feed
+        self.published = published
+        # Identity of the entry, see feedmailer.utils.identity
+        self.key = url_key(link) if key is None else key
+
+    @classmethod
+    def from_parsed(cls, entry, feed, key):
+        """Copy the used fields of a parsed entry, so the parse tree can be freed.
+
+        Args:
+            entry: Entry as returned by the feed parser
+            feed: Title of the feed the entry is in
+            key: Identity key of the entry
+        """
+        return cls(
+            link=entry.link,
+            title=getattr(entry, "title", ""),
+            feed=feed,
+            published=published_time(entry),
+            key=key,
+        )
+
+    def __repr__(self):
+        return f"Entry({self.link!r}, {self.title!r})"
+
+
+def create_parser(config):
+    """Create the feed parser selected by the parse engine setting."""
+    if config.parse_engine == "native":
+        from feedmailer.utils.feed_parsers.native import NativeParser
+
+        return NativeParser()
+    else:
+        from feedmailer.utils.feed_parsers.universal import UniversalParser
+
+        return UniversalParser()
+
+
+def create_session(config):
+    """Create an HTTP session with the configured connection limits."""
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(
+        limit=config.fetch_max_concurrency,
+        limit_per_host=config.fetch_max_per_host,
+    )
+    return aiohttp.ClientSession(
+        connector=connector, trace_configs=[create_trace_config()]
+    )
+
+
+def create_executor(config):
+    """Create the pool feeds are parsed in, or None to parse on the event loop."""
+    if config.parse_executor == "process":
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(max_workers=config.parse_workers)
+    elif config.parse_executor == "thread":
+        from concurrent.futures import ThreadPoolExecutor
+
+        return ThreadPoolExecutor(max_workers=config.parse_workers)
+    else:
+        return None
 
 
 class FeedProcessor:
-    def __init__(self, config, seen_links):
+    def __init__(self, config, seen_links, feed_state=None, urls=None, metrics=None):
+        """Initialize the processor.
+
+        Args:
+            config: The Config
+            seen_links: Keys of the entries that are not new anymore. Entries
+                whose link is in it are not new either, as status files
+                written before entries were keyed hold their links
+            feed_state: Per-feed state, updated in place
+            urls: Feeds to fetch (default: config.urls). Of these, only the
+                config.urls are collected; the others are fetched for
+                subscribers, see for_subscriber
+            metrics: Metrics the timings of the fetched feeds are recorded in
+                (default: new Metrics)
+        """
         self.config = config
         self.seen_links = seen_links
+        self.urls = config.urls if urls is None else urls
+        # Per-feed state (HTTP validators) shared with Storage; updated in place.
+        self.feed_state = feed_state if feed_state is not None else {}
+        self.state_changed = False
+        # State of the feeds changed by this processor, as it was before.
+        self._previous_state = {}
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._executor = None
+        self._parser = None
+        # Parsed feeds and fetch errors of this run, keyed by feed url.
+        self.results = {}
+        self.errors = {}
+        # The keys of all entries of each successfully parsed feed, by feed url.
+        self.observed = {}
+        # Feed url -> {link: key} of the entries seen by their link, not their key
+        self.renamed = {}
+        # Feed url -> time of the feeds polled this run whose links the
+        # storage does not observe, see _record_contact.
+        self.contacted = {}
         self.found = []
         self.context = {"feeds": [], "zero_links": []}
+        self.subject = SUBJECT
 
-        # Setup Jinja2 environment
-        template_dir = os.path.join(os.path.dirname(__file__), "templates")
-        self.jinja_env = Environment(
-            loader=FileSystemLoader(template_dir),
-            autoescape=select_autoescape(["html", "xml"]),
+    @property
+    def jinja_env(self):
+        return get_jinja_env()
+
+    @property
+    def parser(self):
+        """The feed parser, created when the first feed is parsed."""
+        if self._parser is None:
+            self._parser = create_parser(self.config)
+        return self._parser
+
+    def _conditional_headers(self, url):
+        """Build If-None-Match / If-Modified-Since headers from stored validators."""
+        state = self.feed_state.get(url, {})
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        return headers
+
+    def _is_scheduled(self, url):
+        """Whether url is polled on its own interval rather than on every run."""
+        return self.config.fetch_adaptive or "interval" in self.config.feed_options.get(
+            url, {}
+        )
+
+    def _interval(self, url):
+        """Seconds to wait between two fetches of url."""
+        options = self.config.feed_options.get(url, {})
+        if "interval" in options:
+            return options["interval"]
+        elif self.config.fetch_adaptive:
+            return self.feed_state.get(url, {}).get(
+                "interval", self.config.fetch_min_interval
+            )
+        else:
+            return 0
+
+    def _in_backoff(self, url, now):
+        retry_at = self.feed_state.get(url, {}).get("retry_at")
+        return retry_at is not None and now < retry_at
+
+    def _is_due(self, url, now):
+        if self._in_backoff(url, now):
+            return False
+        checked = self.feed_state.get(url, {}).get("checked")
+        if checked is None or not self._is_scheduled(url):
+            return True
+        return now >= checked + self._interval(url) * (1 - DUE_TOLERANCE)
+
+    def _timeout(self, url):
+        """Total, connect and read timeouts for url."""
+        import aiohttp
+
+        options = self.config.feed_options.get(url, {})
+        return aiohttp.ClientTimeout(
+            total=options.get("timeout", self.config.fetch_timeout),
+            sock_connect=options.get(
+                "connect_timeout", self.config.fetch_connect_timeout
+            ),
+            sock_read=options.get("read_timeout", self.config.fetch_read_timeout),
         )
 
-    async def _fetch_feed(self, session, url):
+    def _failure_state(self, url, now):
+        """Count a failed fetch and back off exponentially past the threshold."""
+        failures = self.feed_state.get(url, {}).get("failures", 0) + 1
+        retry_at = None
+        if failures >= self.config.fetch_failure_threshold:
+            exponent = failures - self.config.fetch_failure_threshold
+            backoff = min(
+                self.config.fetch_backoff * 2**exponent, self.config.fetch_max_backoff
+            )
+            retry_at = now + backoff
+        return {"failures": failures, "retry_at": retry_at}
+
+    async def _read_body(self, url, resp):
+        """Read the raw response body, aborting once it exceeds the size limit."""
+        max_size = self.config.feed_options.get(url, {}).get(
+            "max_size", self.config.fetch_max_size
+        )
+        msg = f"Feed is larger than {max_size} bytes"
+        if resp.content_length is not None and resp.content_length > max_size:
+            raise AssertionError(msg)
+
+        chunks = []
+        size = 0
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise AssertionError(msg)
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def _parse(self, content):
+        """Parse feed content without blocking the event loop."""
+        if self._executor is None:
+            return self.parser.parse(content)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.parser.parse, content)
+
+    async def _fetch_feed(self, session, scheduler, url):
         """Fetch and parse a single feed asynchronously."""
+        record = self.metrics.feed(url)
+        started = time.perf_counter()
         try:
-            async with session.get(
-                url, timeout=aiohttp.ClientTimeout(total=30)
-            ) as resp:
-                content = await resp.text()
-                # feedparser.parse can handle string content
-                response = feedparser.parse(content)
-
-                all_links = [e.link for e in response.entries]
-                if len(all_links) == 0:
-                    msg = "No links found in feed"
-                    raise AssertionError(msg)
-
-                new = [e for e in response.entries if e.link not in self.seen_links]
-                if not new:
-                    return None
-
-                return {"url": url, "feed_title": response.feed.title, "entries": new}
+            async with scheduler.slot(url):
+                record["wait"] = time.perf_counter() - started
+                async with session.get(
+                    url,
+                    headers=self._conditional_headers(url),
+                    timeout=self._timeout(url),
+                    trace_request_ctx=record,
+                ) as resp:
+                    record["status"] = resp.status
+                    if resp.status == 304:
+                        return {"url": url, "not_modified": True}
+                    if resp.status >= 400:
+                        msg = f"HTTP status {resp.status}"
+                        raise AssertionError(msg)
+
+                    start = time.perf_counter()
+                    content = await self._read_body(url, resp)
+                    record["download"] = time.perf_counter() - start
+                    record["bytes"] = len(content)
+
+                    start = time.perf_counter()
+                    response = await self._parse(content)
+                    record["parse"] = time.perf_counter() - start
+                    record["entries"] = len(response.entries)
+
+                    if len(response.entries) == 0:
+                        msg = "No links found in feed"
+                        raise AssertionError(msg)
+
+                    keys = entry_keys(response.entries, url)
+                    feed_title = getattr(response.feed, "title", None) or url
+                    result = {
+                        "url": url,
+                        "feed_title": feed_title,
+                        "entries": [
+                            Entry.from_parsed(e, feed_title, key)
+                            for e, key in zip(response.entries, keys, strict=True)
+                        ],
+                        "keys": keys,
+                        "validators": {
+                            "etag": resp.headers.get("ETag"),
+                            "last_modified": resp.headers.get("Last-Modified"),
+                        },
+                    }
+                    if self.config.fetch_adaptive:
+                        result["interval"] = learn_interval(
+                            resp.headers,
+                            response.feed,
+                            response.entries,
+                            time.time(),
+                            self.config.fetch_min_interval,
+                            self.config.fetch_max_interval,
+                        )
+                    return result
         except Exception as e:
-            return {"url": url, "error": str(e)}
+            record["error"] = str(e) or type(e).__name__
+            return {"url": url, "error": record["error"]}
+        finally:
+            record["total"] = time.perf_counter() - started
+
+    def _update_feed_state(self, url, changes):
+        """Update the stored state of a feed; None values remove a key."""
+        state = dict(self.feed_state.get(url, {}))
+        for key, value in changes.items():
+            if value:
+                state[key] = value
+            else:
+                state.pop(key, None)
+
+        if state != self.feed_state.get(url, {}):
+            self._previous_state.setdefault(url, self.feed_state.get(url))
+            self.feed_state[url] = state
+            self.state_changed = True
+
+    @contextmanager
+    def previous_state(self):
+        """Put back the feed state from before this processor changed it.
+
+        Committing the storage within the block stores the links of a sent
+        page without the new HTTP validators and check times, so a run that
+        is interrupted before its last page fetches the feeds again.
+        """
+        current = {url: self.feed_state.get(url) for url in self._previous_state}
+        self._restore_state(self._previous_state)
+        try:
+            yield
+        finally:
+            self._restore_state(current)
+
+    def _restore_state(self, states):
+        for url, state in states.items():
+            if state is None:
+                self.feed_state.pop(url, None)
+            else:
+                self.feed_state[url] = state
+
+    def _record_contact(self, url, now):
+        """Note that url is still polled although the storage observes no links.
+
+        The storage forgets feeds that have been neither parsed nor contacted
+        within the retention period.
+        """
+        self.contacted[url] = now
+        contacted = self.feed_state.get(url, {}).get("contacted")
+        if contacted is None or now - contacted >= CONTACT_RESOLUTION:
+            self._update_feed_state(url, {"contacted": now})
+
+    def refetch(self, urls):
+        """Drop the HTTP validators of urls, so they are parsed even if unchanged."""
+        for url in urls:
+            self._update_feed_state(url, {"etag": None, "last_modified": None})
+
+    async def collect_async(self, session=None, executor=None):
+        """Collect feeds asynchronously in parallel.
+
+        Args:
+            session: HTTP session to reuse (default: a new one for this call)
+            executor: Parse pool to reuse (default: a new one for this call)
+        """
+        scheduler = FetchScheduler(
+            max_concurrency=self.config.fetch_max_concurrency,
+            host_delay=self.config.fetch_host_delay,
+        )
+        async with AsyncExitStack() as stack:
+            if session is None:
+                session = await stack.enter_async_context(create_session(self.config))
+            if executor is None:
+                executor = create_executor(self.config)
+                if executor is not None:
+                    stack.callback(executor.shutdown)
+            self._executor = executor
+            stack.callback(setattr, self, "_executor", None)
 
-    async def collect_async(self):
-        """Collect feeds asynchronously in parallel."""
-        async with aiohttp.ClientSession() as session:
-            tasks = [self._fetch_feed(session, url) for url in self.config.urls]
+            now = time.time()
+            tasks = []
+            for url in self.urls:
+                if self._is_due(url, now):
+                    tasks.append(self._fetch_feed(session, scheduler, url))
+                elif self._in_backoff(url, now):
+                    self._record_contact(url, now)
             results = await asyncio.gather(*tasks)
 
         for result in results:
-            if result is None:
-                # No new entries, skip
-                continue
-            elif "error" in result:
-                # Error occurred
-                self.context["zero_links"].append(f"{result['url']}: {result['error']}")
-            else:
-                # Success
-                self.found.extend(result["entries"])
-                self.context["feeds"].append(
-                    {"name": result["feed_title"], "entries": result["entries"]}
-                )
+            self._record_result(result, now)
+
+        return self._select(self.config.urls)
+
+    def _record_result(self, result, now):
+        """Update the feed state with the outcome of one fetch."""
+        url = result["url"]
+        if "error" in result:
+            self.errors[url] = result["error"]
+            self._update_feed_state(url, self._failure_state(url, now))
+            return
+
+        self._update_feed_state(url, {"failures": None, "retry_at": None})
+        if url not in self.config.urls:
+            # Parsed for subscribers only; the links are observed in their
+            # status files, not in this one.
+            self._record_contact(url, now)
+
+        if self._is_scheduled(url):
+            schedule = {"checked": now}
+            if "interval" in result:
+                schedule["interval"] = result["interval"]
+            self._update_feed_state(url, schedule)
+        if result.get("not_modified"):
+            # Not modified since the previous run, skip
+            self._record_contact(url, now)
+            return
+
+        self._update_feed_state(url, result["validators"])
+        self.results[url] = result
+
+    def _select(self, urls):
+        """Collect the new entries and the errors of the given feeds.
+
+        An entry in several feeds, or several times in one, is collected once.
+        Entries only known by their link are recorded in renamed, for the
+        storage to key them.
+        """
+        selected = set()
+        for url in urls:
+            if url in self.errors:
+                self.context["zero_links"].append(f"{url}: {self.errors[url]}")
+            elif url in self.results:
+                result = self.results[url]
+                self.observed[url] = result["keys"]
+                new = []
+                for entry in result["entries"]:
+                    if entry.key in self.seen_links:
+                        continue
+                    if entry.link in self.seen_links:
+                        self.renamed.setdefault(url, {})[entry.link] = entry.key
+                    elif entry.key not in selected:
+                        selected.add(entry.key)
+                        new.append(entry)
+                self.metrics.feed(url)["new_entries"] = len(new)
+                if new:
+                    self.found.extend(new)
+                    self.context["feeds"].append(
+                        {"name": result["feed_title"], "entries": new}
+                    )
 
         return self.found or self.context["zero_links"]
 
+    def for_subscriber(self, seen_links, urls, feed_state=None):
+        """Collect the feeds of one subscriber from the feeds fetched by this run.
+
+        Args:
+            seen_links: Keys of the entries the subscriber has already seen
+            urls: Feeds of the subscriber
+            feed_state: Per-feed state of the subscriber, updated in place
+                with the feeds that were polled but not parsed
+
+        Returns:
+            A FeedProcessor with the subscriber's entries, ready to render
+        """
+        processor = FeedProcessor(self.config, seen_links, feed_state, urls=urls)
+        processor.results = self.results
+        processor.errors = self.errors
+        processor._select(urls)
+        for url in urls:
+            if url in self.contacted and url not in self.results:
+                processor._record_contact(url, self.contacted[url])
+        return processor
+
     def collect(self):
         """Synchronous wrapper for collect_async to maintain backward compatibility."""
         return asyncio.run(self.collect_async())
 
+    def paginate(self, max_entries=None, max_bytes=None):
+        """Split the collected entries into pages, each sent as a mail of its own.
+
+        Args:
+            max_entries: Most entries on one page (default: no limit)
+            max_bytes: Approximate size limit of the rendered bodies of one
+                page (default: no limit). A page holds at least one entry.
+
+        Returns:
+            FeedProcessors of one page each, ready to render; just this
+            processor if everything fits on one page. The observed keys of a
+            page leave out the entries of the later pages, so committing them
+            after sending the page stores exactly what was delivered.
+        """
+        chunks = list(self._split(max_entries, max_bytes))
+        if len(chunks) <= 1:
+            return [self]
+
+        pending = {entry.key for entry in self.found}
+        pages = []
+        for number, feeds in enumerate(chunks, 1):
+            page = FeedProcessor(self.config, self.seen_links, urls=self.urls)
+            page.results = self.results
+            page.errors = self.errors
+            page.renamed = self.renamed
+            page.found = [entry for feed in feeds for entry in feed["entries"]]
+            pending.difference_update(entry.key for entry in page.found)
+            page.observed = {
+                url: [key for key in keys if key not in pending]
+                for url, keys in self.observed.items()
+            }
+            page.context = {
+                "feeds": feeds,
+                "zero_links": self.context["zero_links"] if number == 1 else [],
+            }
+            page.subject = f"{self.subject} ({number}/{len(chunks)})"
+            pages.append(page)
+        return pages
+
+    def _split(self, max_entries, max_bytes):
+        """Yield the feeds of every page, within the given limits."""
+        if max_bytes:
+            base, feed_cost, entry_cost = self._template_costs()
+        page, entries, size = [], 0, 0
+        for feed in self.context["feeds"]:
+            # Names, titles and links appear once in each of both bodies.
+            header = feed_cost + 2 * _utf8_len(feed["name"]) if max_bytes else 0
+            page_feed = None
+            for entry in feed["entries"]:
+                cost = 0
+                if max_bytes:
+                    cost = entry_cost + 2 * _utf8_len(entry.title, entry.link)
+                    if page_feed is None:
+                        cost += header
+                if entries and (
+                    (max_entries and entries >= max_entries)
+                    or (max_bytes and base + size + cost > max_bytes)
+                ):
+                    yield page
+                    page, entries, size = [], 0, 0
+                    if max_bytes and page_feed is not None:
+                        cost += header
+                    page_feed = None
+                if page_feed is None:
+                    page_feed = {"name": feed["name"], "entries": []}
+                    page.append(page_feed)
+                page_feed["entries"].append(entry)
+                entries += 1
+                size += cost
+        if page:
+            yield page
+
+    def _template_costs(self):
+        """Measure the bytes the templates add per mail, per feed and per entry.
+
+        Renders placeholders with empty names, titles and links; the text in
+        them comes on top.
+        """
+        empty_feed = {"name": "", "entries": []}
+        base = self._rendered_size([])
+        with_feed = self._rendered_size([empty_feed])
+        with_entry = self._rendered_size([dict(empty_feed, entries=[Entry("", "")])])
+        return base, with_feed - base, with_entry - with_feed
+
+    def _rendered_size(self, feeds):
+        context = dict(self.context, feeds=feeds)
+        return sum(
+            len(self.jinja_env.get_template(name).render(**context).encode("utf-8"))
+            for name in (HTML_TEMPLATE, TEXT_TEMPLATE)
+        )
+
     def as_html(self):
-        template = self.jinja_env.get_template("email/overview.html")
+        template = self.jinja_env.get_template(HTML_TEMPLATE)
         return template.render(**self.context)
 
     def as_text(self):
-        template = self.jinja_env.get_template("email/overview.txt")
+        template = self.jinja_env.get_template(TEXT_TEMPLATE)
         return template.render(**self.context)
+
+    def generate_html(self):
+        """Render the HTML email lazily, as an iterator of string chunks."""
+        template = self.jinja_env.get_template(HTML_TEMPLATE)
+        return template.generate(**self.context)
+
+    def generate_text(self):
+        """Render the plain text email lazily, as an iterator of string chunks."""
+        template = self.jinja_env.get_template(TEXT_TEMPLATE)
+        return template.generate(**self.context)
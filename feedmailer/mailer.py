@@ -1,19 +1,75 @@
-from feedmailer.utils.mail_backends.sendmail import SendmailBackend
-from feedmailer.utils.mail_backends.smtp import SMTPBackend
+import asyncio
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The backends, importable from here but only loaded when first used.
+_BACKENDS = {
+    "SendmailBackend": "feedmailer.utils.mail_backends.sendmail",
+    "SMTPBackend": "feedmailer.utils.mail_backends.smtp",
+}
+
+
+def __getattr__(name):
+    if name in _BACKENDS:
+        return getattr(importlib.import_module(_BACKENDS[name]), name)
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
 
 
 class Mailer:
-    """Main mailer class that delegates to a backend."""
+    """Main mailer class that delegates to a backend.
+
+    The async methods deliver in worker threads, over at most
+    mail_max_concurrency backends (and so connections) at the same time.
+    Backends are created, and their modules imported, when the first mail is
+    delivered.
+    """
 
     def __init__(self, config):
         self.config = config
-        self.backend = self._create_backend_from_config()
+        self._backend = None
+        # Backends not delivering a mail right now, reused by the async methods.
+        self._idle = []
+        self._backends = []
+        self._executor = None
+        self._semaphore = None
+        self.spool = self._create_spool_from_config()
+
+    def _create_spool_from_config(self):
+        """Create the outbox if a spool directory is configured."""
+        directory = getattr(self.config, "spool_directory", None)
+        if not directory:
+            return None
+        from feedmailer.utils.spool import Spool
+
+        return Spool(
+            directory,
+            backoff=getattr(self.config, "spool_backoff", 300),
+            max_backoff=getattr(self.config, "spool_max_backoff", 6 * 60 * 60),
+        )
+
+    @property
+    def backend(self):
+        """The backend of the synchronous methods."""
+        if self._backend is None:
+            self._backend = self._new_backend()
+            self._idle.append(self._backend)
+        return self._backend
+
+    def _new_backend(self):
+        backend = self._create_backend_from_config()
+        self._backends.append(backend)
+        return backend
 
     def _create_backend_from_config(self):
         """Create backend based on config settings."""
         backend_type = getattr(self.config, "mail_backend", "sendmail")
 
         if backend_type == "smtp":
+            from feedmailer.utils.mail_backends.smtp import SMTPBackend
+
             return SMTPBackend(
                 host=getattr(self.config, "smtp_host", "localhost"),
                 port=getattr(self.config, "smtp_port", 587),
@@ -22,20 +78,149 @@ class Mailer:
                 use_tls=getattr(self.config, "smtp_use_tls", True),
             )
         else:
+            from feedmailer.utils.mail_backends.sendmail import SendmailBackend
+
             return SendmailBackend()
 
-    def send(self, html_body, text_body, subject="Feed Updates"):
+    def send(self, html_body, text_body, subject="Feed Updates", recipient=None):
         """Send email with both HTML and plain text versions.
 
+        With a spool configured, the email is only spooled; flush delivers it.
+
+        Args:
+            html_body: HTML version of the email, a string or string chunks
+            text_body: Plain text version of the email, a string or string chunks
+            subject: Email subject line (default: "Feed Updates")
+            recipient: Email recipient address (default: the configured "to")
+        """
+        message = self._message(html_body, text_body, subject, recipient)
+        if self.spool is not None:
+            self.spool.add(message)
+        else:
+            self.backend.send(**message)
+
+    def send_many(self, messages):
+        """Send several emails, over one connection where the backend allows.
+
+        Args:
+            messages: Iterable of dicts with the keyword arguments of send
+        """
+        messages = (self._message(**message) for message in messages)
+        if self.spool is not None:
+            for message in messages:
+                self.spool.add(message)
+        else:
+            self.backend.send_many(messages)
+
+    async def send_async(
+        self, html_body, text_body, subject="Feed Updates", recipient=None
+    ):
+        """Send email without blocking the event loop.
+
         Args:
-            html_body: HTML version of the email
-            text_body: Plain text version of the email
+            html_body: HTML version of the email, a string or string chunks
+            text_body: Plain text version of the email, a string or string chunks
             subject: Email subject line (default: "Feed Updates")
+            recipient: Email recipient address (default: the configured "to")
         """
-        self.backend.send(
-            sender=self.config.sender,
-            recipient=self.config.recipient,
-            subject=subject,
-            html_body=html_body,
-            text_body=text_body,
+        message = self._message(html_body, text_body, subject, recipient)
+        if self.spool is not None:
+            self.spool.add(message)
+        else:
+            await self._deliver(message)
+
+    async def send_many_async(self, messages):
+        """Send several emails concurrently, up to mail_max_concurrency at once.
+
+        Args:
+            messages: Iterable of dicts with the keyword arguments of send
+        """
+        messages = [self._message(**message) for message in messages]
+        if self.spool is not None:
+            for message in messages:
+                self.spool.add(message)
+        else:
+            await asyncio.gather(*(self._deliver(message) for message in messages))
+
+    def flush(self):
+        """Deliver the spooled emails that are due, and reschedule failures.
+
+        Returns:
+            The number of emails delivered
+        """
+        if self.spool is None:
+            return 0
+        delivered = 0
+        for path, record in self.spool.due():
+            try:
+                self.backend.send(**record["message"])
+            except Exception:
+                self._delivery_failed(path, record)
+            else:
+                self.spool.delivered(path)
+                delivered += 1
+        return delivered
+
+    async def flush_async(self):
+        """Like flush, but deliver concurrently without blocking the event loop."""
+        if self.spool is None:
+            return 0
+        results = await asyncio.gather(
+            *(self._flush_one(path, record) for path, record in self.spool.due())
+        )
+        return sum(results)
+
+    async def _flush_one(self, path, record):
+        try:
+            await self._deliver(record["message"])
+        except Exception:
+            self._delivery_failed(path, record)
+            return 0
+        self.spool.delivered(path)
+        return 1
+
+    def _delivery_failed(self, path, record):
+        logger.exception(
+            "Delivering spooled mail to %s failed, retrying later",
+            record["message"]["recipient"],
         )
+        self.spool.failed(path, record)
+
+    async def _deliver(self, message):
+        if self._semaphore is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            max_concurrency = getattr(self.config, "mail_max_concurrency", 4)
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+            self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+        async with self._semaphore:
+            if self._idle:
+                backend = self._idle.pop()
+            else:
+                backend = self._new_backend()
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(
+                    self._executor, lambda: backend.send(**message)
+                )
+            finally:
+                self._idle.append(backend)
+
+    def close(self):
+        """Close connections the backends keep open between sends."""
+        for backend in self._backends:
+            backend.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._semaphore = None
+
+    def _message(self, html_body, text_body, subject="Feed Updates", recipient=None):
+        return {
+            "sender": self.config.sender,
+            "recipient": recipient or self.config.recipient,
+            "subject": subject,
+            "html_body": html_body,
+            "text_body": text_body,
+        }
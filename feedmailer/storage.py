@@ -1,17 +1,60 @@
-import json
-
-
 class Storage:
-    def __init__(self, path):
+    """Main storage class that delegates to a backend."""
+
+    def __init__(self, path, config=None):
         self.path = path
+        self.config = config
+        self.backend = self._create_backend_from_config()
+
+    def _create_backend_from_config(self):
+        """Create backend based on config settings."""
+        backend_type = getattr(self.config, "storage_backend", "json")
+        retention_days = getattr(self.config, "storage_retention_days", None)
+        retention = retention_days * 24 * 60 * 60 if retention_days else None
+
+        if backend_type == "sqlite":
+            from feedmailer.utils.storage_backends.sqlite import SQLiteBackend
+
+            return SQLiteBackend(
+                self.path,
+                retention=retention,
+                bloom=getattr(self.config, "storage_bloom", False),
+            )
+        else:
+            from feedmailer.utils.storage_backends.json_file import JSONFileBackend
+
+            return JSONFileBackend(
+                self.path,
+                retention=retention,
+                journal=getattr(self.config, "storage_journal", False),
+                compact_after=getattr(self.config, "storage_compact_after", 50),
+            )
+
+    @property
+    def feeds(self):
+        """Per-feed state keyed by url, e.g. HTTP validators."""
+        return self.backend.feeds
+
+    @feeds.setter
+    def feeds(self, feeds):
+        self.backend.feeds = feeds
 
     def load(self):
-        try:
-            with open(self.path, "r") as f:
-                return set(json.load(f).get("seen_links", []))
-        except (FileNotFoundError, json.JSONDecodeError):
-            return set()
+        return self.backend.load()
 
     def save(self, seen_links):
-        with open(self.path, "w") as f:
-            json.dump({"seen_links": list(seen_links)}, f)
+        self.backend.save(seen_links)
+
+    def commit(self, observed=None, now=None, renamed=None):
+        """Persist the links present in freshly parsed feeds and the feed state.
+
+        Args:
+            observed: Mapping of feed url to all links currently in that feed
+            now: Timestamp of the observation (default: current time)
+            renamed: Mapping of feed url to {link: key} of entries stored by
+                their link, to store by their key from now on
+        """
+        self.backend.commit(observed, now, renamed)
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,92 @@
+"""A minimal in-process SMTP server for tests."""
+
+import email
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, *lines):
+        for line in lines[:-1]:
+            self.wfile.write(f"250-{line}\r\n".encode())
+        self.wfile.write(f"{lines[-1]}\r\n".encode())
+
+    def _read_data(self):
+        """Return the message, or None if the client left before its end."""
+        lines = []
+        for line in self.rfile:
+            if line == b".\r\n":
+                return b"".join(lines)
+            lines.append(line[1:] if line.startswith(b".") else line)
+        return None
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self._reply("220 localhost feedmailer test server")
+        for line in self.rfile:
+            verb = line[:4].decode("ascii", "replace").upper()
+            if verb == "EHLO":
+                self._reply("localhost", "250 8BITMIME")
+            elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = self._read_data()
+                if data is None:
+                    break
+                with server.lock:
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                time.sleep(server.delay)
+                with server.lock:
+                    server.active -= 1
+                    server.messages.append(email.message_from_bytes(data))
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                break
+            else:
+                self._reply("502 Command not implemented")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """Accept mail on localhost and keep the received messages.
+
+    Use as a context manager; the server listens on a free port.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0.0):
+        """Initialize the server.
+
+        Args:
+            delay: Seconds to take for accepting each message, like a slow relay
+        """
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        # Number of messages being accepted at the same time, and its maximum.
+        self.active = 0
+        self.max_active = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -1,6 +1,18 @@
+import json
+import os
+import shutil
+import tempfile
 from unittest import TestCase, mock
+from unittest.mock import AsyncMock, MagicMock
 
 from feedmailer.app import App
+from feedmailer.feed_processor import Entry, FeedProcessor
+from feedmailer.storage import Storage
+
+
+def without_metrics(mock_config):
+    mock_config.metrics_json = None
+    mock_config.metrics_prometheus = None
 
 
 class TestAppTestCase(TestCase):
@@ -15,7 +27,9 @@ class TestAppTestCase(TestCase):
         App()
 
         mock_config_class.assert_called_once_with("config.json")
-        mock_storage_class.assert_called_once_with("status.json")
+        mock_storage_class.assert_called_once_with(
+            "status.json", mock_config_class.return_value
+        )
         mock_storage.load.assert_called_once()
 
     @mock.patch("feedmailer.app.Mailer")
@@ -31,6 +45,8 @@ class TestAppTestCase(TestCase):
         mock_mailer_class,
     ):
         mock_config = mock.Mock()
+        mock_config.subscribers = []
+        without_metrics(mock_config)
         mock_config_class.return_value = mock_config
 
         mock_storage = mock.Mock()
@@ -41,8 +57,10 @@ class TestAppTestCase(TestCase):
         mock_entry = mock.Mock(link="https://example.com/1")
         mock_processor.found = [mock_entry]
         mock_processor.collect.return_value = [mock_entry]
-        mock_processor.as_html.return_value = "<html><body><ul><li><a href='https://example.com/1'>Title</a></li></ul></body></html>"
-        mock_processor.as_text.return_value = "* Title\n  https://example.com/1"
+        mock_processor.generate_html.return_value = "<html><body><ul><li><a href='https://example.com/1'>Title</a></li></ul></body></html>"
+        mock_processor.generate_text.return_value = "* Title\n  https://example.com/1"
+        mock_processor.subject = "Feed Updates"
+        mock_processor.paginate.return_value = [mock_processor]
         mock_processor_class.return_value = mock_processor
 
         mock_mailer = mock.Mock()
@@ -52,11 +70,25 @@ class TestAppTestCase(TestCase):
         app.run()
 
         mock_processor.collect.assert_called_once()
-        mock_mailer.send.assert_called_once_with(
+        mock_mailer.send.assert_called_once()
+        html, text = mock_mailer.send.call_args.args
+        self.assertEqual(
+            "".join(html),
             "<html><body><ul><li><a href='https://example.com/1'>Title</a></li></ul></body></html>",
-            "* Title\n  https://example.com/1",
         )
-        mock_storage.save.assert_called_once()
+        self.assertEqual("".join(text), "* Title\n  https://example.com/1")
+        self.assertEqual(
+            mock_mailer.send.call_args.kwargs,
+            {"subject": "Feed Updates", "recipient": None},
+        )
+        mock_processor.paginate.assert_called_once_with(
+            max_entries=mock_config.mail_max_entries,
+            max_bytes=mock_config.mail_max_bytes,
+        )
+        mock_mailer.close.assert_called_once()
+        mock_storage.commit.assert_called_once_with(
+            mock_processor.observed, renamed=mock_processor.renamed
+        )
 
     @mock.patch("feedmailer.app.Mailer")
     @mock.patch("feedmailer.app.FeedProcessor")
@@ -70,6 +102,7 @@ class TestAppTestCase(TestCase):
         mock_processor_class,
         mock_mailer_class,
     ):
+        without_metrics(mock_config_class.return_value)
         mock_storage = mock.Mock()
         mock_storage.load.return_value = set()
         mock_storage_class.return_value = mock_storage
@@ -77,6 +110,8 @@ class TestAppTestCase(TestCase):
         mock_processor = mock.Mock()
         mock_processor.found = []
         mock_processor.collect.return_value = []
+        mock_processor.state_changed = False
+        mock_processor.observed = {}
         mock_processor_class.return_value = mock_processor
 
         mock_mailer = mock.Mock()
@@ -88,6 +123,38 @@ class TestAppTestCase(TestCase):
         mock_processor.collect.assert_called_once()
         mock_mailer.send.assert_not_called()
         mock_storage.save.assert_not_called()
+        mock_storage.commit.assert_not_called()
+
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.FeedProcessor")
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    @mock.patch("sys.argv", ["app.py", "config.json", "status.json"])
+    def test_app_run_saves_changed_feed_state(
+        self,
+        mock_config_class,
+        mock_storage_class,
+        mock_processor_class,
+        mock_mailer_class,
+    ):
+        without_metrics(mock_config_class.return_value)
+        mock_storage = mock.Mock()
+        mock_storage.load.return_value = {"https://example.com/old"}
+        mock_storage_class.return_value = mock_storage
+
+        mock_processor = mock.Mock()
+        mock_processor.found = []
+        mock_processor.collect.return_value = []
+        mock_processor.state_changed = True
+        mock_processor.observed = {}
+        mock_processor.renamed = {}
+        mock_processor_class.return_value = mock_processor
+
+        app = App()
+        app.run()
+
+        mock_mailer_class.return_value.send.assert_not_called()
+        mock_storage.commit.assert_called_once_with({}, renamed={})
 
     @mock.patch("feedmailer.app.Storage")
     @mock.patch("feedmailer.app.Config")
@@ -102,12 +169,464 @@ class TestAppTestCase(TestCase):
         mock_processor = mock.Mock()
         mock_entry = mock.Mock(link="https://example.com/new")
         mock_processor.found = [mock_entry]
+        mock_processor.observed = {
+            "https://example.com/feed": [
+                "https://example.com/old",
+                "https://example.com/new",
+            ]
+        }
 
         app._update_state(mock_processor)
 
-        saved_links = mock_storage.save.call_args[0][0]
-        self.assertIn("https://example.com/old", saved_links)
-        self.assertIn("https://example.com/new", saved_links)
+        mock_storage.commit.assert_called_once_with(
+            mock_processor.observed, renamed=mock_processor.renamed
+        )
+
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.FeedProcessor")
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    @mock.patch("sys.argv", ["app.py", "config.json", "status.json"])
+    def test_app_run_with_subscribers(
+        self,
+        mock_config_class,
+        mock_storage_class,
+        mock_processor_class,
+        mock_mailer_class,
+    ):
+        without_metrics(mock_config_class.return_value)
+        mock_config_class.return_value.subscribers = [
+            {"name": "alice", "to": "alice@example.com", "urls": ["https://a/feed"]},
+            {"name": "Bob Smith", "to": "bob@example.com", "urls": ["https://b/feed"]},
+        ]
+        storages = {}
+
+        def create_storage(path, config):
+            storages[path] = mock.Mock(feeds={"https://a/feed": {}})
+            storages[path].load.return_value = set()
+            return storages[path]
+
+        mock_storage_class.side_effect = create_storage
+
+        views = {
+            "https://a/feed": mock.Mock(
+                found=["entry"],
+                observed={"https://a/feed": ["https://a/1"]},
+                renamed={},
+            ),
+            "https://b/feed": mock.Mock(
+                found=["entry"],
+                observed={"https://b/feed": ["https://b/1"]},
+                renamed={},
+            ),
+        }
+        for view in views.values():
+            view.paginate.return_value = [view]
+        mock_processor = mock_processor_class.return_value
+        mock_processor.collect.return_value = []
+        mock_processor.state_changed = True
+        mock_processor.observed = {}
+        mock_processor.renamed = {}
+        mock_processor.for_subscriber.side_effect = lambda seen, urls, feed_state: (
+            views[urls[0]]
+        )
+        mock_mailer = mock_mailer_class.return_value
+
+        def send(html, text, subject, recipient):
+            if recipient == "bob@example.com":
+                msg = "Mailbox unavailable"
+                raise OSError(msg)
+
+        mock_mailer.send.side_effect = send
+
+        app = App()
+        with self.assertLogs("feedmailer.app", level="ERROR") as logs:
+            app.run()
+
+        self.assertEqual(
+            list(storages),
+            ["status.json", "status.alice.json", "status.Bob_Smith.json"],
+        )
+        # All feeds are fetched by one processor
+        mock_processor_class.assert_called_once_with(
+            app.config,
+            app.seen,
+            storages["status.json"].feeds,
+            urls=app.config.feed_urls,
+            metrics=app.metrics,
+        )
+        self.assertEqual(
+            [call.kwargs["recipient"] for call in mock_mailer.send.call_args_list],
+            ["alice@example.com", "bob@example.com"],
+        )
+        storages["status.alice.json"].commit.assert_called_once_with(
+            {"https://a/feed": ["https://a/1"]}, renamed={}
+        )
+        # The subscriber's own feed state is kept in their status file
+        self.assertIs(
+            mock_processor.for_subscriber.call_args_list[0].args[2],
+            storages["status.alice.json"].feeds,
+        )
+        storages["status.Bob_Smith.json"].commit.assert_not_called()
+        self.assertIn("Bob Smith", logs.output[0])
+        # Bob's feed is new to him, and is refetched in full after his failure
+        self.assertEqual(
+            [list(call.args[0]) for call in mock_processor.refetch.call_args_list],
+            [[], ["https://b/feed"], ["https://b/feed"]],
+        )
+        storages["status.json"].commit.assert_called_once_with({}, renamed={})
+
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.FeedProcessor")
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    @mock.patch("sys.argv", ["app.py", "config.json", "status.json"])
+    def test_app_run_flushes_after_commit(
+        self,
+        mock_config_class,
+        mock_storage_class,
+        mock_processor_class,
+        mock_mailer_class,
+    ):
+        without_metrics(mock_config_class.return_value)
+        calls = mock.Mock()
+        mock_storage_class.return_value.commit = calls.commit
+        mock_mailer_class.return_value.send = calls.send
+        mock_mailer_class.return_value.flush = calls.flush
+        mock_processor = mock_processor_class.return_value
+        mock_processor.collect.return_value = ["entry"]
+        mock_processor.paginate.return_value = [mock_processor]
+
+        App().run()
+
+        self.assertEqual(
+            [name for name, args, kwargs in calls.mock_calls],
+            ["send", "commit", "flush"],
+        )
+
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.FeedProcessor")
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    @mock.patch("sys.argv", ["app.py", "config.json", "status.json"])
+    def test_app_run_commits_each_page(
+        self,
+        mock_config_class,
+        mock_storage_class,
+        mock_processor_class,
+        mock_mailer_class,
+    ):
+        without_metrics(mock_config_class.return_value)
+        mock_config_class.return_value.subscribers = []
+        mock_storage = mock_storage_class.return_value
+        mock_storage.load.return_value = set()
+        mock_processor = mock_processor_class.return_value
+        mock_processor.collect.return_value = ["entry"] * 3
+        pages = [
+            mock.Mock(
+                subject=f"Feed Updates ({n}/3)", observed={"feed": [n]}, renamed={}
+            )
+            for n in range(1, 4)
+        ]
+        mock_processor.paginate.return_value = pages
+        mock_mailer = mock_mailer_class.return_value
+        mock_mailer.send.side_effect = [None, OSError("Mailbox full"), None]
+
+        with self.assertRaises(OSError):
+            App().run()
+
+        self.assertEqual(
+            [call.kwargs["subject"] for call in mock_mailer.send.call_args_list],
+            ["Feed Updates (1/3)", "Feed Updates (2/3)"],
+        )
+        # The delivered page is committed, and the feeds are parsed again
+        # next run for the rest, even if unchanged
+        self.assertEqual(
+            mock_storage.commit.call_args_list,
+            [mock.call({"feed": [1]}, renamed={}), mock.call()],
+        )
+        mock_processor.refetch.assert_called_with(mock_processor.observed)
+        mock_mailer.close.assert_called_once()
+
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.Config")
+    def test_app_run_killed_after_first_page_fetches_again(
+        self, mock_config_class, mock_mailer_class
+    ):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        status_file = os.path.join(temp_dir, "status.json")
+        feed = "https://example.com/feed"
+        storage = Storage(status_file)
+        storage.load()
+        storage.feeds[feed] = {"etag": '"v1"'}
+        storage.commit()
+
+        mock_config = mock_config_class.return_value
+        without_metrics(mock_config)
+        mock_config.subscribers = []
+        mock_config.urls = mock_config.feed_urls = [feed]
+        mock_config.mail_max_entries = 1
+        mock_config.mail_max_bytes = None
+        entries = [Entry(f"https://example.com/{n}", f"Entry {n}") for n in range(2)]
+
+        def collect(processor):
+            processor._update_feed_state(feed, {"etag": '"v2"'})
+            processor.observed[feed] = [entry.key for entry in entries]
+            processor.found = list(entries)
+            processor.context["feeds"].append({"name": "Feed", "entries": entries})
+            return processor.found
+
+        # The run is killed while sending the second page
+        mock_mailer_class.return_value.send.side_effect = [None, KeyboardInterrupt]
+        with (
+            mock.patch("sys.argv", ["app.py", "config.json", status_file]),
+            mock.patch("feedmailer.app.Storage", lambda path, config: Storage(path)),
+            mock.patch.object(FeedProcessor, "collect", collect),
+            self.assertRaises(KeyboardInterrupt),
+        ):
+            App().run()
+
+        storage = Storage(status_file)
+        seen = storage.load()
+        self.assertIn(entries[0].key, seen)
+        self.assertNotIn(entries[1].key, seen)
+        # Not conditional on the validators of the interrupted run
+        self.assertEqual(storage.feeds[feed]["etag"], '"v1"')
+
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.FeedProcessor")
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    @mock.patch("sys.argv", ["app.py", "config.json", "status.json"])
+    def test_app_run_writes_metrics(
+        self,
+        mock_config_class,
+        mock_storage_class,
+        mock_processor_class,
+        mock_mailer_class,
+    ):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        mock_config = mock_config_class.return_value
+        mock_config.subscribers = []
+        mock_config.metrics_json = os.path.join(temp_dir, "metrics.json")
+        mock_config.metrics_prometheus = os.path.join(temp_dir, "feedmailer.prom")
+        mock_processor = mock_processor_class.return_value
+        mock_processor.collect.return_value = ["entry"]
+        mock_processor.paginate.return_value = [mock_processor]
+        mock_processor.generate_html.return_value = iter(["<p>", "Entry", "</p>"])
+        mock_processor.generate_text.return_value = iter(["Entry"])
+        # Rendering happens while the mailer consumes the bodies
+        mock_mailer_class.return_value.send.side_effect = lambda html, text, **kwargs: (
+            "".join(html) + "".join(text)
+        )
+
+        app = App()
+        app.run()
+
+        # The processor records the feeds in the app's metrics
+        self.assertIs(mock_processor_class.call_args.kwargs["metrics"], app.metrics)
+        with open(mock_config.metrics_json) as f:
+            data = json.load(f)
+        self.assertEqual(
+            set(data["phases"]), {"load", "fetch", "render", "send", "save"}
+        )
+        with open(mock_config.metrics_prometheus) as f:
+            self.assertIn('feedmailer_phase_duration_seconds{phase="save"}', f.read())
+
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.FeedProcessor")
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    def test_app_run_writes_profile(
+        self,
+        mock_config_class,
+        mock_storage_class,
+        mock_processor_class,
+        mock_mailer_class,
+    ):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        without_metrics(mock_config_class.return_value)
+        mock_config_class.return_value.subscribers = []
+        mock_processor_class.return_value.collect.return_value = []
+        argv = ["app.py", "config.json", "status.json", "--profile", temp_dir]
+
+        with mock.patch("sys.argv", argv):
+            App().run()
+
+        names = sorted(os.listdir(temp_dir))
+        self.assertEqual(
+            [os.path.splitext(name)[1] for name in names], [".prof", ".txt"]
+        )
+        with open(os.path.join(temp_dir, names[1])) as f:
+            report = f.read()
+        # The storage is loaded before the run, but profiled with it
+        self.assertIn("Functions on the main thread", report)
+        self.assertIn("__init__", report)
+        self.assertIn("run", report)
+
+        # With a rate, only some runs are profiled
+        argv += ["--profile-rate", "50"]
+        with mock.patch("sys.argv", argv), mock.patch("random.randrange") as randrange:
+            randrange.return_value = 7
+            App().run()
+            randrange.assert_called_with(50)
+        self.assertEqual(len(os.listdir(temp_dir)), 2)
+
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    def test_app_rejects_invalid_profile_rate(
+        self, mock_config_class, mock_storage_class
+    ):
+        for rate in ("0", "-5"):
+            argv = ["app.py", "config.json", "status.json", "--profile-rate", rate]
+            with (
+                self.subTest(rate=rate),
+                mock.patch("sys.argv", argv),
+                mock.patch("sys.stderr") as stderr,
+                self.assertRaises(SystemExit) as raised,
+            ):
+                App()
+
+            self.assertEqual(raised.exception.code, 2)
+            self.assertIn(
+                "--profile-rate",
+                "".join(call.args[0] for call in stderr.write.call_args_list),
+            )
+        mock_config_class.assert_not_called()
+
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.FeedProcessor")
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    @mock.patch("sys.argv", ["app.py", "config.json", "status.json", "--flush"])
+    def test_app_flush_only(
+        self,
+        mock_config_class,
+        mock_storage_class,
+        mock_processor_class,
+        mock_mailer_class,
+    ):
+        without_metrics(mock_config_class.return_value)
+        App().run()
+
+        mock_processor_class.assert_not_called()
+        mock_mailer_class.return_value.flush.assert_called_once()
+        mock_mailer_class.return_value.close.assert_called_once()
+        mock_storage_class.return_value.commit.assert_not_called()
+
+    def _daemon_app(
+        self, mock_config_class, mock_storage_class, mock_session_fn, mock_mailer_class
+    ):
+        mock_config_class.return_value.daemon_interval = 0
+        without_metrics(mock_config_class.return_value)
+        mock_mailer_class.return_value.flush_async = AsyncMock(return_value=0)
+        mock_storage = mock.Mock()
+        mock_storage.load.return_value = set()
+        mock_storage_class.return_value = mock_storage
+
+        mock_session = MagicMock()
+        mock_session.__aenter__ = AsyncMock(return_value=mock_session)
+        mock_session.__aexit__ = AsyncMock(return_value=None)
+        mock_session_fn.return_value = mock_session
+        return App()
+
+    @mock.patch("feedmailer.app.create_executor", return_value=None)
+    @mock.patch("feedmailer.app.create_session")
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.FeedProcessor")
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    @mock.patch("sys.argv", ["app.py", "config.json", "status.json", "--daemon"])
+    def test_app_daemon_runs_until_stopped(
+        self,
+        mock_config_class,
+        mock_storage_class,
+        mock_processor_class,
+        mock_mailer_class,
+        mock_session_fn,
+        mock_executor_fn,
+    ):
+        app = self._daemon_app(
+            mock_config_class, mock_storage_class, mock_session_fn, mock_mailer_class
+        )
+        runs = []
+
+        async def collect_async(session=None, executor=None):
+            runs.append(session)
+            if len(runs) == 3:
+                app.stop()
+            return []
+
+        mock_processor = mock.Mock()
+        mock_processor.collect_async = collect_async
+        mock_processor.state_changed = False
+        mock_processor.observed = {"https://example.com/feed": []}
+        mock_processor_class.return_value = mock_processor
+
+        app.run()
+
+        self.assertEqual(len(runs), 3)
+        # One session is kept warm for all runs
+        mock_session_fn.assert_called_once()
+        self.assertEqual(set(runs), {mock_session_fn.return_value})
+        self.assertEqual(app.storage.commit.call_count, 3)
+        mock_mailer_class.return_value.send_async.assert_not_called()
+        self.assertEqual(mock_mailer_class.return_value.flush_async.await_count, 3)
+        mock_mailer_class.return_value.close.assert_called_once()
+
+    @mock.patch("feedmailer.app.create_executor", return_value=None)
+    @mock.patch("feedmailer.app.create_session")
+    @mock.patch("feedmailer.app.Mailer")
+    @mock.patch("feedmailer.app.FeedProcessor")
+    @mock.patch("feedmailer.app.Storage")
+    @mock.patch("feedmailer.app.Config")
+    @mock.patch("sys.argv", ["app.py", "config.json", "status.json", "--daemon"])
+    def test_app_daemon_survives_failed_run(
+        self,
+        mock_config_class,
+        mock_storage_class,
+        mock_processor_class,
+        mock_mailer_class,
+        mock_session_fn,
+        mock_executor_fn,
+    ):
+        app = self._daemon_app(
+            mock_config_class, mock_storage_class, mock_session_fn, mock_mailer_class
+        )
+        mock_mailer_class.return_value.send_async = mock.AsyncMock(
+            side_effect=[OSError("SMTP down"), None]
+        )
+        runs = []
+
+        async def collect_async(session=None, executor=None):
+            runs.append(session)
+            if len(runs) == 2:
+                app.stop()
+            return ["entry"]
+
+        mock_processor = mock.Mock()
+        mock_processor.collect_async = collect_async
+        mock_processor.paginate.return_value = [mock_processor]
+        mock_processor_class.return_value = mock_processor
+
+        with self.assertLogs("feedmailer.app", level="ERROR"):
+            app.run()
+
+        self.assertEqual(mock_mailer_class.return_value.send_async.await_count, 2)
+        # Of the failed run only the dropped validators are committed, and
+        # the state is reloaded
+        self.assertEqual(
+            app.storage.commit.call_args_list,
+            [
+                mock.call(),
+                mock.call(mock_processor.observed, renamed=mock_processor.renamed),
+            ],
+        )
+        mock_processor.refetch.assert_called_once_with(mock_processor.observed)
+        self.assertEqual(app.storage.load.call_count, 2)
 
 
 if __name__ == "__main__":
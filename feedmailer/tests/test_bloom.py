@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from feedmailer.utils.bloom import BloomFilter
+
+TOKEN = bytes(range(16))
+
+
+class TestBloomFilterTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.path = os.path.join(self.temp_dir, "status.db.bloom")
+
+    def _bloom(self, capacity=1000):
+        bloom = BloomFilter.create(self.path, capacity, TOKEN)
+        self.addCleanup(bloom.close)
+        return bloom
+
+    def test_bloom_filter_add(self):
+        bloom = self._bloom()
+
+        self.assertTrue(bloom.add("https://example.com/1"))
+        self.assertFalse(bloom.add("https://example.com/1"))
+
+        self.assertIn("https://example.com/1", bloom)
+        self.assertNotIn("https://example.com/2", bloom)
+        self.assertEqual(bloom.count, 1)
+
+    def test_bloom_filter_error_rate(self):
+        bloom = self._bloom(capacity=10000)
+        for n in range(10000):
+            bloom.add(f"https://example.com/{n}")
+
+        self.assertTrue(all(f"https://example.com/{n}" in bloom for n in range(10000)))
+        false_positives = sum(f"https://example.org/{n}" in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+        # About 10 bits per item
+        self.assertLess(os.path.getsize(self.path), 10000 * 10 / 8 * 1.1)
+
+    def test_bloom_filter_reopen(self):
+        bloom = self._bloom()
+        bloom.add("https://example.com/1")
+        bloom.flush()
+        bloom.close()
+
+        reopened = BloomFilter(self.path)
+        self.addCleanup(reopened.close)
+
+        self.assertIn("https://example.com/1", reopened)
+        self.assertEqual(reopened.count, 1)
+        self.assertEqual(reopened.capacity, 1000)
+        self.assertEqual(reopened.token, TOKEN)
+
+    def test_bloom_filter_rejects_other_files(self):
+        for content in (b"", b"SQLite format 3\x00" * 8):
+            with self.subTest(content=content):
+                with open(self.path, "wb") as f:
+                    f.write(content)
+
+                with self.assertRaises(ValueError):
+                    BloomFilter(self.path)
+
+        bloom = self._bloom()
+        bloom.close()
+        with open(self.path, "ab") as f:
+            f.write(b"\0")
+        with self.assertRaises(ValueError):
+            BloomFilter(self.path)
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
@@ -119,6 +119,248 @@ class TestConfigTestCase(TestCase):
         self.assertIsNone(config.smtp_username)
         self.assertIsNone(config.smtp_password)
         self.assertTrue(config.smtp_use_tls)
+        self.assertEqual(config.mail_max_concurrency, 4)
+        self.assertIsNone(config.mail_max_entries)
+        self.assertEqual(config.mail_max_bytes, 5 * 1024 * 1024)
+
+    def test_config_mail_max_concurrency(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"mail": {"max_concurrency": 8}}, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.mail_max_concurrency, 8)
+
+    def test_config_mail_limits(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"mail": {"max_entries": 200, "max_bytes": None}}, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.mail_max_entries, 200)
+        self.assertIsNone(config.mail_max_bytes)
+
+    def test_config_metrics(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"metrics": {"prometheus": "/var/lib/node/feedmailer.prom"}}, f)
+
+        config = Config(config_file)
+
+        self.assertIsNone(config.metrics_json)
+        self.assertEqual(config.metrics_prometheus, "/var/lib/node/feedmailer.prom")
+
+    def test_config_spool(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"spool": {"directory": "/var/spool/feedmailer"}}, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.spool_directory, "/var/spool/feedmailer")
+        self.assertEqual(config.spool_backoff, 300)
+        self.assertEqual(config.spool_max_backoff, 21600)
+
+    def test_config_fetch_defaults(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"urls": ["https://example.com/feed"]}, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.fetch_max_concurrency, 20)
+        self.assertEqual(config.fetch_max_per_host, 4)
+        self.assertEqual(config.fetch_host_delay, 0)
+        self.assertEqual(config.fetch_timeout, 30)
+        self.assertEqual(config.fetch_connect_timeout, 10)
+        self.assertEqual(config.fetch_read_timeout, 30)
+        self.assertEqual(config.fetch_max_size, 10 * 1024 * 1024)
+        self.assertEqual(config.fetch_failure_threshold, 3)
+        self.assertEqual(config.fetch_backoff, 3600)
+        self.assertEqual(config.fetch_max_backoff, 7 * 24 * 3600)
+
+    def test_config_fetch_limits(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        config_data = {
+            "urls": ["https://example.com/feed"],
+            "fetch": {"max_concurrency": 50, "max_per_host": 2, "host_delay": 1.5},
+        }
+        with open(config_file, "w") as f:
+            json.dump(config_data, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.fetch_max_concurrency, 50)
+        self.assertEqual(config.fetch_max_per_host, 2)
+        self.assertEqual(config.fetch_host_delay, 1.5)
+
+    def test_config_parse_executor(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        config_data = {
+            "parse": {"engine": "native", "executor": "process", "workers": 4}
+        }
+        with open(config_file, "w") as f:
+            json.dump(config_data, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.parse_engine, "native")
+        self.assertEqual(config.parse_executor, "process")
+        self.assertEqual(config.parse_workers, 4)
+
+    def test_config_parse_executor_defaults(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({}, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.parse_engine, "feedparser")
+        self.assertEqual(config.parse_executor, "thread")
+        self.assertIsNone(config.parse_workers)
+
+    def test_config_storage_backend(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump(
+                {"storage": {"backend": "sqlite", "retention_days": 90, "bloom": True}},
+                f,
+            )
+
+        config = Config(config_file)
+
+        self.assertEqual(config.storage_backend, "sqlite")
+        self.assertEqual(config.storage_retention_days, 90)
+        self.assertTrue(config.storage_bloom)
+
+    def test_config_storage_backend_default(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({}, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.storage_backend, "json")
+        self.assertIsNone(config.storage_retention_days)
+        self.assertFalse(config.storage_journal)
+        self.assertEqual(config.storage_compact_after, 50)
+        self.assertFalse(config.storage_bloom)
+
+    def test_config_daemon_interval(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"daemon": {"interval": 60}}, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.daemon_interval, 60)
+
+    def test_config_feed_options(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        config_data = {
+            "urls": [
+                "https://example.com/feed1",
+                {"url": "https://example.com/feed2", "interval": 3600},
+            ],
+            "fetch": {"adaptive": True, "min_interval": 600},
+        }
+        with open(config_file, "w") as f:
+            json.dump(config_data, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(
+            config.urls, ["https://example.com/feed1", "https://example.com/feed2"]
+        )
+        self.assertEqual(
+            config.feed_options,
+            {
+                "https://example.com/feed2": {
+                    "url": "https://example.com/feed2",
+                    "interval": 3600,
+                }
+            },
+        )
+        self.assertTrue(config.fetch_adaptive)
+        self.assertEqual(config.fetch_min_interval, 600)
+        self.assertEqual(config.fetch_max_interval, 86400)
+
+    def test_config_subscribers(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        config_data = {
+            "urls": ["https://example.com/feed1"],
+            "to": "owner@example.com",
+            "subscribers": [
+                {
+                    "name": "alice",
+                    "to": "alice@example.com",
+                    "urls": [
+                        "https://example.com/feed1",
+                        {"url": "https://example.com/feed2", "interval": 3600},
+                    ],
+                },
+                {"to": "bob@example.com", "urls": ["https://example.com/feed2"]},
+            ],
+        }
+        with open(config_file, "w") as f:
+            json.dump(config_data, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.urls, ["https://example.com/feed1"])
+        self.assertEqual(
+            config.subscribers,
+            [
+                {
+                    "name": "alice",
+                    "to": "alice@example.com",
+                    "urls": ["https://example.com/feed1", "https://example.com/feed2"],
+                },
+                {
+                    "name": "bob@example.com",
+                    "to": "bob@example.com",
+                    "urls": ["https://example.com/feed2"],
+                },
+            ],
+        )
+        # Every feed is fetched once
+        self.assertEqual(
+            config.feed_urls,
+            ["https://example.com/feed1", "https://example.com/feed2"],
+        )
+        self.assertEqual(
+            config.feed_options["https://example.com/feed2"]["interval"], 3600
+        )
+
+    def test_config_rejects_subscribers_sharing_a_status_file(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        for subscribers in (
+            [
+                {"name": "Bob Smith", "to": "a@example.com"},
+                {"name": "bob_smith", "to": "b@example.com"},
+            ],
+            [{"to": "bob@example.com"}, {"to": "bob@example.com"}],
+            [{"name": "journal", "to": "bob@example.com"}],
+            [{"name": "bob.Bloom", "to": "bob@example.com"}],
+        ):
+            with self.subTest(subscribers=subscribers):
+                with open(config_file, "w") as f:
+                    json.dump({"subscribers": subscribers}, f)
+
+                with self.assertRaises(ValueError):
+                    Config(config_file)
+
+    def test_config_without_subscribers(self):
+        config_file = os.path.join(self.temp_dir, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"urls": ["https://example.com/feed1"]}, f)
+
+        config = Config(config_file)
+
+        self.assertEqual(config.subscribers, [])
+        self.assertEqual(config.feed_urls, ["https://example.com/feed1"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+import time
+from unittest import TestCase, mock
+
+from feedmailer.utils.feed_parsers.native import NativeParser, parse_date
+from feedmailer.utils.feed_parsers.universal import UniversalParser
+
+RSS = b"""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel>
+  <title>Example feed</title>
+  <link>https://example.com/</link>
+  <ttl>60</ttl>
+  <image><title>Logo</title><url>https://example.com/logo.png</url></image>
+  <item>
+    <title> First &amp; foremost </title>
+    <link>https://example.com/1</link>
+    <guid isPermaLink="false"> tag:example.com,2023:1 </guid>
+    <pubDate>Tue, 14 Nov 2023 22:13:20 GMT</pubDate>
+    <description>&lt;p&gt;Summary&lt;/p&gt;</description>
+  </item>
+  <item>
+    <title>Second</title>
+    <link>https://example.com/2</link>
+  </item>
+</channel></rss>
+"""
+
+ATOM = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title type="text">Example Atom feed</title>
+  <link href="https://example.com/"/>
+  <entry>
+    <title>Atom entry</title>
+    <id>urn:uuid:1225c695-cfb8-4ebb-aaaa-80da344efa6a</id>
+    <link rel="edit" href="https://example.com/edit/1"/>
+    <link href="https://example.com/atom/1"/>
+    <link rel="alternate" type="application/pdf" href="https://example.com/1.pdf"/>
+    <updated>2023-11-14T22:13:20Z</updated>
+    <source><title>Source title</title></source>
+  </entry>
+</feed>
+"""
+
+RDF = b"""<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns="http://purl.org/rss/1.0/"
+         xmlns:dc="http://purl.org/dc/elements/1.1/">
+  <channel rdf:about="https://example.com/"><title>Example RDF feed</title></channel>
+  <item rdf:about="https://example.com/rdf/1">
+    <title>RDF entry</title>
+    <link>https://example.com/rdf/1</link>
+    <dc:date>2023-11-14T23:13:20+01:00</dc:date>
+  </item>
+</rdf:RDF>
+"""
+
+
+class TestNativeParserTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.parser = NativeParser()
+
+    def parse_natively(self, content):
+        with mock.patch.object(
+            self.parser.fallback, "parse", side_effect=AssertionError("Fell back")
+        ):
+            return self.parser.parse(content)
+
+    def test_native_parser_rss(self):
+        result = self.parse_natively(RSS)
+
+        self.assertEqual(result.feed.title, "Example feed")
+        self.assertEqual(result.feed.get("ttl"), "60")
+        self.assertEqual(
+            [e.link for e in result.entries],
+            ["https://example.com/1", "https://example.com/2"],
+        )
+        self.assertEqual(result.entries[0].title, "First & foremost")
+        self.assertEqual(result.entries[0].id, "tag:example.com,2023:1")
+        self.assertNotIn("id", result.entries[1])
+        self.assertEqual(
+            result.entries[0].published_parsed, time.gmtime(1700000000)[:9]
+        )
+        self.assertNotIn("published_parsed", result.entries[1])
+
+    def test_native_parser_atom(self):
+        result = self.parse_natively(ATOM)
+
+        self.assertEqual(result.feed.title, "Example Atom feed")
+        self.assertEqual(len(result.entries), 1)
+        self.assertEqual(result.entries[0].link, "https://example.com/atom/1")
+        self.assertEqual(result.entries[0].title, "Atom entry")
+        self.assertEqual(result.entries[0].updated_parsed, time.gmtime(1700000000)[:9])
+
+    def test_native_parser_rdf(self):
+        result = self.parse_natively(RDF)
+
+        self.assertEqual(result.feed.title, "Example RDF feed")
+        self.assertEqual(result.entries[0].link, "https://example.com/rdf/1")
+        self.assertEqual(result.entries[0].updated_parsed, time.gmtime(1700000000)[:9])
+
+    def test_native_parser_matches_feedparser(self):
+        universal = UniversalParser()
+        for content in (RSS, ATOM, RDF):
+            with self.subTest(content=content[:60]):
+                native = self.parse_natively(content)
+                expected = universal.parse(content)
+
+                self.assertEqual(native.feed.title, expected.feed.title)
+                self.assertEqual(
+                    [(e.link, e.title, e.get("id")) for e in native.entries],
+                    [(e.link, e.title, e.get("id")) for e in expected.entries],
+                )
+
+    def test_native_parser_falls_back_to_feedparser(self):
+        feeds = {
+            "malformed": b"<rss><channel><title>Broken</channel></rss>",
+            "undefined entity": RSS.replace(b"&amp;", b"&nbsp;"),
+            "relative link": RSS.replace(b"https://example.com/2", b"/2"),
+            "missing link": RSS.replace(b"<link>https://example.com/2</link>", b""),
+            "html title": ATOM.replace(b"<title>Atom", b'<title type="html">Atom'),
+            "other format": b'<feed xmlns="http://purl.org/atom/ns#"></feed>',
+        }
+        for reason, content in feeds.items():
+            with (
+                self.subTest(reason=reason),
+                mock.patch.object(self.parser.fallback, "parse") as fallback,
+            ):
+                result = self.parser.parse(content)
+
+                fallback.assert_called_once_with(content)
+                self.assertEqual(result, fallback.return_value)
+
+    def test_native_parser_falls_back_on_real_feedparser(self):
+        result = self.parser.parse(RSS.replace(b"&amp;", b"&nbsp;"))
+
+        self.assertEqual(result.feed.title, "Example feed")
+        self.assertEqual(len(result.entries), 2)
+
+    def test_parse_date(self):
+        expected = time.gmtime(1700000000)[:9]
+        for value in (
+            "Tue, 14 Nov 2023 22:13:20 GMT",
+            "Tue, 14 Nov 2023 23:13:20 +0100",
+            "2023-11-14T22:13:20Z",
+            "2023-11-14T22:13:20",
+        ):
+            with self.subTest(value=value):
+                self.assertEqual(tuple(parse_date(value)), expected)
+
+        self.assertIsNone(parse_date("yesterday"))
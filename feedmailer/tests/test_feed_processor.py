@@ -1,8 +1,21 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import wraps
 from unittest import TestCase, mock
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from feedmailer.feed_processor import FeedProcessor
+import feedparser
+import jinja2
+
+from feedmailer.feed_processor import (
+    Entry,
+    FeedProcessor,
+    create_executor,
+    get_jinja_env,
+)
+from feedmailer.utils.feed_parsers.native import NativeParser
+from feedmailer.utils.identity import id_key, url_key
 
 
 def mock_aiohttp_session(func):
@@ -20,8 +33,10 @@ def mock_aiohttp_session(func):
         def create_mock_resp(url, *req_args, **req_kwargs):
             urls_requested.append(url)
             mock_resp = AsyncMock()
+            mock_resp.status = 200
+            mock_resp.headers = {}
             # Return the URL as feed content so feedparser mock can identify which feed
-            mock_resp.text = AsyncMock(return_value=f"<feed>{url}</feed>")
+            set_body(mock_resp, f"<feed>{url}</feed>".encode())
             mock_resp.__aenter__ = AsyncMock(return_value=mock_resp)
             mock_resp.__aexit__ = AsyncMock(return_value=None)
             return mock_resp
@@ -37,11 +52,56 @@ def mock_aiohttp_session(func):
     return wrapper
 
 
+async def iter_chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def set_body(mock_resp, *chunks):
+    """Let a mock response stream the given body chunks."""
+    mock_resp.content_length = None
+    mock_resp.content = MagicMock()
+    mock_resp.content.iter_chunked = MagicMock(return_value=iter_chunks(*chunks))
+
+
+def mock_response_session(status=200, headers=None, body=b"<feed></feed>"):
+    """Create a mock aiohttp session returning a single canned response."""
+    mock_resp = AsyncMock()
+    mock_resp.status = status
+    mock_resp.headers = headers or {}
+    set_body(mock_resp, body)
+    mock_resp.__aenter__ = AsyncMock(return_value=mock_resp)
+    mock_resp.__aexit__ = AsyncMock(return_value=None)
+
+    mock_session = MagicMock()
+    mock_session.get = MagicMock(return_value=mock_resp)
+    mock_session.__aenter__ = AsyncMock(return_value=mock_session)
+    mock_session.__aexit__ = AsyncMock(return_value=None)
+    return mock_session
+
+
 class TestFeedProcessorTestCase(TestCase):
     def setUp(self):
         super().setUp()
         self.mock_config = mock.Mock()
         self.mock_config.urls = ["https://example.com/feed"]
+        self.mock_config.fetch_max_concurrency = 20
+        self.mock_config.fetch_max_per_host = 4
+        self.mock_config.fetch_host_delay = 0
+        self.mock_config.fetch_adaptive = False
+        self.mock_config.fetch_min_interval = 0
+        self.mock_config.fetch_max_interval = 86400
+        self.mock_config.feed_options = {}
+        self.mock_config.fetch_timeout = 30
+        self.mock_config.fetch_connect_timeout = 10
+        self.mock_config.fetch_read_timeout = 30
+        self.mock_config.fetch_max_size = 1024 * 1024
+        self.mock_config.fetch_failure_threshold = 3
+        self.mock_config.fetch_backoff = 3600
+        self.mock_config.fetch_max_backoff = 7 * 24 * 3600
+        self.mock_config.parse_engine = "feedparser"
+        self.mock_config.parse_executor = "thread"
+        self.mock_config.parse_workers = None
 
     @mock_aiohttp_session
     def test_feed_processor_collect_new_entries(self):
@@ -57,8 +117,34 @@ class TestFeedProcessorTestCase(TestCase):
             result = processor.collect()
 
         self.assertEqual(len(result), 2)
-        self.assertEqual(result[0], mock_entry1)
-        self.assertEqual(result[1], mock_entry2)
+        self.assertEqual(result[0].link, mock_entry1.link)
+        self.assertEqual(result[0].title, mock_entry1.title)
+        self.assertEqual(result[1].link, mock_entry2.link)
+
+    @mock_aiohttp_session
+    def test_feed_processor_keeps_compact_entries(self):
+        processor = FeedProcessor(self.mock_config, set())
+
+        entry = feedparser.FeedParserDict(
+            link="https://example.com/entry1",
+            title="Entry 1",
+            summary="Long summary " * 100,
+            published_parsed=time.gmtime(1700000000),
+        )
+        untitled = feedparser.FeedParserDict(link="https://example.com/entry2")
+        mock_feed = mock.Mock(entries=[entry, untitled], feed=mock.Mock(title="Feed"))
+
+        with mock.patch("feedparser.parse", return_value=mock_feed):
+            result = processor.collect()
+
+        self.assertIsInstance(result[0], Entry)
+        self.assertFalse(hasattr(result[0], "__dict__"))
+        self.assertEqual(
+            (result[0].link, result[0].title, result[0].feed, result[0].published),
+            ("https://example.com/entry1", "Entry 1", "Feed", 1700000000),
+        )
+        self.assertEqual((result[1].title, result[1].published), ("", None))
+        self.assertEqual(processor.context["feeds"][0]["entries"], result)
 
     @mock_aiohttp_session
     def test_feed_processor_filters_seen_entries(self):
@@ -74,7 +160,177 @@ class TestFeedProcessorTestCase(TestCase):
             result = processor.collect()
 
         self.assertEqual(len(result), 1)
-        self.assertEqual(result[0], mock_entry2)
+        self.assertEqual(result[0].link, mock_entry2.link)
+
+    @mock_aiohttp_session
+    def test_feed_processor_selects_entries_by_key(self):
+        self.mock_config.urls = [
+            "https://example.com/feed1",
+            "https://example.com/feed2",
+        ]
+        seen = {
+            # Keyed by guid in an earlier run, the link has changed since
+            id_key("urn:entry:1", "https://example.com/feed1"),
+            # From a status file written before entries were keyed
+            "https://example.com/legacy",
+        }
+        processor = FeedProcessor(self.mock_config, seen)
+
+        def mock_parse(content):
+            if b"feed1" in content.getvalue():
+                entries = [
+                    mock.Mock(link="https://example.com/moved", id="urn:entry:1"),
+                    mock.Mock(link="https://example.com/legacy", id=None),
+                    mock.Mock(link="https://example.com/new?utm_source=feed1", id=None),
+                ]
+            else:
+                entries = [
+                    mock.Mock(link="http://example.com/new?utm_source=feed2", id=None)
+                ]
+            return mock.Mock(entries=entries)
+
+        with mock.patch("feedparser.parse", side_effect=mock_parse):
+            result = processor.collect()
+
+        # The entry in both feeds is only sent once
+        self.assertEqual(
+            [e.link for e in result], ["https://example.com/new?utm_source=feed1"]
+        )
+        self.assertEqual(result[0].key, url_key("https://example.com/new"))
+        # The legacy link is now stored by its key
+        self.assertEqual(
+            processor.observed["https://example.com/feed1"],
+            [
+                id_key("urn:entry:1", "https://example.com/feed1"),
+                url_key("https://example.com/legacy"),
+                url_key("https://example.com/new"),
+            ],
+        )
+
+    @mock_aiohttp_session
+    def test_feed_processor_scopes_ids_to_their_feed(self):
+        feed1 = "https://example.com/feed1"
+        feed2 = "https://example.com/feed2"
+        self.mock_config.urls = [feed1, feed2]
+        # Seen in feed1 in an earlier run
+        processor = FeedProcessor(self.mock_config, {id_key("1", feed1)})
+
+        def mock_parse(content):
+            feed = "feed1" if b"feed1" in content.getvalue() else "feed2"
+            return mock.Mock(
+                entries=[
+                    mock.Mock(link=f"https://example.com/{feed}/1", id="1"),
+                    mock.Mock(link=f"https://example.com/{feed}/2", id="2"),
+                ]
+            )
+
+        with mock.patch("feedparser.parse", side_effect=mock_parse):
+            result = processor.collect()
+
+        # Both feeds number their entries alike, but they are different entries
+        self.assertEqual(
+            [e.link for e in result],
+            [
+                "https://example.com/feed1/2",
+                "https://example.com/feed2/1",
+                "https://example.com/feed2/2",
+            ],
+        )
+
+    def test_feed_processor_fans_out_to_subscribers(self):
+        feed1 = "https://example.com/feed1"
+        feed2 = "https://example.com/feed2"
+        feed3 = "https://example.com/feed3"
+        self.mock_config.urls = [feed1]
+        processor = FeedProcessor(
+            self.mock_config, {"https://example.com/1"}, urls=[feed1, feed2, feed3]
+        )
+
+        def mock_parse(content):
+            content = content.getvalue().decode()
+            if "feed1" in content:
+                links = ["https://example.com/1", "https://example.com/2"]
+            elif "feed2" in content:
+                links = ["https://example.com/3"]
+            else:
+                msg = "Parse error"
+                raise Exception(msg)
+            return mock.Mock(
+                entries=[mock.Mock(link=link, title=link) for link in links],
+                feed=mock.Mock(title=content),
+            )
+
+        session = MagicMock()
+        session.get = MagicMock(
+            side_effect=lambda url, **kwargs: mock_response_session(
+                body=f"<feed>{url}</feed>".encode()
+            ).get(url)
+        )
+        with mock.patch("feedparser.parse", side_effect=mock_parse):
+            result = asyncio.run(processor.collect_async(session=session))
+
+        # Every feed is fetched once, but only config.urls are collected
+        self.assertEqual(session.get.call_count, 3)
+        self.assertEqual([e.link for e in result], ["https://example.com/2"])
+        self.assertEqual(list(processor.observed), [feed1])
+
+        alice = processor.for_subscriber({"https://example.com/2"}, [feed1, feed2])
+        self.assertEqual(
+            [e.link for e in alice.found],
+            ["https://example.com/1", "https://example.com/3"],
+        )
+        self.assertEqual(list(alice.observed), [feed1, feed2])
+        self.assertEqual(alice.context["zero_links"], [])
+
+        bob = processor.for_subscriber(set(), [feed3])
+        self.assertEqual(bob.found, [])
+        self.assertEqual(bob.context["zero_links"], [f"{feed3}: Parse error"])
+        self.assertEqual(bob.observed, {})
+
+    def test_feed_processor_records_contact_for_subscribers(self):
+        feed1 = "https://example.com/feed1"
+        feed2 = "https://example.com/feed2"
+        self.mock_config.urls = []
+        processor = FeedProcessor(self.mock_config, set(), urls=[feed1, feed2])
+        mock_entry = mock.Mock(link="https://example.com/1", title="One")
+
+        session = MagicMock()
+        session.get = MagicMock(
+            side_effect=lambda url, **kwargs: mock_response_session(
+                status=304 if url == feed1 else 200
+            ).get(url)
+        )
+        with mock.patch(
+            "feedparser.parse", return_value=mock.Mock(entries=[mock_entry])
+        ):
+            asyncio.run(processor.collect_async(session=session))
+
+        # Neither feed is observed in the main status file, but both are polled
+        self.assertEqual(set(processor.contacted), {feed1, feed2})
+        self.assertIn("contacted", processor.feed_state[feed2])
+
+        feed_state = {}
+        alice = processor.for_subscriber(set(), [feed1, feed2], feed_state)
+
+        # The unchanged feed is kept in the subscriber's status file, too
+        self.assertTrue(alice.state_changed)
+        self.assertEqual(list(feed_state), [feed1])
+        self.assertEqual(feed_state[feed1]["contacted"], processor.contacted[feed1])
+        self.assertEqual(list(alice.observed), [feed2])
+
+    def test_feed_processor_refetch_drops_validators(self):
+        feed_state = {
+            "https://example.com/feed": {"etag": '"abc"', "last_modified": "x"},
+            "https://example.com/other": {"etag": '"def"'},
+        }
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+
+        processor.refetch(["https://example.com/feed"])
+
+        self.assertEqual(feed_state["https://example.com/feed"], {})
+        self.assertEqual(feed_state["https://example.com/other"], {"etag": '"def"'})
+        self.assertTrue(processor.state_changed)
+        self.assertEqual(processor._conditional_headers("https://example.com/feed"), {})
 
     @mock_aiohttp_session
     def test_feed_processor_multiple_feeds(self):
@@ -89,6 +345,7 @@ class TestFeedProcessorTestCase(TestCase):
 
         def mock_parse(content):
             # Content now contains "<feed>URL</feed>" from aiohttp mock
+            content = content.getvalue().decode()
             if "feed1" in content:
                 return mock.Mock(entries=[mock_entry1], feed=mock.Mock(title="Feed 1"))
             elif "feed2" in content:
@@ -130,6 +387,21 @@ class TestFeedProcessorTestCase(TestCase):
         self.assertIn("<ul>", html)
         self.assertIn("<li>", html)
 
+    def test_feed_processor_generate_matches_render(self):
+        processor = FeedProcessor(mock.Mock(), set())
+        processor.context["feeds"] = [
+            {
+                "name": "Test Feed",
+                "entries": [
+                    mock.Mock(title=f"Entry {n}", link=f"https://example.com/{n}")
+                    for n in range(3)
+                ],
+            }
+        ]
+
+        self.assertEqual("".join(processor.generate_html()), processor.as_html())
+        self.assertEqual("".join(processor.generate_text()), processor.as_text())
+
     def test_feed_processor_as_text(self):
         processor = FeedProcessor(mock.Mock(), set())
         mock_entry1 = mock.Mock(title="Entry 1", link="https://example.com/1")
@@ -268,6 +540,7 @@ class TestFeedProcessorTestCase(TestCase):
 
         def mock_parse(content):
             # Content now contains "<feed>URL</feed>" from aiohttp mock
+            content = content.getvalue().decode()
             if "feed1" in content:
                 # Successful feed
                 feed = mock.Mock(entries=[mock_entry1])
@@ -287,7 +560,7 @@ class TestFeedProcessorTestCase(TestCase):
 
         # Should have 1 found entry
         self.assertEqual(len(processor.found), 1)
-        self.assertEqual(processor.found[0], mock_entry1)
+        self.assertEqual(processor.found[0].link, mock_entry1.link)
 
         # Should have 2 zero_links entries (empty feed + exception)
         self.assertEqual(len(processor.context["zero_links"]), 2)
@@ -363,6 +636,423 @@ class TestFeedProcessorTestCase(TestCase):
         # Result should be empty list (no found, no zero_links)
         self.assertEqual(result, [])
 
+    def test_feed_processor_sends_conditional_headers(self):
+        feed_state = {
+            "https://example.com/feed": {
+                "etag": '"abc"',
+                "last_modified": "Wed, 21 Oct 2015 07:28:00 GMT",
+            }
+        }
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+        mock_session = mock_response_session(status=304)
+
+        with patch("aiohttp.ClientSession", return_value=mock_session):
+            processor.collect()
+
+        headers = mock_session.get.call_args[1]["headers"]
+        self.assertEqual(headers["If-None-Match"], '"abc"')
+        self.assertEqual(headers["If-Modified-Since"], "Wed, 21 Oct 2015 07:28:00 GMT")
+
+    def test_feed_processor_not_modified_skips_parsing(self):
+        """Test that a 304 response is neither parsed nor reported in zero_links"""
+        feed_state = {
+            "https://example.com/feed": {"etag": '"abc"', "contacted": time.time()}
+        }
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+        mock_session = mock_response_session(status=304)
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session),
+            mock.patch("feedparser.parse") as mock_parse,
+        ):
+            result = processor.collect()
+
+        mock_parse.assert_not_called()
+        self.assertEqual(result, [])
+        self.assertEqual(processor.context["zero_links"], [])
+        self.assertFalse(processor.state_changed)
+
+    def test_feed_processor_stores_validators(self):
+        processor = FeedProcessor(self.mock_config, {"https://example.com/entry1"})
+        mock_session = mock_response_session(
+            headers={"ETag": '"v2"', "Last-Modified": "Thu, 22 Oct 2015 07:28:00 GMT"}
+        )
+        mock_entry = mock.Mock(link="https://example.com/entry1", title="Entry 1")
+        mock_feed = mock.Mock(entries=[mock_entry])
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session),
+            mock.patch("feedparser.parse", return_value=mock_feed),
+        ):
+            processor.collect()
+
+        self.assertTrue(processor.state_changed)
+        self.assertEqual(
+            processor.feed_state["https://example.com/feed"],
+            {"etag": '"v2"', "last_modified": "Thu, 22 Oct 2015 07:28:00 GMT"},
+        )
+
+    def test_feed_processor_keeps_validators_of_failed_feed(self):
+        feed_state = {"https://example.com/feed": {"etag": '"abc"'}}
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+        mock_session = mock_response_session(headers={"ETag": '"broken"'})
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session),
+            mock.patch("feedparser.parse", return_value=mock.Mock(entries=[])),
+        ):
+            processor.collect()
+
+        self.assertEqual(
+            processor.feed_state["https://example.com/feed"],
+            {"etag": '"abc"', "failures": 1},
+        )
+
+    @mock_aiohttp_session
+    def test_feed_processor_observes_all_links(self):
+        self.mock_config.urls = [
+            "https://example.com/feed1",
+            "https://example.com/feed2",
+        ]
+        processor = FeedProcessor(self.mock_config, {"https://example.com/entry1"})
+
+        mock_entry1 = mock.Mock(link="https://example.com/entry1", title="Entry 1")
+        mock_entry2 = mock.Mock(link="https://example.com/entry2", title="Entry 2")
+
+        def mock_parse(content):
+            if b"feed1" in content.getvalue():
+                return mock.Mock(entries=[mock_entry1, mock_entry2])
+            msg = "Parse error"
+            raise Exception(msg)
+
+        with mock.patch("feedparser.parse", side_effect=mock_parse):
+            processor.collect()
+
+        self.assertEqual(
+            processor.observed,
+            {
+                "https://example.com/feed1": [
+                    url_key("https://example.com/entry1"),
+                    url_key("https://example.com/entry2"),
+                ]
+            },
+        )
+
+    @mock_aiohttp_session
+    def test_feed_processor_fetches_only_due_feeds(self):
+        now = time.time()
+        self.mock_config.urls = [
+            "https://example.com/feed1",
+            "https://example.com/feed2",
+            "https://example.com/feed3",
+        ]
+        self.mock_config.feed_options = {
+            "https://example.com/feed1": {"interval": 3600},
+            "https://example.com/feed2": {"interval": 3600},
+        }
+        feed_state = {
+            "https://example.com/feed1": {"checked": now - 600},
+            "https://example.com/feed2": {"checked": now - 3600},
+            "https://example.com/feed3": {"checked": now - 600},
+        }
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+
+        with mock.patch("feedparser.parse", return_value=mock.Mock(entries=[])):
+            processor.collect()
+
+        # feed1 was checked too recently; feed3 has no interval
+        zero_links = " ".join(processor.context["zero_links"])
+        self.assertNotIn("feed1", zero_links)
+        self.assertIn("feed2", zero_links)
+        self.assertIn("feed3", zero_links)
+
+    def test_feed_processor_learns_interval(self):
+        self.mock_config.fetch_adaptive = True
+        self.mock_config.fetch_min_interval = 900
+        processor = FeedProcessor(self.mock_config, set())
+        mock_session = mock_response_session(headers={"Cache-Control": "max-age=7200"})
+        mock_feed = mock.Mock(
+            entries=[mock.Mock(link="https://example.com/entry1", title="Entry 1")],
+            feed=mock.Mock(title="Feed"),
+        )
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session),
+            mock.patch("feedparser.parse", return_value=mock_feed),
+        ):
+            processor.collect()
+
+        state = processor.feed_state["https://example.com/feed"]
+        self.assertEqual(state["interval"], 7200)
+        self.assertAlmostEqual(state["checked"], time.time(), delta=60)
+
+    def test_feed_processor_not_modified_keeps_interval(self):
+        self.mock_config.fetch_adaptive = True
+        feed_state = {"https://example.com/feed": {"checked": 0, "interval": 7200}}
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+        mock_session = mock_response_session(status=304)
+
+        with patch("aiohttp.ClientSession", return_value=mock_session):
+            processor.collect()
+
+        state = processor.feed_state["https://example.com/feed"]
+        self.assertEqual(state["interval"], 7200)
+        self.assertGreater(state["checked"], 0)
+
+    def test_feed_processor_counts_failures(self):
+        feed_state = {"https://example.com/feed": {"failures": 1}}
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+        mock_session = mock_response_session()
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session),
+            mock.patch("feedparser.parse", side_effect=Exception("Parse error")),
+        ):
+            processor.collect()
+
+        state = processor.feed_state["https://example.com/feed"]
+        self.assertEqual(state["failures"], 2)
+        self.assertNotIn("retry_at", state)
+        self.assertTrue(processor.state_changed)
+
+    def test_feed_processor_backs_off_exponentially(self):
+        feed_state = {"https://example.com/feed": {"failures": 3}}
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+        mock_session = mock_response_session(status=500)
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session),
+            mock.patch("feedparser.parse") as mock_parse,
+        ):
+            processor.collect()
+
+        mock_parse.assert_not_called()
+        self.assertIn("HTTP status 500", processor.context["zero_links"][0])
+
+        state = processor.feed_state["https://example.com/feed"]
+        self.assertEqual(state["failures"], 4)
+        # Second failure past the threshold: twice the base backoff
+        self.assertAlmostEqual(state["retry_at"], time.time() + 2 * 3600, delta=60)
+
+    def test_feed_processor_skips_feed_in_backoff(self):
+        feed_state = {
+            "https://example.com/feed": {"failures": 5, "retry_at": time.time() + 60}
+        }
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+        mock_session = mock_response_session()
+
+        with patch("aiohttp.ClientSession", return_value=mock_session):
+            result = processor.collect()
+
+        mock_session.get.assert_not_called()
+        self.assertEqual(result, [])
+        self.assertEqual(processor.context["zero_links"], [])
+        state = processor.feed_state["https://example.com/feed"]
+        self.assertAlmostEqual(state["contacted"], time.time(), delta=60)
+
+    def test_feed_processor_success_resets_failures(self):
+        feed_state = {
+            "https://example.com/feed": {"failures": 5, "retry_at": time.time() - 60}
+        }
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+        mock_session = mock_response_session(status=304)
+
+        with patch("aiohttp.ClientSession", return_value=mock_session):
+            processor.collect()
+
+        self.assertEqual(
+            list(processor.feed_state["https://example.com/feed"]), ["contacted"]
+        )
+
+    def test_feed_processor_not_modified_records_contact(self):
+        feed_state = {"https://example.com/feed": {"etag": '"abc"', "contacted": 0}}
+        processor = FeedProcessor(self.mock_config, set(), feed_state)
+        mock_session = mock_response_session(status=304)
+
+        with patch("aiohttp.ClientSession", return_value=mock_session):
+            processor.collect()
+
+        state = processor.feed_state["https://example.com/feed"]
+        self.assertAlmostEqual(state["contacted"], time.time(), delta=60)
+        self.assertTrue(processor.state_changed)
+
+    def test_feed_processor_per_feed_timeouts(self):
+        self.mock_config.feed_options = {
+            "https://example.com/feed": {"connect_timeout": 2, "read_timeout": 5}
+        }
+        processor = FeedProcessor(self.mock_config, set())
+        mock_session = mock_response_session(status=304)
+
+        with patch("aiohttp.ClientSession", return_value=mock_session):
+            processor.collect()
+
+        timeout = mock_session.get.call_args[1]["timeout"]
+        self.assertEqual(timeout.total, 30)
+        self.assertEqual(timeout.sock_connect, 2)
+        self.assertEqual(timeout.sock_read, 5)
+
+    def test_feed_processor_streams_body_to_parser(self):
+        processor = FeedProcessor(self.mock_config, set())
+        mock_session = mock_response_session()
+        set_body(mock_session.get.return_value, b"<rss>", b"<channel/>", b"</rss>")
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session),
+            mock.patch("feedparser.parse", return_value=mock.Mock(entries=[])) as parse,
+        ):
+            processor.collect()
+
+        self.assertEqual(parse.call_args[0][0].getvalue(), b"<rss><channel/></rss>")
+
+    def test_feed_processor_aborts_oversized_body(self):
+        self.mock_config.fetch_max_size = 10
+        processor = FeedProcessor(self.mock_config, set())
+        mock_session = mock_response_session()
+        mock_resp = mock_session.get.return_value
+        set_body(mock_resp, b"<rss>", b"<channel>", b"never read")
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session),
+            mock.patch("feedparser.parse") as mock_parse,
+        ):
+            processor.collect()
+
+        mock_parse.assert_not_called()
+        self.assertIn("larger than 10 bytes", processor.context["zero_links"][0])
+
+    def test_feed_processor_rejects_oversized_content_length(self):
+        self.mock_config.feed_options = {"https://example.com/feed": {"max_size": 100}}
+        processor = FeedProcessor(self.mock_config, set())
+        mock_session = mock_response_session()
+        mock_resp = mock_session.get.return_value
+        mock_resp.content_length = 200 * 1024 * 1024
+
+        with patch("aiohttp.ClientSession", return_value=mock_session):
+            processor.collect()
+
+        mock_resp.content.iter_chunked.assert_not_called()
+        self.assertIn("larger than 100 bytes", processor.context["zero_links"][0])
+
+    def test_feed_processor_limits_connections(self):
+        self.mock_config.fetch_max_concurrency = 5
+        self.mock_config.fetch_max_per_host = 1
+        processor = FeedProcessor(self.mock_config, set())
+        mock_session = mock_response_session(status=304)
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session) as session_class,
+            patch("aiohttp.TCPConnector") as connector_class,
+        ):
+            processor.collect()
+
+        connector_class.assert_called_once_with(limit=5, limit_per_host=1)
+        session_class.assert_called_once()
+        self.assertEqual(
+            session_class.call_args.kwargs["connector"], connector_class.return_value
+        )
+
+    def test_feed_processor_parse_executor(self):
+        for executor, executor_class in (
+            ("thread", ThreadPoolExecutor),
+            ("process", ProcessPoolExecutor),
+        ):
+            with self.subTest(executor=executor):
+                self.mock_config.parse_executor = executor
+                self.mock_config.parse_workers = 2
+                pool = create_executor(self.mock_config)
+                try:
+                    self.assertIsInstance(pool, executor_class)
+                finally:
+                    pool.shutdown()
+
+    def test_feed_processor_parses_malformed_feed_in_process_pool(self):
+        body = (
+            b'<rss version="2.0"><channel><title>Bozo feed</title>'
+            b"<item><title>One&nbsp;</title><link>https://example.com/1</link></item>"
+            b"</channel></rss>"
+        )
+        self.mock_config.parse_executor = "process"
+        self.mock_config.parse_workers = 1
+        for engine in ("feedparser", "native"):
+            with self.subTest(engine=engine):
+                self.mock_config.parse_engine = engine
+                processor = FeedProcessor(self.mock_config, set())
+                mock_session = mock_response_session(body=body)
+
+                with patch("aiohttp.ClientSession", return_value=mock_session):
+                    result = processor.collect()
+
+                self.assertEqual([e.link for e in result], ["https://example.com/1"])
+                self.assertEqual(processor.context["zero_links"], [])
+                self.assertEqual(processor.feed_state, {})
+
+    def test_feed_processor_native_parse_engine(self):
+        self.mock_config.parse_engine = "native"
+        self.mock_config.parse_executor = None
+        processor = FeedProcessor(self.mock_config, {"https://example.com/1"})
+        body = (
+            b"<rss><channel><title>Native feed</title>"
+            b"<item><title>One</title><link>https://example.com/1</link></item>"
+            b"<item><title>Two</title><link>https://example.com/2</link></item>"
+            b"</channel></rss>"
+        )
+        mock_session = mock_response_session(body=body)
+
+        with (
+            patch("aiohttp.ClientSession", return_value=mock_session),
+            mock.patch("feedparser.parse") as feedparser_parse,
+        ):
+            result = processor.collect()
+
+        feedparser_parse.assert_not_called()
+        self.assertIsInstance(processor._parser, NativeParser)
+        self.assertEqual(
+            [(e.link, e.title) for e in result], [("https://example.com/2", "Two")]
+        )
+        self.assertEqual(processor.context["feeds"][0]["name"], "Native feed")
+
+    @mock_aiohttp_session
+    def test_feed_processor_parses_inline_without_executor(self):
+        self.mock_config.parse_executor = None
+        processor = FeedProcessor(self.mock_config, set())
+
+        mock_entry = mock.Mock(link="https://example.com/entry1", title="Entry 1")
+        mock_feed = mock.Mock(entries=[mock_entry])
+
+        with mock.patch("feedparser.parse", return_value=mock_feed):
+            result = processor.collect()
+
+        self.assertEqual([e.link for e in result], [mock_entry.link])
+        self.assertIsNone(create_executor(self.mock_config))
+
+    def test_feed_processor_shares_template_environment(self):
+        first = FeedProcessor(self.mock_config, set())
+        second = FeedProcessor(self.mock_config, set())
+
+        self.assertIs(first.jinja_env, second.jinja_env)
+        self.assertIs(first.jinja_env, get_jinja_env())
+        self.assertIsInstance(
+            first.jinja_env.bytecode_cache, jinja2.FileSystemBytecodeCache
+        )
+        # Templates are compiled once and then served from memory
+        self.assertIs(
+            first.jinja_env.get_template("email/overview.html"),
+            second.jinja_env.get_template("email/overview.html"),
+        )
+
+    def test_feed_processor_template_environment_without_bytecode_cache(self):
+        with (
+            patch("feedmailer.feed_processor._jinja_env", None),
+            patch(
+                "jinja2.FileSystemBytecodeCache",
+                side_effect=RuntimeError("Unsafe temporary directory"),
+            ),
+        ):
+            processor = FeedProcessor(self.mock_config, set())
+
+            self.assertIsNone(processor.jinja_env.bytecode_cache)
+            self.assertIn("Feed Updates", processor.as_text())
+
     def test_feed_processor_as_html_with_zero_links(self):
         """Test that zero_links appear in HTML template"""
         processor = FeedProcessor(mock.Mock(), set())
@@ -431,6 +1121,89 @@ class TestFeedProcessorTestCase(TestCase):
         self.assertIn("### Zero links", text)
         self.assertIn("https://feed1.com: Network error", text)
 
+    def _digest(self, entries_per_feed):
+        processor = FeedProcessor(mock.Mock(), set())
+        for number, count in enumerate(entries_per_feed):
+            url = f"https://example.com/{number}/feed"
+            entries = [
+                Entry(f"https://example.com/{number}/{n}", f"Entry {n}")
+                for n in range(count)
+            ]
+            processor.found.extend(entries)
+            processor.context["feeds"].append(
+                {"name": f"Feed {number}", "entries": entries}
+            )
+            processor.observed[url] = [
+                f"https://example.com/{number}/old",
+                *(entry.key for entry in entries),
+            ]
+        processor.context["zero_links"] = ["https://broken.example.com: Error"]
+        return processor
+
+    def test_feed_processor_paginate_within_limits(self):
+        processor = self._digest([3, 2])
+
+        self.assertEqual(processor.paginate(), [processor])
+        self.assertEqual(processor.paginate(max_entries=5), [processor])
+        self.assertEqual(processor.paginate(max_bytes=10**6), [processor])
+        self.assertEqual(processor.subject, "Feed Updates")
+
+    def test_feed_processor_paginate_by_entries(self):
+        processor = self._digest([3, 2])
+
+        pages = processor.paginate(max_entries=2)
+
+        self.assertEqual(
+            [page.subject for page in pages],
+            ["Feed Updates (1/3)", "Feed Updates (2/3)", "Feed Updates (3/3)"],
+        )
+        self.assertEqual(
+            [
+                [(feed["name"], len(feed["entries"])) for feed in page.context["feeds"]]
+                for page in pages
+            ],
+            [[("Feed 0", 2)], [("Feed 0", 1), ("Feed 1", 1)], [("Feed 1", 1)]],
+        )
+        self.assertEqual(
+            [page.context["zero_links"] for page in pages],
+            [["https://broken.example.com: Error"], [], []],
+        )
+        # Each page observes the links delivered so far, the last one all
+        self.assertEqual(
+            pages[0].observed,
+            {
+                "https://example.com/0/feed": [
+                    "https://example.com/0/old",
+                    url_key("https://example.com/0/0"),
+                    url_key("https://example.com/0/1"),
+                ],
+                "https://example.com/1/feed": ["https://example.com/1/old"],
+            },
+        )
+        self.assertEqual(pages[2].observed, processor.observed)
+        self.assertEqual([len(page.found) for page in pages], [2, 2, 1])
+
+    def test_feed_processor_paginate_by_size(self):
+        processor = self._digest([40, 40])
+        max_bytes = len(processor.as_html().encode()) // 3
+
+        pages = processor.paginate(max_bytes=max_bytes)
+
+        self.assertGreater(len(pages), 3)
+        for page in pages:
+            size = len(page.as_html().encode()) + len(page.as_text().encode())
+            self.assertLessEqual(size, max_bytes)
+        self.assertEqual(
+            [entry for page in pages for entry in page.found], processor.found
+        )
+
+    def test_feed_processor_paginate_oversized_entry(self):
+        processor = self._digest([2])
+
+        pages = processor.paginate(max_bytes=1)
+
+        self.assertEqual([len(page.found) for page in pages], [1, 1])
+
 
 if __name__ == "__main__":
     from unittest import main
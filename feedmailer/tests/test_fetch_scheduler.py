@@ -0,0 +1,79 @@
+import asyncio
+from unittest import TestCase
+
+from feedmailer.utils.fetch_scheduler import FetchScheduler
+
+
+class TestFetchSchedulerTestCase(TestCase):
+    def _run(self, scheduler, urls, duration=0.0):
+        """Run one fake fetch per url and record (url, start, peak running)."""
+        running = 0
+        peak = 0
+        starts = []
+
+        async def fetch(url):
+            nonlocal running, peak
+            async with scheduler.slot(url):
+                starts.append((url, asyncio.get_running_loop().time()))
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(duration)
+                running -= 1
+
+        async def main():
+            begin = asyncio.get_running_loop().time()
+            await asyncio.gather(*(fetch(url) for url in urls))
+            return begin
+
+        begin = asyncio.run(main())
+        return [(url, start - begin) for url, start in starts], peak
+
+    def test_scheduler_caps_concurrency(self):
+        scheduler = FetchScheduler(max_concurrency=3)
+        urls = [f"https://host{i}.example.com/feed" for i in range(10)]
+
+        starts, peak = self._run(scheduler, urls, duration=0.01)
+
+        self.assertEqual(len(starts), 10)
+        self.assertEqual(peak, 3)
+
+    def test_scheduler_spreads_requests_per_host(self):
+        scheduler = FetchScheduler(max_concurrency=10, host_delay=0.05)
+        urls = [
+            "https://a.example.com/1",
+            "https://b.example.com/1",
+            "https://a.example.com/2",
+            "https://a.example.com/3",
+        ]
+
+        starts, _peak = self._run(scheduler, urls)
+
+        a_starts = sorted(start for url, start in starts if "a.example" in url)
+        b_starts = [start for url, start in starts if "b.example" in url]
+        self.assertLess(b_starts[0], 0.04)
+        for earlier, later in zip(a_starts, a_starts[1:], strict=False):
+            self.assertGreaterEqual(later - earlier, 0.04)
+
+    def test_scheduler_spreads_requests_queued_for_a_slot(self):
+        scheduler = FetchScheduler(max_concurrency=2, host_delay=0.05)
+        urls = [
+            "https://b.example.com/1",
+            "https://c.example.com/1",
+            "https://a.example.com/1",
+            "https://a.example.com/2",
+            "https://a.example.com/3",
+        ]
+
+        starts, peak = self._run(scheduler, urls, duration=0.2)
+
+        a_starts = sorted(start for url, start in starts if "a.example" in url)
+        self.assertEqual(peak, 2)
+        self.assertGreaterEqual(a_starts[0], 0.19)
+        for earlier, later in zip(a_starts, a_starts[1:], strict=False):
+            self.assertGreaterEqual(later - earlier, 0.04)
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
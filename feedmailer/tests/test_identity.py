@@ -0,0 +1,92 @@
+from unittest import TestCase
+
+from feedparser import FeedParserDict
+
+from feedmailer.utils.identity import canonical_url, entry_keys, id_key, url_key
+
+
+def parsed_entry(link, entry_id=None):
+    entry = FeedParserDict(link=link)
+    if entry_id is not None:
+        entry["id"] = entry_id
+    return entry
+
+
+class TestIdentityTestCase(TestCase):
+    def test_canonical_url(self):
+        self.assertEqual(
+            canonical_url(" HTTPS://Example.COM:443/Post?b=2&utm_source=rss&a=1#top "),
+            "//example.com/Post?a=1&b=2#top",
+        )
+        self.assertEqual(canonical_url("http://example.com"), "//example.com/")
+        self.assertEqual(
+            canonical_url("http://example.com:8080/"), "//example.com:8080/"
+        )
+        self.assertEqual(
+            canonical_url("tag:example.com,2023:1"), "tag:example.com,2023:1"
+        )
+        self.assertEqual(
+            canonical_url("http://example.com:bad/"), "http://example.com:bad/"
+        )
+
+    def test_url_key_ignores_scheme_and_tracking(self):
+        key = url_key("https://example.com/post?id=7")
+
+        self.assertEqual(len(key), 22)
+        self.assertEqual(url_key("http://example.com/post?id=7"), key)
+        self.assertEqual(
+            url_key("https://example.com/post?utm_medium=feed&id=7&fbclid=x"), key
+        )
+        self.assertNotEqual(url_key("https://example.com/post?id=8"), key)
+
+    def test_id_key(self):
+        feed = "https://example.com/feed"
+        self.assertEqual(id_key(" urn:uuid:1 ", feed), id_key("urn:uuid:1", feed))
+        self.assertNotEqual(id_key("urn:uuid:1", feed), id_key("urn:uuid:2", feed))
+        # Ids are only unique within their feed
+        self.assertNotEqual(id_key("1", feed), id_key("1", "https://example.org/feed"))
+        self.assertEqual(id_key("1", feed), id_key("1", "http://example.com/feed"))
+        # Permalink guids are keyed like the link they are, in any feed
+        self.assertEqual(
+            id_key("https://example.com/1?utm_source=x", feed),
+            url_key("http://example.com/1"),
+        )
+        # An id that happens to read like a link is not confused with one
+        self.assertNotEqual(id_key("example.com/1", feed), url_key("example.com/1"))
+
+    def test_entry_keys(self):
+        feed = "https://example.com/feed"
+        entries = [
+            parsed_entry("https://example.com/1", "urn:1"),
+            parsed_entry("https://example.com/2?utm_source=rss"),
+            parsed_entry("https://example.com/3", ""),
+            # Ids shared by several entries don't identify them
+            parsed_entry("https://example.com/4", "same"),
+            parsed_entry("https://example.com/5", "same"),
+        ]
+
+        self.assertEqual(
+            entry_keys(entries, feed),
+            [
+                id_key("urn:1", feed),
+                url_key("https://example.com/2"),
+                url_key("https://example.com/3"),
+                url_key("https://example.com/4"),
+                url_key("https://example.com/5"),
+            ],
+        )
+
+    def test_entry_keys_of_feeds_sharing_guids(self):
+        entries = [parsed_entry("https://a.example.com/1", "1")]
+        other = [parsed_entry("https://b.example.com/1", "1")]
+
+        self.assertNotEqual(
+            entry_keys(entries, "https://a.example.com/feed"),
+            entry_keys(other, "https://b.example.com/feed"),
+        )
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules only the stages that need them may load.
+FETCH_MODULES = ("aiohttp", "feedparser")
+RENDER_MODULES = ("jinja2",)
+MAIL_MODULES = ("smtplib", "email.mime", "feedmailer.utils.mail_backends")
+OTHER_MODULES = ("sqlite3", "cProfile", "multiprocessing")
+
+COLLECT = """
+import sys
+from feedmailer.config import Config
+from feedmailer.feed_processor import FeedProcessor
+FeedProcessor(Config(sys.argv[1]), set()).collect()
+"""
+
+
+def imported_modules(code, *args):
+    """Return the modules a fresh interpreter imports to run code.
+
+    The modules are read from the output of python -X importtime, which
+    lists every module the first time it is imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code, *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {
+        line.rsplit("|", 1)[1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.count("|") == 2
+    }
+
+
+class TestImportsTestCase(TestCase):
+    def assertNotImported(self, modules, names):
+        imported = sorted(
+            module
+            for module in modules
+            for name in names
+            if module == name or module.startswith(f"{name}.")
+        )
+        self.assertEqual(imported, [])
+
+    def test_app_import_is_light(self):
+        modules = imported_modules("import feedmailer.app")
+
+        self.assertIn("feedmailer.app", modules)
+        self.assertNotImported(
+            modules, FETCH_MODULES + RENDER_MODULES + MAIL_MODULES + OTHER_MODULES
+        )
+
+    def test_collect_without_new_entries_skips_templates_and_mail(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        config = os.path.join(temp_dir, "config.json")
+        with open(config, "w") as f:
+            json.dump({"urls": [], "to": "test@example.com"}, f)
+
+        modules = imported_modules(COLLECT, config)
+
+        self.assertIn("aiohttp", modules)
+        self.assertNotImported(modules, RENDER_MODULES + MAIL_MODULES)
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
@@ -1,6 +1,45 @@
+import asyncio
+import email
+import os
+import shutil
+import smtplib
+import subprocess
+import tempfile
+import time
+from email.header import decode_header, make_header
 from unittest import TestCase, mock
 
 from feedmailer.mailer import Mailer, SendmailBackend, SMTPBackend
+from feedmailer.tests.smtp_server import LocalSMTPServer
+
+
+def mock_sendmail(returncode=0):
+    """Return a mocked sendmail process exiting with returncode."""
+    mock_proc = mock.MagicMock()
+    mock_proc.wait.return_value = returncode
+    return mock_proc
+
+
+def sent_to_sendmail(mock_proc):
+    """Return what was written to a mocked sendmail process."""
+    written = b"".join(call.args[0] for call in mock_proc.stdin.write.call_args_list)
+    return written.decode("utf-8")
+
+
+def mock_smtp_server():
+    """Return a mocked smtplib.SMTP connection accepting every mail."""
+    server = mock.MagicMock()
+    server.mail.return_value = (250, b"OK")
+    server.rcpt.return_value = (250, b"OK")
+    server.docmd.return_value = (354, b"End data with <CR><LF>.<CR><LF>")
+    server.getreply.return_value = (250, b"OK")
+    return server
+
+
+def sent_over_smtp(mock_server):
+    """Parse the messages sent as DATA over a mocked SMTP connection."""
+    data = b"".join(call.args[0] for call in mock_server.send.call_args_list)
+    return [email.message_from_bytes(msg) for msg in data.split(b"\r\n.\r\n")[:-1]]
 
 
 class TestMailerTestCase(TestCase):
@@ -10,6 +49,7 @@ class TestMailerTestCase(TestCase):
         self.mock_config.sender = "sender@example.com"
         self.mock_config.recipient = "recipient@example.com"
         self.mock_config.mail_backend = "sendmail"
+        self.mock_config.spool_directory = None
 
     def test_mailer_send_with_sendmail_backend(self):
         """Test sending with default sendmail backend."""
@@ -17,16 +57,17 @@ class TestMailerTestCase(TestCase):
         html_body = "<p>Test email body</p>"
         text_body = "Test email body"
 
-        mock_proc = mock.MagicMock()
+        mock_proc = mock_sendmail()
 
         with mock.patch("subprocess.Popen", return_value=mock_proc) as mock_popen:
             mailer.send(html_body, text_body)
 
         mock_popen.assert_called_once_with(["sendmail", "-t"], stdin=-1)
 
-        # Check that communicate was called
-        call_args = mock_proc.communicate.call_args
-        sent_message = call_args[1]["input"].decode("utf-8")
+        # Check that the message was written to sendmail
+        sent_message = sent_to_sendmail(mock_proc)
+        mock_proc.stdin.close.assert_called()
+        mock_proc.wait.assert_called()
 
         # Verify multipart structure
         self.assertIn("MIME-Version: 1.0", sent_message)
@@ -44,13 +85,12 @@ class TestMailerTestCase(TestCase):
         html_body = '<ul><li><a href="https://example.com">Title</a></li></ul>'
         text_body = "* Title\n  https://example.com"
 
-        mock_proc = mock.MagicMock()
+        mock_proc = mock_sendmail()
 
         with mock.patch("subprocess.Popen", return_value=mock_proc):
             mailer.send(html_body, text_body)
 
-        call_args = mock_proc.communicate.call_args
-        sent_message = call_args[1]["input"].decode("utf-8")
+        sent_message = sent_to_sendmail(mock_proc)
 
         # Verify multipart email with both HTML and plain text
         self.assertIn("Content-Type: multipart/alternative", sent_message)
@@ -76,7 +116,7 @@ class TestMailerTestCase(TestCase):
         text_body = "Test SMTP email"
 
         with mock.patch("smtplib.SMTP") as mock_smtp_class:
-            mock_server = mock.MagicMock()
+            mock_server = mock_smtp_server()
             mock_smtp_class.return_value.__enter__.return_value = mock_server
 
             mailer.send(html_body, text_body, subject="Test Subject")
@@ -85,10 +125,11 @@ class TestMailerTestCase(TestCase):
             mock_smtp_class.assert_called_once_with("smtp.example.com", 587)
             mock_server.starttls.assert_called_once()
             mock_server.login.assert_called_once_with("user@example.com", "password123")
-            mock_server.send_message.assert_called_once()
+            mock_server.mail.assert_called_once_with("sender@example.com")
+            mock_server.rcpt.assert_called_once_with("recipient@example.com")
 
             # Verify message content
-            sent_msg = mock_server.send_message.call_args[0][0]
+            [sent_msg] = sent_over_smtp(mock_server)
             self.assertEqual(sent_msg["From"], "sender@example.com")
             self.assertEqual(sent_msg["To"], "recipient@example.com")
             self.assertEqual(sent_msg["Subject"], "Test Subject")
@@ -97,7 +138,7 @@ class TestMailerTestCase(TestCase):
         """Test SendmailBackend directly."""
         backend = SendmailBackend()
 
-        mock_proc = mock.MagicMock()
+        mock_proc = mock_sendmail()
         with mock.patch("subprocess.Popen", return_value=mock_proc) as mock_popen:
             backend.send(
                 sender="from@example.com",
@@ -108,8 +149,7 @@ class TestMailerTestCase(TestCase):
             )
 
             mock_popen.assert_called_once()
-            call_args = mock_proc.communicate.call_args
-            sent_message = call_args[1]["input"].decode("utf-8")
+            sent_message = sent_to_sendmail(mock_proc)
 
             self.assertIn("From: from@example.com", sent_message)
             self.assertIn("To: to@example.com", sent_message)
@@ -117,6 +157,66 @@ class TestMailerTestCase(TestCase):
             self.assertIn("<b>HTML</b>", sent_message)
             self.assertIn("TEXT", sent_message)
 
+    def test_sendmail_backend_raises_on_failure(self):
+        backend = SendmailBackend()
+
+        with (
+            mock.patch("subprocess.Popen", return_value=mock_sendmail(returncode=75)),
+            self.assertRaises(subprocess.CalledProcessError) as raised,
+        ):
+            backend.send("a@example.com", "b@example.com", "S", "<p>H</p>", "T")
+
+        self.assertEqual(raised.exception.returncode, 75)
+
+    def test_sendmail_backend_never_sends_partial_mail(self):
+        backend = SendmailBackend()
+
+        def html_body():
+            yield "<p>line1</p>"
+            msg = "Rendering failed"
+            raise RuntimeError(msg)
+
+        with (
+            mock.patch("subprocess.Popen") as mock_popen,
+            self.assertRaises(RuntimeError),
+        ):
+            backend.send("a@example.com", "b@example.com", "S", html_body(), "T")
+
+        mock_popen.assert_not_called()
+
+        # Interrupted while piping the message: sendmail is killed, not
+        # handed an early end of input
+        mock_proc = mock_sendmail(returncode=-9)
+        mock_proc.stdin.write.side_effect = KeyboardInterrupt
+        with (
+            mock.patch("subprocess.Popen", return_value=mock_proc),
+            self.assertRaises(KeyboardInterrupt),
+        ):
+            backend.send("a@example.com", "b@example.com", "S", "<p>H</p>", "T")
+
+        mock_proc.kill.assert_called_once()
+        self.assertLess(
+            mock_proc.method_calls.index(mock.call.kill()),
+            mock_proc.method_calls.index(mock.call.stdin.close()),
+        )
+
+    def test_sendmail_backend_exits_early(self):
+        backend = SendmailBackend()
+
+        for returncode, error in (
+            (1, subprocess.CalledProcessError),
+            (0, BrokenPipeError),
+        ):
+            with self.subTest(returncode=returncode):
+                mock_proc = mock_sendmail(returncode=returncode)
+                mock_proc.stdin.write.side_effect = BrokenPipeError
+                mock_proc.stdin.close.side_effect = BrokenPipeError
+                with (
+                    mock.patch("subprocess.Popen", return_value=mock_proc),
+                    self.assertRaises(error),
+                ):
+                    backend.send("a@example.com", "b@example.com", "S", "<p>H</p>", "T")
+
     def test_smtp_backend_direct(self):
         """Test SMTPBackend directly."""
         backend = SMTPBackend(
@@ -128,7 +228,7 @@ class TestMailerTestCase(TestCase):
         )
 
         with mock.patch("smtplib.SMTP") as mock_smtp_class:
-            mock_server = mock.MagicMock()
+            mock_server = mock_smtp_server()
             mock_smtp_class.return_value.__enter__.return_value = mock_server
 
             backend.send(
@@ -143,6 +243,278 @@ class TestMailerTestCase(TestCase):
             mock_server.starttls.assert_not_called()  # use_tls=False
             mock_server.login.assert_called_once_with("testuser", "testpass")
 
+    def test_smtp_backend_reuses_connection(self):
+        """Test that messages share one authenticated connection until closed."""
+        backend = SMTPBackend(username="user", password="pass")
+        messages = [
+            {
+                "sender": "from@example.com",
+                "recipient": f"to{n}@example.com",
+                "subject": f"Message {n}",
+                "html_body": "<b>HTML</b>",
+                "text_body": "TEXT",
+            }
+            for n in range(3)
+        ]
+
+        with mock.patch("smtplib.SMTP") as mock_smtp_class:
+            mock_server = mock_smtp_server()
+            mock_smtp_class.return_value.__enter__.return_value = mock_server
+
+            backend.send_many(messages[:2])
+            backend.send(**messages[2])
+            mock_smtp_class.return_value.__exit__.assert_not_called()
+            backend.close()
+
+        mock_smtp_class.assert_called_once_with("localhost", 587)
+        mock_server.starttls.assert_called_once()
+        mock_server.login.assert_called_once_with("user", "pass")
+        self.assertEqual(
+            [msg["To"] for msg in sent_over_smtp(mock_server)],
+            ["to0@example.com", "to1@example.com", "to2@example.com"],
+        )
+        mock_smtp_class.return_value.__exit__.assert_called_once()
+
+    def test_smtp_backend_reconnects_when_disconnected(self):
+        """Test that a dropped connection is reopened and the message resent."""
+        backend = SMTPBackend(use_tls=False)
+        stale_server = mock_smtp_server()
+        stale_server.mail.side_effect = [
+            (250, b"OK"),
+            smtplib.SMTPServerDisconnected("Connection unexpectedly closed"),
+        ]
+        fresh_server = mock_smtp_server()
+        connections = [mock.MagicMock(), mock.MagicMock()]
+        connections[0].__enter__.return_value = stale_server
+        connections[1].__enter__.return_value = fresh_server
+
+        with mock.patch("smtplib.SMTP", side_effect=connections):
+            backend.send("a@example.com", "b@example.com", "First", "<p>1</p>", "1")
+            backend.send("a@example.com", "b@example.com", "Second", "<p>2</p>", "2")
+
+        connections[0].__exit__.assert_called_once()
+        self.assertEqual(stale_server.mail.call_count, 2)
+        self.assertEqual(len(sent_over_smtp(stale_server)), 1)
+        [sent_msg] = sent_over_smtp(fresh_server)
+        self.assertEqual(sent_msg["Subject"], "Second")
+
+    def test_mailer_send_many_with_sendmail_backend(self):
+        """Test that backends without batching send messages one by one."""
+        mailer = Mailer(self.mock_config)
+
+        with mock.patch("subprocess.Popen", return_value=mock_sendmail()) as mock_popen:
+            mailer.send_many(
+                [
+                    {"html_body": "<p>One</p>", "text_body": "One"},
+                    {"html_body": "<p>Two</p>", "text_body": "Two", "subject": "Two"},
+                ]
+            )
+            mailer.close()
+
+        self.assertEqual(mock_popen.call_count, 2)
+        sent = sent_to_sendmail(mock_popen.return_value)
+        self.assertIn("Subject: Two", sent)
+        self.assertIn("To: recipient@example.com", sent)
+
+
+class TestMailerDeliveryTestCase(TestCase):
+    """Delivery to a local SMTP server."""
+
+    def setUp(self):
+        super().setUp()
+        self.server = LocalSMTPServer(delay=0.1)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        self.mock_config = mock.Mock()
+        self.mock_config.sender = "sender@example.com"
+        self.mock_config.recipient = "recipient@example.com"
+        self.mock_config.mail_backend = "smtp"
+        self.mock_config.smtp_host = "127.0.0.1"
+        self.mock_config.smtp_port = self.server.port
+        self.mock_config.smtp_username = None
+        self.mock_config.smtp_password = None
+        self.mock_config.smtp_use_tls = False
+        self.mock_config.mail_max_concurrency = 2
+        self.mock_config.spool_directory = None
+
+    def messages(self, count):
+        return [
+            {"html_body": f"<p>{n}</p>", "text_body": str(n), "subject": f"Mail {n}"}
+            for n in range(count)
+        ]
+
+    def test_mailer_send_many_over_one_connection(self):
+        mailer = Mailer(self.mock_config)
+        mailer.send_many(self.messages(3))
+        mailer.close()
+
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(
+            [msg["Subject"] for msg in self.server.messages],
+            ["Mail 0", "Mail 1", "Mail 2"],
+        )
+        self.assertEqual(self.server.messages[0]["To"], "recipient@example.com")
+
+    def test_mailer_send_many_async_limits_concurrency(self):
+        mailer = Mailer(self.mock_config)
+        asyncio.run(mailer.send_many_async(self.messages(5)))
+        mailer.close()
+
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(self.server.max_active, 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_mailer_streams_chunked_bodies(self):
+        lines = [f"Line {n}\n" for n in range(1000)]
+        lines += [".starts with a dot\n", "Grüße " * 40 + "\n"]
+        text = "".join(lines)
+
+        mailer = Mailer(self.mock_config)
+        mailer.send(
+            (f"<p>{line}</p>" for line in lines),
+            iter(lines),
+            subject="Neuigkeiten für dich",
+        )
+        mailer.close()
+
+        [msg] = self.server.messages
+        subject = make_header(decode_header(msg["Subject"]))
+        self.assertEqual(str(subject), "Neuigkeiten für dich")
+        text_part, html_part = msg.get_payload()
+        self.assertEqual(
+            text_part.get_payload(decode=True).decode("utf-8").splitlines(),
+            text.splitlines(),
+        )
+        self.assertIn(
+            "<p>.starts with a dot\r\n</p>",
+            html_part.get_payload(decode=True).decode("utf-8"),
+        )
+
+    def test_smtp_backend_drops_connection_when_rendering_fails(self):
+        def failing_body():
+            yield "Partial"
+            msg = "Template error"
+            raise RuntimeError(msg)
+
+        mailer = Mailer(self.mock_config)
+        with self.assertRaises(RuntimeError):
+            mailer.send("<p>Partial</p>", failing_body())
+        mailer.send("<p>Complete</p>", "Complete")
+        mailer.close()
+
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(
+            [msg.get_payload()[0].get_payload() for msg in self.server.messages],
+            ["Complete\r\n"],
+        )
+
+    def test_mailer_send_async_does_not_block_event_loop(self):
+        mailer = Mailer(self.mock_config)
+        ticks = []
+
+        async def tick():
+            for _ in range(5):
+                await asyncio.sleep(0.01)
+                ticks.append(len(self.server.messages))
+
+        async def run():
+            await asyncio.gather(mailer.send_async("<p>Hi</p>", "Hi"), tick())
+
+        asyncio.run(run())
+        mailer.close()
+
+        # The loop kept running while the slow server accepted the mail
+        self.assertEqual(ticks, [0, 0, 0, 0, 0])
+        self.assertEqual(len(self.server.messages), 1)
+
+
+class TestMailerSpoolTestCase(TestCase):
+    """Spooling to disk and delivering from the spool."""
+
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.server = LocalSMTPServer()
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+        self.mock_config = mock.Mock()
+        self.mock_config.sender = "sender@example.com"
+        self.mock_config.recipient = "recipient@example.com"
+        self.mock_config.mail_backend = "smtp"
+        self.mock_config.smtp_host = "127.0.0.1"
+        self.mock_config.smtp_port = self.server.port
+        self.mock_config.smtp_username = None
+        self.mock_config.smtp_password = None
+        self.mock_config.smtp_use_tls = False
+        self.mock_config.mail_max_concurrency = 2
+        self.mock_config.spool_directory = os.path.join(self.temp_dir, "spool")
+        self.mock_config.spool_backoff = 60
+        self.mock_config.spool_max_backoff = 3600
+
+    def test_mailer_send_spools_until_flushed(self):
+        mailer = Mailer(self.mock_config)
+        mailer.send("<p>One</p>", "One", subject="One")
+        mailer.send_many([{"html_body": "<p>Two</p>", "text_body": "Two"}])
+
+        self.assertEqual(self.server.messages, [])
+        self.assertEqual(len(mailer.spool), 2)
+
+        self.assertEqual(mailer.flush(), 2)
+        mailer.close()
+
+        self.assertEqual(
+            [msg["Subject"] for msg in self.server.messages], ["One", "Feed Updates"]
+        )
+        self.assertEqual(len(mailer.spool), 0)
+
+    def test_mailer_flush_keeps_undeliverable_mail(self):
+        mailer = Mailer(self.mock_config)
+        mailer.send("<p>One</p>", "One")
+
+        with (
+            mock.patch.object(mailer.backend, "send", side_effect=OSError("Down")),
+            self.assertLogs("feedmailer.mailer", level="ERROR"),
+        ):
+            self.assertEqual(mailer.flush(), 0)
+
+        # The mail stays spooled, and is not retried before its backoff passed
+        self.assertEqual(len(mailer.spool), 1)
+        self.assertEqual(mailer.flush(), 0)
+        [(_, record)] = mailer.spool.due(now=time.time() + 60)
+        self.assertEqual(record["attempts"], 1)
+        self.assertEqual(record["message"]["text_body"], "One")
+
+    def test_mailer_flush_keeps_mail_sendmail_failed_on(self):
+        self.mock_config.mail_backend = "sendmail"
+        mailer = Mailer(self.mock_config)
+        mailer.send("<p>One</p>", "One")
+
+        with (
+            mock.patch("subprocess.Popen", return_value=mock_sendmail(returncode=75)),
+            self.assertLogs("feedmailer.mailer", level="ERROR"),
+        ):
+            self.assertEqual(mailer.flush(), 0)
+
+        self.assertEqual(len(mailer.spool), 1)
+
+    def test_mailer_flush_async(self):
+        mailer = Mailer(self.mock_config)
+        asyncio.run(
+            mailer.send_many_async(
+                [{"html_body": f"<p>{n}</p>", "text_body": str(n)} for n in range(3)]
+            )
+        )
+        self.assertEqual(self.server.messages, [])
+
+        self.assertEqual(asyncio.run(mailer.flush_async()), 3)
+        mailer.close()
+
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(len(mailer.spool), 0)
+
 
 if __name__ == "__main__":
     from unittest import main
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from aiohttp import web
+
+from feedmailer.feed_processor import FeedProcessor
+from feedmailer.utils.metrics import Metrics
+
+RSS = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Local</title>
+<item><title>One</title><link>https://example.com/1</link></item>
+<item><title>Two</title><link>https://example.com/2</link></item>
+</channel></rss>"""
+
+
+class TestMetricsTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def test_metrics_phases_add_up(self):
+        metrics = Metrics()
+        with mock.patch("time.perf_counter", side_effect=[1.0, 3.0, 10.0, 10.5]):
+            with metrics.phase("send"):
+                pass
+            with metrics.phase("send"):
+                pass
+
+        self.assertEqual(metrics.phases, {"send": 2.5})
+
+    def test_metrics_timed_times_iteration_only(self):
+        metrics = Metrics()
+        times = iter([0.0, 1.0, 5.0, 7.0, 20.0, 20.5])
+        chunks = []
+        with mock.patch("time.perf_counter", side_effect=lambda: next(times)):
+            chunks.extend(metrics.timed("render", iter(["a", "b"])))
+
+        self.assertEqual(chunks, ["a", "b"])
+        self.assertEqual(metrics.phases, {"render": 3.5})
+
+    def _metrics(self):
+        metrics = Metrics()
+        metrics.started = 1700000000.0
+        metrics.phases = {"fetch": 1.5, "send": 0.25}
+        metrics.feed("https://example.com/feed").update(
+            {"status": 200, "bytes": 2048, "entries": 10, "parse": 0.5, "total": 1}
+        )
+        metrics.feed('https://example.com/"odd"\\feed').update(
+            {"error": "HTTP status 500", "status": 500, "total": 0.1}
+        )
+        return metrics
+
+    def test_metrics_write_json(self):
+        path = os.path.join(self.temp_dir, "metrics.json")
+
+        self._metrics().write_json(path)
+
+        with open(path) as f:
+            data = json.load(f)
+        self.assertEqual(data["started"], 1700000000.0)
+        self.assertEqual(data["phases"], {"fetch": 1.5, "send": 0.25})
+        self.assertEqual(data["feeds"]["https://example.com/feed"]["bytes"], 2048)
+
+    def test_metrics_write_prometheus(self):
+        path = os.path.join(self.temp_dir, "feedmailer.prom")
+
+        self._metrics().write_prometheus(path)
+
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertIn("# TYPE feedmailer_phase_duration_seconds gauge", lines)
+        self.assertIn('feedmailer_phase_duration_seconds{phase="fetch"} 1.5', lines)
+        self.assertIn("feedmailer_last_run_timestamp_seconds 1700000000.0", lines)
+        self.assertIn(
+            'feedmailer_feed_duration_seconds{url="https://example.com/feed",'
+            'stage="parse"} 0.5',
+            lines,
+        )
+        self.assertIn(
+            'feedmailer_feed_bytes{url="https://example.com/feed"} 2048', lines
+        )
+        self.assertIn('feedmailer_feed_up{url="https://example.com/feed"} 1', lines)
+        self.assertIn(
+            'feedmailer_feed_up{url="https://example.com/\\"odd\\"\\\\feed"} 0', lines
+        )
+
+
+class TestFeedMetricsTestCase(TestCase):
+    """Timings of feeds fetched from a local server."""
+
+    def config(self, urls):
+        config = mock.Mock()
+        config.urls = urls
+        config.feed_options = {}
+        config.fetch_max_concurrency = 20
+        config.fetch_max_per_host = 4
+        config.fetch_host_delay = 0
+        config.fetch_adaptive = False
+        config.fetch_timeout = 30
+        config.fetch_connect_timeout = 10
+        config.fetch_read_timeout = 30
+        config.fetch_max_size = 1024 * 1024
+        config.fetch_failure_threshold = 3
+        config.parse_engine = "feedparser"
+        config.parse_executor = "none"
+        return config
+
+    async def _collect(self):
+        async def feed(request):
+            return web.Response(body=RSS, content_type="application/rss+xml")
+
+        app = web.Application()
+        app.router.add_get("/feed.xml", feed)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "localhost", 0)
+        await site.start()
+        try:
+            port = runner.addresses[0][1]
+            urls = [
+                f"http://localhost:{port}/{path}" for path in ("feed.xml", "missing")
+            ]
+            processor = FeedProcessor(self.config(urls), {"https://example.com/1"})
+            await processor.collect_async()
+            return urls, processor.metrics
+        finally:
+            await runner.cleanup()
+
+    def test_feed_processor_records_feed_metrics(self):
+        (feed_url, missing_url), metrics = asyncio.run(self._collect())
+
+        record = metrics.feeds[feed_url]
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["bytes"], len(RSS))
+        self.assertEqual(record["entries"], 2)
+        self.assertEqual(record["new_entries"], 1)
+        for stage in ("wait", "connect", "ttfb", "download", "parse", "total"):
+            self.assertGreaterEqual(record[stage], 0)
+        self.assertLessEqual(record["ttfb"], record["total"])
+        self.assertNotIn("error", record)
+
+        missing = metrics.feeds[missing_url]
+        self.assertEqual(missing["status"], 404)
+        self.assertEqual(missing["error"], "HTTP status 404")
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
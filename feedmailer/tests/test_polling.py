@@ -0,0 +1,79 @@
+import time
+from unittest import TestCase, mock
+
+from feedmailer.utils.polling import (
+    cache_lifetime,
+    feed_ttl,
+    learn_interval,
+    publish_cadence,
+)
+
+HOUR = 60 * 60
+
+
+def entry_published_at(timestamp):
+    return mock.Mock(published_parsed=time.gmtime(timestamp))
+
+
+class TestPollingTestCase(TestCase):
+    def test_cache_lifetime_max_age(self):
+        headers = {"Cache-Control": "public, max-age=1800"}
+
+        self.assertEqual(cache_lifetime(headers, 0), 1800)
+
+    def test_cache_lifetime_no_cache(self):
+        headers = {"Cache-Control": "no-cache, max-age=1800"}
+
+        self.assertEqual(cache_lifetime(headers, 0), 0)
+
+    def test_cache_lifetime_expires(self):
+        headers = {
+            "Date": "Wed, 21 Oct 2015 07:00:00 GMT",
+            "Expires": "Wed, 21 Oct 2015 08:00:00 GMT",
+        }
+
+        self.assertEqual(cache_lifetime(headers, 0), HOUR)
+
+    def test_cache_lifetime_without_hints(self):
+        self.assertIsNone(cache_lifetime({"Expires": "0"}, 0))
+        self.assertIsNone(cache_lifetime({}, 0))
+
+    def test_feed_ttl(self):
+        self.assertEqual(feed_ttl({"ttl": "60"}), HOUR)
+        self.assertIsNone(feed_ttl({}))
+        self.assertIsNone(feed_ttl({"ttl": "soon"}))
+
+    def test_publish_cadence(self):
+        entries = [entry_published_at(n * 6 * HOUR) for n in range(5)]
+        entries.append(mock.Mock(published_parsed=None, updated_parsed=None))
+
+        self.assertEqual(publish_cadence(entries), 6 * HOUR)
+
+    def test_publish_cadence_unknown(self):
+        self.assertIsNone(publish_cadence([entry_published_at(0)]))
+
+    def test_learn_interval_polls_twice_per_cadence(self):
+        entries = [entry_published_at(n * 6 * HOUR) for n in range(5)]
+
+        interval = learn_interval({}, {}, entries, 0, 0, 24 * HOUR)
+
+        self.assertEqual(interval, 3 * HOUR)
+
+    def test_learn_interval_respects_cache_hints(self):
+        entries = [entry_published_at(n * 6 * HOUR) for n in range(5)]
+
+        interval = learn_interval({}, {"ttl": "600"}, entries, 0, 0, 24 * HOUR)
+
+        self.assertEqual(interval, 10 * HOUR)
+
+    def test_learn_interval_is_clamped(self):
+        entries = [entry_published_at(n * 365 * 24 * HOUR) for n in range(5)]
+
+        self.assertEqual(learn_interval({}, {}, entries, 0, 0, 24 * HOUR), 24 * HOUR)
+        self.assertEqual(learn_interval({}, {}, [], 0, 900, 24 * HOUR), 900)
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
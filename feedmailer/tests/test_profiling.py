@@ -0,0 +1,85 @@
+import asyncio
+import os
+import pstats
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from feedmailer.utils.profiling import Profiler
+
+
+async def _blocking():
+    await asyncio.sleep(0)
+    time.sleep(0.05)
+    await asyncio.sleep(0)
+
+
+async def _quick():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def _main():
+    await asyncio.gather(
+        asyncio.create_task(_blocking(), name="blocking"),
+        asyncio.create_task(_quick(), name="quick"),
+    )
+
+
+class TestProfilerTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def _profile(self):
+        handle_run = asyncio.events.Handle._run
+        profiler = Profiler(self.temp_dir, slow_callback=0.04)
+        profiler.start()
+        try:
+            asyncio.run(_main())
+        finally:
+            profiler.stop()
+        self.assertIs(asyncio.events.Handle._run, handle_run)
+        return profiler
+
+    def test_profiler_reports_slow_callbacks(self):
+        profiler = self._profile()
+
+        self.assertEqual(len(profiler.slow), 1)
+        seconds, description = profiler.slow[0]
+        self.assertGreaterEqual(seconds, 0.05)
+        self.assertIn(
+            "blocking (_blocking), suspended at test_profiling.py", description
+        )
+
+    def test_profiler_times_tasks(self):
+        profiler = self._profile()
+
+        tasks = {task.get_name(): stats for task, stats in profiler.tasks.items()}
+        running, steps, first, last = tasks["blocking"]
+        self.assertGreaterEqual(running, 0.05)
+        self.assertEqual(steps, 3)
+        self.assertLessEqual(first, last)
+        self.assertEqual(tasks["quick"][1], 4)
+        self.assertLess(tasks["quick"][0], 0.04)
+
+    def test_profiler_write(self):
+        profiler = self._profile()
+
+        path = profiler.write()
+
+        with open(path) as f:
+            report = f.read()
+        self.assertIn("blocking (_blocking)", report)
+        self.assertIn("_main", report)
+        stats = pstats.Stats(path[: -len(".txt")] + ".prof")
+        self.assertTrue(any(function == "_blocking" for _, _, function in stats.stats))
+        self.assertEqual(os.path.dirname(path), self.temp_dir)
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
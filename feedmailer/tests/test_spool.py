@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from feedmailer.utils.spool import Spool
+
+
+def message(subject):
+    return {
+        "sender": "from@example.com",
+        "recipient": "to@example.com",
+        "subject": subject,
+        "html_body": "<p>Body</p>",
+        "text_body": "Body",
+    }
+
+
+class TestSpoolTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.directory = os.path.join(self.temp_dir, "spool")
+        self.spool = Spool(self.directory, backoff=60, max_backoff=200)
+
+    def test_spool_empty(self):
+        self.assertEqual(self.spool.due(), [])
+        self.assertEqual(len(self.spool), 0)
+
+    def test_spool_add_and_due_in_order(self):
+        for n in range(3):
+            self.spool.add(message(f"Mail {n}"), now=1000)
+
+        due = self.spool.due(now=1000)
+
+        self.assertEqual(
+            [record["message"]["subject"] for _, record in due],
+            ["Mail 0", "Mail 1", "Mail 2"],
+        )
+        self.assertEqual(due[0][1]["attempts"], 0)
+        self.assertEqual(len(self.spool), 3)
+
+    def test_spool_joins_chunked_bodies(self):
+        chunked = dict(message("Mail"), html_body=iter(["<p>", "Body", "</p>"]))
+        self.spool.add(chunked, now=1000)
+
+        [(_, record)] = self.spool.due(now=1000)
+
+        self.assertEqual(record["message"], message("Mail"))
+
+    def test_spool_delivered_removes_mail(self):
+        self.spool.add(message("Mail"), now=1000)
+        path, _ = self.spool.due(now=1000)[0]
+
+        self.spool.delivered(path)
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(len(self.spool), 0)
+
+    def test_spool_failed_backs_off_exponentially(self):
+        self.spool.add(message("Mail"), now=1000)
+
+        next_attempts = []
+        now = 1000
+        for _ in range(4):
+            path, record = self.spool.due(now=now)[0]
+            self.spool.failed(path, record, now=now)
+            with open(path) as f:
+                now = json.load(f)["next_attempt"]
+            self.assertEqual(self.spool.due(now=now - 1), [])
+            next_attempts.append(now)
+
+        self.assertEqual(next_attempts, [1060, 1180, 1380, 1580])
+        self.assertEqual(self.spool.due(now=now)[0][1]["attempts"], 4)
+
+    def test_spool_skips_temporary_and_unreadable_files(self):
+        self.spool.add(message("Mail"), now=1000)
+        with open(os.path.join(self.directory, ".partial.json.tmp"), "w") as f:
+            f.write("{")
+        with open(os.path.join(self.directory, "broken.json"), "w") as f:
+            f.write("{")
+
+        with self.assertLogs("feedmailer.utils.spool", level="WARNING"):
+            due = self.spool.due(now=1000)
+
+        self.assertEqual([record["message"]["subject"] for _, record in due], ["Mail"])
+
+
+if __name__ == "__main__":
+    from unittest import main
+
+    main()
@@ -1,7 +1,9 @@
 import json
 import os
+import sqlite3
 import tempfile
-from unittest import TestCase
+from types import SimpleNamespace
+from unittest import TestCase, mock
 
 from feedmailer.storage import Storage
 
@@ -70,6 +72,481 @@ class TestStorageTestCase(TestCase):
         self.assertEqual(set(saved_data["seen_links"]), new_links)
         self.assertNotIn("old", saved_data["seen_links"])
 
+    def test_storage_feed_state_roundtrip(self):
+        storage_file = os.path.join(self.temp_dir, "storage.json")
+        storage = Storage(storage_file)
+        storage.feeds = {
+            "https://example.com/feed": {
+                "etag": '"abc"',
+                "last_modified": "Wed, 21 Oct 2015 07:28:00 GMT",
+            }
+        }
+
+        storage.save({"https://example.com/1"})
+
+        reloaded = Storage(storage_file)
+        self.assertEqual(reloaded.load(), {"https://example.com/1"})
+        self.assertEqual(reloaded.feeds, storage.feeds)
+
+    def test_storage_load_without_feed_state(self):
+        storage_file = os.path.join(self.temp_dir, "storage.json")
+        with open(storage_file, "w") as f:
+            json.dump({"seen_links": ["https://example.com/1"]}, f)
+
+        storage = Storage(storage_file)
+        storage.load()
+
+        self.assertEqual(storage.feeds, {})
+
+    def test_storage_save_is_atomic(self):
+        storage_file = os.path.join(self.temp_dir, "storage.json")
+        with open(storage_file, "w") as f:
+            json.dump({"seen_links": ["https://example.com/old"]}, f)
+        storage = Storage(storage_file)
+
+        with (
+            mock.patch("json.dump", side_effect=KeyboardInterrupt),
+            self.assertRaises(KeyboardInterrupt),
+        ):
+            storage.save({"https://example.com/new"})
+
+        with open(storage_file, "r") as f:
+            self.assertEqual(json.load(f), {"seen_links": ["https://example.com/old"]})
+        self.assertEqual(os.listdir(self.temp_dir), ["storage.json"])
+
+    def test_storage_legacy_file_drops_validators(self):
+        storage_file = os.path.join(self.temp_dir, "storage.json")
+        with open(storage_file, "w") as f:
+            json.dump(
+                {
+                    "seen_links": ["https://example.com/1"],
+                    "feeds": {"https://example.com/feed": {"etag": '"abc"'}},
+                },
+                f,
+            )
+
+        storage = Storage(storage_file)
+        seen = storage.load()
+
+        self.assertEqual(seen, {"https://example.com/1"})
+        self.assertEqual(storage.feeds, {"https://example.com/feed": {}})
+
+
+class StorageBackendTestsMixin:
+    """Behaviour shared by all storage backends."""
+
+    backend = None
+    filename = None
+    options = {}
+
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.storage_file = os.path.join(self.temp_dir, self.filename)
+
+    def tearDown(self):
+        import shutil
+
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _storage(self, retention_days=None):
+        config = SimpleNamespace(
+            storage_backend=self.backend,
+            storage_retention_days=retention_days,
+            **self.options,
+        )
+        storage = Storage(self.storage_file, config)
+        self.addCleanup(storage.close)
+        return storage
+
+    def test_commit_records_observed_links(self):
+        storage = self._storage()
+        seen = storage.load()
+
+        storage.commit({"https://example.com/feed": ["https://example.com/1"]})
+
+        self.assertIn("https://example.com/1", seen)
+        self.assertNotIn("https://example.com/2", seen)
+        self.assertIn("https://example.com/1", self._storage().load())
+
+    def test_commit_adopts_legacy_links(self):
+        storage = self._storage()
+        storage.load()
+        storage.save({"https://example.com/old", "https://example.com/1"})
+
+        storage.commit({"https://example.com/feed": ["https://example.com/1"]})
+
+        seen = self._storage().load()
+        self.assertIn("https://example.com/old", seen)
+        self.assertIn("https://example.com/1", seen)
+
+    def test_commit_renames_links(self):
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        storage.load()
+        storage.save({"https://example.com/legacy"})
+        storage.commit({feed: ["https://example.com/1"]}, now=1)
+
+        storage.commit(
+            {feed: ["key1", "key2"]},
+            now=2,
+            renamed={
+                feed: {
+                    "https://example.com/1": "key1",
+                    "https://example.com/legacy": "key2",
+                }
+            },
+        )
+
+        seen = self._storage().load()
+        self.assertEqual(set(seen), {"key1", "key2"})
+
+    def test_commit_keeps_feed_state(self):
+        storage = self._storage()
+        storage.load()
+        storage.feeds["https://example.com/feed"] = {"etag": '"abc"'}
+
+        storage.commit({"https://example.com/feed": ["https://example.com/1"]}, now=10)
+
+        reloaded = self._storage()
+        reloaded.load()
+        self.assertEqual(
+            reloaded.feeds,
+            {"https://example.com/feed": {"etag": '"abc"', "parsed": 10}},
+        )
+
+    def test_retention_forgets_links_dropped_from_feed(self):
+        day = 24 * 60 * 60
+        feed = "https://example.com/feed"
+        storage = self._storage(retention_days=90)
+        seen = storage.load()
+
+        storage.commit(
+            {feed: ["https://example.com/1", "https://example.com/2"]}, now=0
+        )
+        storage.commit({feed: ["https://example.com/2"]}, now=1 * day)
+        storage.commit({feed: ["https://example.com/2"]}, now=80 * day)
+        self.assertIn("https://example.com/1", seen)
+
+        storage.commit({feed: ["https://example.com/2"]}, now=91 * day)
+
+        self.assertNotIn("https://example.com/1", seen)
+        self.assertIn("https://example.com/2", seen)
+        reloaded = self._storage(retention_days=90).load()
+        self.assertNotIn("https://example.com/1", reloaded)
+        self.assertIn("https://example.com/2", reloaded)
+
+    def test_retention_keeps_links_that_reappear(self):
+        day = 24 * 60 * 60
+        feed = "https://example.com/feed"
+        storage = self._storage(retention_days=90)
+        seen = storage.load()
+
+        storage.commit({feed: ["https://example.com/1"]}, now=0)
+        storage.commit({feed: []}, now=1 * day)
+        storage.commit({feed: ["https://example.com/1"]}, now=50 * day)
+        storage.commit({feed: ["https://example.com/1"]}, now=200 * day)
+
+        self.assertIn("https://example.com/1", seen)
+
+    def test_retention_forgets_feeds_not_parsed(self):
+        day = 24 * 60 * 60
+        storage = self._storage(retention_days=90)
+        seen = storage.load()
+
+        storage.commit({"https://example.com/gone": ["https://example.com/1"]}, now=0)
+        storage.commit(
+            {"https://example.com/feed": ["https://example.com/2"]}, now=91 * day
+        )
+
+        self.assertNotIn("https://example.com/1", seen)
+        self.assertNotIn("https://example.com/gone", storage.feeds)
+        self.assertIn("https://example.com/2", seen)
+
+    def test_retention_keeps_feeds_not_modified(self):
+        day = 24 * 60 * 60
+        feed = "https://example.com/feed"
+        storage = self._storage(retention_days=90)
+        seen = storage.load()
+        storage.commit({feed: ["https://example.com/1"]}, now=0)
+        storage.feeds[feed]["etag"] = '"v1"'
+
+        # The feed answers 304 every day: contacted, but never parsed again
+        for days in range(1, 92):
+            storage.feeds[feed]["contacted"] = days * day
+            storage.commit(now=days * day)
+
+        self.assertIn("https://example.com/1", seen)
+        self.assertEqual(storage.feeds[feed]["etag"], '"v1"')
+        reloaded = self._storage(retention_days=90)
+        self.assertIn("https://example.com/1", reloaded.load())
+
+    def test_without_retention_links_are_kept(self):
+        day = 24 * 60 * 60
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        seen = storage.load()
+
+        storage.commit({feed: ["https://example.com/1"]}, now=0)
+        storage.commit({feed: []}, now=1000 * day)
+
+        self.assertIn("https://example.com/1", seen)
+
+
+class TestJSONFileStorageTestCase(StorageBackendTestsMixin, TestCase):
+    backend = "json"
+    filename = "storage.json"
+
+
+class TestJSONFileJournalStorageTestCase(StorageBackendTestsMixin, TestCase):
+    backend = "json"
+    filename = "storage.json"
+    options = {"storage_journal": True, "storage_compact_after": 3}
+
+    def _read_status(self):
+        with open(self.storage_file, "r") as f:
+            return json.load(f)
+
+    def _journal_lines(self):
+        try:
+            with open(self.storage_file + ".journal", "r") as f:
+                return f.readlines()
+        except FileNotFoundError:
+            return []
+
+    def test_journal_appends_only_changes(self):
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        storage.load()
+        storage.commit({feed: ["https://example.com/1"]}, now=1)
+        status = self._read_status()
+
+        storage.commit(
+            {feed: ["https://example.com/1", "https://example.com/2"]}, now=2
+        )
+
+        self.assertEqual(self._read_status(), status)
+        lines = self._journal_lines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(
+            json.loads(lines[0])["links"], {feed: {"https://example.com/2": [2, None]}}
+        )
+        self.assertIn("https://example.com/2", self._storage().load())
+
+    def test_journal_is_compacted(self):
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        storage.load()
+        for n in range(4):
+            storage.commit({feed: [f"https://example.com/{n}"]}, now=n)
+        self.assertEqual(len(self._journal_lines()), 3)
+
+        storage.commit({feed: ["https://example.com/4"]}, now=4)
+
+        self.assertFalse(os.path.exists(self.storage_file + ".journal"))
+        self.assertEqual(
+            set(self._read_status()["links"][feed]),
+            {f"https://example.com/{n}" for n in range(5)},
+        )
+
+    def test_journal_ignores_interrupted_write(self):
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        storage.load()
+        storage.commit({feed: ["https://example.com/1"]}, now=1)
+        storage.commit(
+            {feed: ["https://example.com/1", "https://example.com/2"]}, now=2
+        )
+        with open(self.storage_file + ".journal", "a") as f:
+            f.write('{"links": {"https://exa')
+
+        seen = self._storage().load()
+
+        self.assertEqual(seen, {"https://example.com/1", "https://example.com/2"})
+
+    def test_journal_compacts_after_interrupted_write(self):
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        storage.load()
+        storage.commit({feed: ["https://example.com/1"]}, now=1)
+        storage.commit({feed: ["https://example.com/1", "https://example.com/2"]})
+        with open(self.storage_file + ".journal", "a") as f:
+            f.write('{"links": {"https://exa')
+
+        links = ["https://example.com/1", "https://example.com/2"]
+        for n in range(3, 6):
+            links.append(f"https://example.com/{n}")
+            storage = self._storage()
+            storage.load()
+            storage.commit({feed: links})
+
+        self.assertEqual(set(self._storage().load()), set(links))
+        self.assertTrue(all(line.endswith("\n") for line in self._journal_lines()))
+
+    def test_journal_ignores_lines_of_earlier_generation(self):
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        storage.load()
+        storage.commit({feed: ["https://example.com/1"]}, now=1)
+        storage.commit(
+            {feed: ["https://example.com/1", "https://example.com/2"]}, now=2
+        )
+        stale_journal = self._journal_lines()
+        # Compaction renamed the new status file into place, but the process
+        # died before the journal was removed.
+        storage.backend._compact()
+        storage.commit({feed: ["https://example.com/3"]}, now=3)
+        storage.backend._compact()
+        with open(self.storage_file + ".journal", "w") as f:
+            f.writelines(stale_journal)
+
+        storage = self._storage()
+        seen = storage.load()
+
+        self.assertEqual(
+            seen,
+            {"https://example.com/1", "https://example.com/2", "https://example.com/3"},
+        )
+        self.assertEqual(storage.backend.links[feed]["https://example.com/2"], [2, 2])
+        self.assertEqual(storage.feeds[feed], {"parsed": 3})
+        storage.commit()
+        self.assertEqual(self._journal_lines(), [])
+
+
+class TestSQLiteStorageTestCase(StorageBackendTestsMixin, TestCase):
+    backend = "sqlite"
+    filename = "storage.db"
+
+    def test_sqlite_load_empty(self):
+        seen = self._storage().load()
+
+        self.assertEqual(len(seen), 0)
+        self.assertNotIn("https://example.com/1", seen)
+
+    def test_sqlite_save_replaces_links(self):
+        storage = self._storage()
+        storage.load()
+        storage.commit({"https://example.com/feed": ["old"]})
+
+        storage.save({"https://example.com/new"})
+
+        self.assertEqual(set(self._storage().load()), {"https://example.com/new"})
+
+    def test_sqlite_writes_changed_feed_state(self):
+        storage = self._storage()
+        storage.load()
+        storage.feeds["https://example.com/feed"] = {"etag": '"abc"'}
+        storage.feeds["https://example.com/other"] = {"etag": '"def"'}
+        storage.commit()
+
+        del storage.feeds["https://example.com/other"]
+        storage.feeds["https://example.com/feed"] = {"etag": '"v2"'}
+        storage.commit()
+
+        reloaded = self._storage()
+        reloaded.load()
+        self.assertEqual(reloaded.feeds, {"https://example.com/feed": {"etag": '"v2"'}})
+
+    def test_sqlite_migrates_json_status_file(self):
+        with open(self.storage_file, "w") as f:
+            json.dump(
+                {
+                    "seen_links": ["https://example.com/1", "https://example.com/2"],
+                    "feeds": {"https://example.com/feed": {"etag": '"abc"'}},
+                },
+                f,
+            )
+
+        storage = self._storage()
+        seen = storage.load()
+
+        self.assertEqual(set(seen), {"https://example.com/1", "https://example.com/2"})
+        self.assertEqual(storage.feeds, {"https://example.com/feed": {}})
+        self.assertTrue(os.path.exists(self.storage_file + ".json.bak"))
+        with open(self.storage_file, "rb") as f:
+            self.assertTrue(f.read().startswith(b"SQLite format 3"))
+
+    def test_sqlite_migrates_json_links(self):
+        json_storage = Storage(self.storage_file)
+        json_storage.load()
+        json_storage.commit(
+            {"https://example.com/feed": ["https://example.com/1"]}, now=10
+        )
+
+        storage = self._storage()
+        seen = storage.load()
+
+        self.assertIn("https://example.com/1", seen)
+        self.assertEqual(storage.feeds, {"https://example.com/feed": {"parsed": 10}})
+
+    def test_sqlite_migration_keeps_json_until_complete(self):
+        json_storage = Storage(self.storage_file)
+        json_storage.load()
+        json_storage.commit({"https://example.com/feed": ["https://example.com/1"]})
+
+        storage = self._storage()
+        with mock.patch.object(
+            storage.backend, "_import", side_effect=sqlite3.OperationalError
+        ):
+            with self.assertRaises(sqlite3.OperationalError):
+                storage.load()
+        storage.close()
+
+        with open(self.storage_file, "rb") as f:
+            self.assertEqual(f.read(1), b"{")
+        self.assertIn("https://example.com/1", self._storage().load())
+
+
+class TestSQLiteBloomStorageTestCase(StorageBackendTestsMixin, TestCase):
+    backend = "sqlite"
+    filename = "storage.db"
+    options = {"storage_bloom": True}
+
+    def test_sqlite_bloom_answers_new_links(self):
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        seen = storage.load()
+        storage.commit({feed: ["https://example.com/1"]})
+
+        self.assertTrue(os.path.exists(self.storage_file + ".bloom"))
+        self.assertIn("https://example.com/1", storage.backend.bloom)
+        self.assertNotIn("https://example.com/2", storage.backend.bloom)
+        with mock.patch.object(seen, "connection") as connection:
+            self.assertNotIn("https://example.com/2", seen)
+        connection.execute.assert_not_called()
+
+    def test_sqlite_bloom_rebuilt_after_run_without_it(self):
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        storage.load()
+        storage.commit({feed: ["https://example.com/1"]})
+        storage.close()
+        self.options = {"storage_bloom": False}
+        storage = self._storage()
+        storage.load()
+        storage.commit({feed: ["https://example.com/1", "https://example.com/2"]})
+        storage.close()
+        self.options = {"storage_bloom": True}
+
+        seen = self._storage().load()
+
+        self.assertIn("https://example.com/1", seen)
+        self.assertIn("https://example.com/2", seen)
+
+    @mock.patch("feedmailer.utils.storage_backends.sqlite.MIN_BLOOM_CAPACITY", 100)
+    def test_sqlite_bloom_grows(self):
+        feed = "https://example.com/feed"
+        storage = self._storage()
+        storage.load()
+        links = [f"https://example.com/{n}" for n in range(300)]
+
+        storage.commit({feed: links})
+
+        self.assertEqual(storage.backend.bloom.capacity, 600)
+        self.assertEqual(storage.backend.bloom.count, 300)
+        seen = self._storage().load()
+        self.assertTrue(all(link in seen for link in links))
+
 
 if __name__ == "__main__":
     from unittest import main
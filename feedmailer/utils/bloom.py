@@ -0,0 +1,114 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+MAGIC = b"FMBLOOM1"
+# Magic, blocks, capacity, count, hashes per item and the owner's token.
+HEADER = struct.Struct("<8sQQQB16s")
+HEADER_SIZE = 64
+
+# All bits of an item are set in one block the size of a cache line, so a
+# lookup touches a single page of the file.
+BLOCK_BYTES = 64
+BLOCK_BITS = BLOCK_BYTES * 8
+# The 64 bits of an item's digest that pick its bits give 9 bits per hash.
+MAX_HASHES = 7
+
+ERROR_RATE = 0.01
+
+
+class BloomFilter:
+    """A blocked Bloom filter in a memory-mapped file.
+
+    Answers whether an item was possibly added, or certainly not; items
+    cannot be removed. Only the pages of the file that lookups touch are
+    loaded, and the operating system can drop them again at any time.
+    """
+
+    def __init__(self, path):
+        """Open an existing filter.
+
+        Args:
+            path: Path of the filter file
+
+        Raises:
+            ValueError: The file is not a complete filter
+        """
+        self.path = path
+        with open(path, "r+b") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER_SIZE:
+                msg = f"{path} is not a Bloom filter"
+                raise ValueError(msg)
+            self._map = mmap.mmap(f.fileno(), 0)
+        magic, self.blocks, self.capacity, self.count, self.hashes, self.token = (
+            HEADER.unpack_from(self._map)
+        )
+        if magic != MAGIC or size != HEADER_SIZE + self.blocks * BLOCK_BYTES:
+            self._map.close()
+            msg = f"{path} is not a Bloom filter"
+            raise ValueError(msg)
+
+    @classmethod
+    def create(cls, path, capacity, token, error_rate=ERROR_RATE):
+        """Create an empty filter, replacing any file at path.
+
+        Args:
+            path: Path of the filter file
+            capacity: Number of items the filter is sized for
+            token: 16 bytes identifying what the filter was built from
+            error_rate: Share of the items never added that are reported as
+                possibly added, at capacity. Blocking adds a little to it
+        """
+        capacity = max(capacity, 1)
+        bits = -capacity * math.log(error_rate) / math.log(2) ** 2
+        blocks = math.ceil(bits / BLOCK_BITS)
+        hashes = min(MAX_HASHES, max(1, round(bits / capacity * math.log(2))))
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, blocks, capacity, 0, hashes, token))
+            f.truncate(HEADER_SIZE + blocks * BLOCK_BYTES)
+        return cls(path)
+
+    def _bits(self, item):
+        """Yield the byte offset and mask of every bit of item."""
+        digest = hashlib.blake2b(
+            item.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        block, bits = struct.unpack("<QQ", digest)
+        base = HEADER_SIZE + block % self.blocks * BLOCK_BYTES
+        for _ in range(self.hashes):
+            bit = bits % BLOCK_BITS
+            bits //= BLOCK_BITS
+            yield base + bit // 8, 1 << bit % 8
+
+    def __contains__(self, item):
+        return all(self._map[offset] & mask for offset, mask in self._bits(item))
+
+    def add(self, item):
+        """Add an item; return whether it was certainly not in the filter."""
+        added = False
+        for offset, mask in self._bits(item):
+            if not self._map[offset] & mask:
+                self._map[offset] |= mask
+                added = True
+        self.count += added
+        return added
+
+    def flush(self):
+        """Write the filter to its file."""
+        HEADER.pack_into(
+            self._map,
+            0,
+            MAGIC,
+            self.blocks,
+            self.capacity,
+            self.count,
+            self.hashes,
+            self.token,
+        )
+        self._map.flush()
+
+    def close(self):
+        self._map.close()
@@ -0,0 +1,22 @@
+from abc import ABC, abstractmethod
+
+
+class FeedParser(ABC):
+    """Abstract base class for feed parsers.
+
+    Parsers are called in the parse pool, so they must be picklable.
+    """
+
+    @abstractmethod
+    def parse(self, content):
+        """Parse raw feed bytes.
+
+        Args:
+            content: The feed document as bytes
+
+        Returns:
+            A result with `feed` and `entries` like the one of feedparser.
+            Entries have at least a `link` and `title`, and the feed a
+            `title`, accessible as attributes and dictionary keys.
+        """
+        pass
@@ -0,0 +1,161 @@
+import io
+import logging
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from feedparser import FeedParserDict
+
+from feedmailer.utils.feed_parsers.base import FeedParser
+from feedmailer.utils.feed_parsers.universal import UniversalParser
+
+logger = logging.getLogger(__name__)
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+RSS1 = "{http://purl.org/rss/1.0/}"
+RDF = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+DC = "{http://purl.org/dc/elements/1.1/}"
+
+# Per root element: the element holding the feed metadata, the entry element
+# and the entry elements mapped to the feedparser keys they are stored as.
+FORMATS = {
+    "rss": (
+        "channel",
+        "item",
+        {
+            "title": "title",
+            "link": "link",
+            "guid": "id",
+            "pubDate": "published",
+            DC + "date": "updated",
+        },
+    ),
+    RDF + "RDF": (
+        RSS1 + "channel",
+        RSS1 + "item",
+        {RSS1 + "title": "title", RSS1 + "link": "link", DC + "date": "updated"},
+    ),
+    ATOM + "feed": (
+        ATOM + "feed",
+        ATOM + "entry",
+        {
+            ATOM + "title": "title",
+            ATOM + "link": "link",
+            ATOM + "id": "id",
+            ATOM + "published": "published",
+            ATOM + "updated": "updated",
+        },
+    ),
+}
+
+
+class UnsupportedFeed(Exception):
+    """The feed needs the full feedparser to be understood."""
+
+
+def parse_date(value):
+    """Parse an RFC 822 or ISO 8601 date into a UTC struct_time, if possible."""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.utctimetuple()
+
+
+class NativeParser(FeedParser):
+    """Lean streaming parser for well-formed RSS 2.0, RSS 1.0 and Atom 1.0.
+
+    Only the fields feedmailer uses are extracted: the feed title and ttl,
+    and the link, id, title and dates of each entry. Feeds that are malformed or
+    need more than that (relative links, HTML titles, other formats) are
+    parsed by feedparser instead.
+    """
+
+    def __init__(self):
+        self.fallback = UniversalParser()
+
+    def parse(self, content):
+        """Parse feed bytes, falling back to feedparser when needed."""
+        try:
+            return self._parse(content)
+        except (ET.ParseError, UnsupportedFeed, LookupError, ValueError) as e:
+            logger.debug("Parsing feed with feedparser: %s", e)
+            return self.fallback.parse(content)
+
+    def _parse(self, content):
+        events = ET.iterparse(io.BytesIO(content), events=("start", "end"))
+        _, root = next(events)
+        if root.tag not in FORMATS:
+            msg = f"Unsupported root element {root.tag}"
+            raise UnsupportedFeed(msg)
+        channel, item, fields = FORMATS[root.tag]
+
+        feed = FeedParserDict()
+        entries = []
+        entry = None
+        stack = []
+        for event, elem in events:
+            if event == "start":
+                stack.append(elem)
+                if elem.tag == item:
+                    entry = self._start_entry(elem)
+                continue
+            if elem is root:
+                break
+
+            stack.pop()
+            parent = stack[-1].tag if stack else root.tag
+            if elem.tag == item:
+                entries.append(self._check_entry(entry))
+                entry = None
+                # Drop the parsed entry to keep memory flat on large feeds
+                (stack[-1] if stack else root).remove(elem)
+            elif entry is not None and parent == item and elem.tag in fields:
+                self._set_field(entry, fields[elem.tag], elem)
+            elif (
+                parent == channel and elem.tag in fields and fields[elem.tag] == "title"
+            ):
+                feed["title"] = self._text(elem)
+            elif parent == channel and elem.tag == "ttl":
+                feed["ttl"] = self._text(elem)
+
+        return FeedParserDict(feed=feed, entries=entries, bozo=False)
+
+    def _start_entry(self, elem):
+        entry = FeedParserDict()
+        # RSS 1.0 items are identified by their rdf:about
+        if elem.get(RDF + "about"):
+            entry["id"] = elem.get(RDF + "about").strip()
+        return entry
+
+    def _text(self, elem):
+        if elem.get("type") in ("html", "xhtml") or len(elem):
+            msg = f"Markup in {elem.tag}"
+            raise UnsupportedFeed(msg)
+        return (elem.text or "").strip()
+
+    def _set_field(self, entry, key, elem):
+        if key == "link" and elem.tag == ATOM + "link":
+            # Like feedparser, the last alternate HTML link is the entry link
+            if elem.get("rel", "alternate") == "alternate" and elem.get(
+                "type", "text/html"
+            ) in ("text/html", "application/xhtml+xml"):
+                entry["link"] = elem.get("href")
+        elif key in ("published", "updated"):
+            entry[key] = self._text(elem)
+            entry[f"{key}_parsed"] = parse_date(entry[key])
+        else:
+            entry[key] = self._text(elem)
+
+    def _check_entry(self, entry):
+        link = entry.get("link")
+        if not link or not urlsplit(link).scheme:
+            msg = f"Entry without absolute link: {link!r}"
+            raise UnsupportedFeed(msg)
+        return entry
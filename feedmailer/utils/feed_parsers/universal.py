@@ -0,0 +1,23 @@
+import io
+
+import feedparser
+
+from feedmailer.utils.feed_parsers.base import FeedParser
+
+
+class UniversalParser(FeedParser):
+    """Feed parser using feedparser, the Universal Feed Parser."""
+
+    def parse(self, content):
+        """Parse feed bytes with feedparser.
+
+        The bytes are wrapped in a stream, so feedparser never mistakes them
+        for a path or url, and detects the encoding from the document itself.
+        The exception of a malformed ("bozo") feed is kept as its message,
+        as the exception itself can't be sent back from a process pool.
+        """
+        result = feedparser.parse(io.BytesIO(content))
+        exception = result.get("bozo_exception")
+        if isinstance(exception, Exception):
+            result["bozo_exception"] = str(exception)
+        return result
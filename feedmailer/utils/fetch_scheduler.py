@@ -0,0 +1,45 @@
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+
+class FetchScheduler:
+    """Limits concurrent fetches and spreads requests to the same host."""
+
+    def __init__(self, max_concurrency=20, host_delay=0):
+        """Initialize the scheduler.
+
+        Args:
+            max_concurrency: Maximum number of fetches running at the same time
+            host_delay: Minimum number of seconds between two request starts
+                to the same host
+        """
+        self.max_concurrency = max_concurrency
+        self.host_delay = host_delay
+        self._semaphore = None
+        self._host_locks = {}
+        self._next_start = {}
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """Wait until a request to url may start, and hold a slot while it runs."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # Requests to a host queue on its lock, so only the next one waits
+        # for a slot and none holds a slot while waiting out the host delay.
+        # The delay counts from when a request actually starts.
+        loop = asyncio.get_running_loop()
+        host = urlsplit(url).hostname
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._next_start.get(host, 0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._semaphore.acquire()
+            self._next_start[host] = loop.time() + self.host_delay
+
+        try:
+            yield
+        finally:
+            self._semaphore.release()
@@ -0,0 +1,62 @@
+import os
+import stat
+import tempfile
+from contextlib import contextmanager, suppress
+
+
+def _default_mode(path):
+    """Permissions of the existing file, or those a new file would get."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def fsync_directory(directory):
+    """Make a rename or unlink in directory durable, where the OS supports it."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """Open a temporary file that atomically replaces path when closed.
+
+    The data is written next to path, synced to disk and renamed over path,
+    so readers (and the next run after a crash) see either the old or the new
+    file, never a partial one. If the block raises, path is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, mode) as f:
+            os.chmod(tmp_path, _default_mode(path))
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+    fsync_directory(directory)
+
+
+def append_durably(path, data):
+    """Append data to path and sync it to disk before returning."""
+    with open(path, "a") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
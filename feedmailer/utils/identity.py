@@ -0,0 +1,99 @@
+import base64
+import hashlib
+import re
+from collections import Counter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a visitor came from.
+TRACKING_PARAM_RE = re.compile(
+    r"^(utm_\w+|fbclid|gclid|dclid|msclkid|yclid|igshid|mc_cid|mc_eid|_hsenc|_hsmi"
+    r"|mkt_tok|ref_src)$",
+    re.IGNORECASE,
+)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Bytes of the blake2b digest an entry is keyed on.
+DIGEST_SIZE = 16
+
+
+def canonical_url(url):
+    """Normalize a url, so variants of the same address compare equal.
+
+    http and https are treated alike, the host is lowercased, default ports
+    and tracking parameters are dropped and the remaining query parameters
+    are sorted. Anything that is not an http(s) url is only stripped.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if parts.scheme.lower() not in DEFAULT_PORTS or not parts.hostname:
+        return url
+    host = parts.hostname.rstrip(".")
+    if port is not None and port != DEFAULT_PORTS[parts.scheme.lower()]:
+        host = f"{host}:{port}"
+    query = urlencode(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not TRACKING_PARAM_RE.match(name)
+        )
+    )
+    return urlunsplit(("", host, parts.path or "/", query, parts.fragment))
+
+
+def _hash(kind, value):
+    digest = hashlib.blake2b(
+        f"{kind}\0{value}".encode("utf-8", "surrogatepass"), digest_size=DIGEST_SIZE
+    ).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def url_key(url):
+    """Key of an entry known only by its link."""
+    return _hash("url", canonical_url(url or ""))
+
+
+def id_key(entry_id, feed_url):
+    """Key of an entry with an id (an RSS guid or Atom id).
+
+    Ids that are http(s) urls, like permalink guids, are keyed as urls, so
+    they match the key of the same entry known only by its link, in any
+    feed. Other ids, like "1" or a CMS's internal ids, are only unique
+    within their feed, and are keyed together with the feed's url.
+
+    Args:
+        entry_id: The id of the entry
+        feed_url: Url of the feed the entry is in
+    """
+    entry_id = entry_id.strip()
+    if urlsplit(entry_id).scheme.lower() in DEFAULT_PORTS:
+        return url_key(entry_id)
+    return _hash("id", f"{canonical_url(feed_url)}\0{entry_id}")
+
+
+def entry_keys(entries, feed_url):
+    """Key every parsed entry of a feed on its id, or else its link.
+
+    Ids used by several entries of the feed are ignored, so a feed giving
+    all entries the same guid doesn't hide all but the first.
+
+    Args:
+        entries: The parsed entries
+        feed_url: Url of the feed the entries are in
+
+    Returns:
+        List of the keys, in the order of the entries
+    """
+    ids = [getattr(entry, "id", None) for entry in entries]
+    ids = [entry_id.strip() if isinstance(entry_id, str) else "" for entry_id in ids]
+    counts = Counter(ids)
+    return [
+        id_key(entry_id, feed_url)
+        if entry_id and counts[entry_id] == 1
+        else url_key(entry.link)
+        for entry, entry_id in zip(entries, ids, strict=True)
+    ]
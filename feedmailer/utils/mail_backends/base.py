@@ -12,7 +12,25 @@ class MailBackend(ABC):
             sender: Email sender address
             recipient: Email recipient address
             subject: Email subject line
-            html_body: HTML version of the email
-            text_body: Plain text version of the email
+            html_body: HTML version of the email, as a string or an iterable
+                of string chunks
+            text_body: Plain text version of the email, as a string or an
+                iterable of string chunks
         """
         pass
+
+    def send_many(self, messages):
+        """Send several emails.
+
+        Backends that can deliver a batch more efficiently than one by one,
+        e.g. over a single connection, override this.
+
+        Args:
+            messages: Iterable of dicts with the keyword arguments of send
+        """
+        for message in messages:
+            self.send(**message)
+
+    def close(self):  # noqa: B027
+        """Release connections kept open between sends."""
+        pass
@@ -0,0 +1,84 @@
+import binascii
+from email.header import Header
+
+BOUNDARY = "===============FeedMailer==============="
+
+
+def iter_lines(body):
+    """Yield the lines of body without line endings.
+
+    Args:
+        body: A string, or an iterable of string chunks such as the
+            generator returned by Template.generate()
+    """
+    if isinstance(body, str):
+        body = (body,)
+    pending = ""
+    for chunk in body:
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    if pending:
+        yield pending
+
+
+def _encode_header(value):
+    return value if value.isascii() else Header(value, "utf-8").encode()
+
+
+def iter_message(
+    sender,
+    recipient,
+    subject,
+    html_body,
+    text_body,
+    linesep="\r\n",
+    transfer_encoding="quoted-printable",
+):
+    """Yield a multipart/alternative email with a text and an HTML part.
+
+    The bodies are encoded line by line while they are consumed, so they can
+    be generators and the message never has to be held in memory at once.
+
+    Args:
+        sender: Email sender address
+        recipient: Email recipient address
+        subject: Email subject line
+        html_body: HTML version of the email, a string or string chunks
+        text_body: Plain text version of the email, a string or string chunks
+        linesep: Line ending of the message
+        transfer_encoding: "quoted-printable" for 7-bit transports, or
+            "8bit" to pass the UTF-8 bodies through unchanged
+
+    Yields:
+        The encoded lines of the message as bytes, including line endings
+    """
+    eol = linesep.encode("ascii")
+    headers = [
+        f"From: {sender}",
+        f"To: {recipient}",
+        f"Subject: {_encode_header(subject)}",
+        "MIME-Version: 1.0",
+        f'Content-Type: multipart/alternative; boundary="{BOUNDARY}"',
+        "",
+    ]
+    for header in headers:
+        yield header.encode("utf-8") + eol
+
+    for content_type, body in (("text/plain", text_body), ("text/html", html_body)):
+        yield f"--{BOUNDARY}".encode("ascii") + eol
+        yield f"Content-Type: {content_type}; charset=utf-8".encode("ascii") + eol
+        yield f"Content-Transfer-Encoding: {transfer_encoding}".encode("ascii") + eol
+        yield eol
+        for line in iter_lines(body):
+            if transfer_encoding == "8bit":
+                yield line.encode("utf-8") + eol
+            else:
+                encoded = binascii.b2a_qp(line.encode("utf-8"), istext=True)
+                # b2a_qp breaks long lines with soft line breaks ("=\n")
+                for part in encoded.split(b"\n"):
+                    yield part + eol
+        yield eol
+
+    yield f"--{BOUNDARY}--".encode("ascii") + eol
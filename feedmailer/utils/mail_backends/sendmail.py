@@ -1,32 +1,62 @@
+import shutil
 import subprocess
+import tempfile
+from contextlib import suppress
 
 from feedmailer.utils.mail_backends.base import MailBackend
+from feedmailer.utils.mail_backends.mime import iter_message
+
+# Encoded messages larger than this are buffered in a temporary file.
+SPOOL_MAX_SIZE = 1024 * 1024
 
 
 class SendmailBackend(MailBackend):
     """Mail backend using sendmail subprocess."""
 
     def send(self, sender, recipient, subject, html_body, text_body):
-        """Send email using sendmail command."""
-        boundary = "===============FeedMailer==============="
-
-        header = f"From: {sender}\nTo: {recipient}\n"
-        header += f"Subject: {subject}\n"
-        header += "MIME-Version: 1.0\n"
-        header += f'Content-Type: multipart/alternative; boundary="{boundary}"\n\n'
-
-        # Plain text part
-        msg = header
-        msg += f"--{boundary}\n"
-        msg += "Content-Type: text/plain; charset=utf-8\n\n"
-        msg += text_body + "\n\n"
-
-        # HTML part
-        msg += f"--{boundary}\n"
-        msg += "Content-Type: text/html; charset=utf-8\n\n"
-        msg += html_body + "\n\n"
-
-        msg += f"--{boundary}--\n"
-
-        proc = subprocess.Popen(["sendmail", "-t"], stdin=subprocess.PIPE)
-        proc.communicate(input=msg.encode("utf-8"))
+        """Send email using sendmail command.
+
+        sendmail delivers whatever it has read once its input ends, so the
+        message is encoded completely before sendmail is started. Past
+        SPOOL_MAX_SIZE it is buffered in a temporary file, so bodies given as
+        chunks of a rendering template are never joined in memory.
+
+        Raises:
+            subprocess.CalledProcessError: sendmail exited with a failure
+            BrokenPipeError: sendmail exited before reading the whole message
+        """
+        with tempfile.SpooledTemporaryFile(SPOOL_MAX_SIZE) as message:
+            for line in iter_message(
+                sender,
+                recipient,
+                subject,
+                html_body,
+                text_body,
+                linesep="\n",
+                transfer_encoding="8bit",
+            ):
+                message.write(line)
+            message.seek(0)
+            self._run_sendmail(message)
+
+    def _run_sendmail(self, message):
+        """Pipe an encoded message to sendmail."""
+        command = ["sendmail", "-t"]
+        proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+        try:
+            shutil.copyfileobj(message, proc.stdin)
+            proc.stdin.close()
+        except BrokenPipeError:
+            # Report the failure sendmail exited with, if any, below.
+            if proc.wait() == 0:
+                raise
+        except BaseException:
+            # Closing stdin would have sendmail deliver the partial message.
+            proc.kill()
+            raise
+        finally:
+            with suppress(BrokenPipeError):
+                proc.stdin.close()
+            returncode = proc.wait()
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, command)
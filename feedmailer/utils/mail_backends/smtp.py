@@ -1,12 +1,21 @@
 import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from contextlib import ExitStack
 
 from feedmailer.utils.mail_backends.base import MailBackend
+from feedmailer.utils.mail_backends.mime import iter_message
+
+# Bytes of the message collected before writing them to the socket.
+SEND_BUFFER_SIZE = 64 * 1024
 
 
 class SMTPBackend(MailBackend):
-    """Mail backend using SMTP."""
+    """Mail backend using SMTP.
+
+    The authenticated connection is kept open between messages until close()
+    is called, and is reopened when the server has dropped it meanwhile.
+    Messages are encoded while they are written to the DATA command, so
+    bodies given as chunks are never held in memory at once.
+    """
 
     def __init__(
         self, host="localhost", port=587, username=None, password=None, use_tls=True
@@ -25,25 +34,88 @@ class SMTPBackend(MailBackend):
         self.username = username
         self.password = password
         self.use_tls = use_tls
+        self._connection = None
+        self._server = None
 
-    def send(self, sender, recipient, subject, html_body, text_body):
-        """Send email using SMTP."""
-        # Create message
-        msg = MIMEMultipart("alternative")
-        msg["From"] = sender
-        msg["To"] = recipient
-        msg["Subject"] = subject
-
-        # Attach text and HTML parts
-        part_text = MIMEText(text_body, "plain", "utf-8")
-        part_html = MIMEText(html_body, "html", "utf-8")
-        msg.attach(part_text)
-        msg.attach(part_html)
-
-        # Send via SMTP
-        with smtplib.SMTP(self.host, self.port) as server:
+    def _connect(self):
+        """Open, secure and authenticate a new connection."""
+        self.close()
+        with ExitStack() as stack:
+            server = stack.enter_context(smtplib.SMTP(self.host, self.port))
             if self.use_tls:
                 server.starttls()
             if self.username and self.password:
                 server.login(self.username, self.password)
-            server.send_message(msg)
+            self._connection = stack.pop_all()
+        self._server = server
+
+    def _send_message(self, sender, recipient, subject, html_body, text_body):
+        if self._server is None:
+            self._connect()
+        try:
+            self._envelope(sender, recipient)
+        except smtplib.SMTPServerDisconnected:
+            # The server closed the kept connection, e.g. after idling; retry
+            # once. Nothing of the bodies has been consumed yet.
+            self._connect()
+            self._envelope(sender, recipient)
+        self._data(iter_message(sender, recipient, subject, html_body, text_body))
+
+    def _envelope(self, sender, recipient):
+        """Start a mail transaction from sender to recipient."""
+        server = self._server
+        server.ehlo_or_helo_if_needed()
+        code, response = server.mail(sender)
+        if code != 250:
+            server.rset()
+            raise smtplib.SMTPSenderRefused(code, response, sender)
+        code, response = server.rcpt(recipient)
+        if code not in (250, 251):
+            server.rset()
+            raise smtplib.SMTPRecipientsRefused({recipient: (code, response)})
+
+    def _data(self, lines):
+        """Send the message lines, dot-stuffed, as the mail's DATA."""
+        server = self._server
+        code, response = server.docmd("data")
+        if code != 354:
+            raise smtplib.SMTPDataError(code, response)
+        try:
+            buffer = []
+            size = 0
+            for line in lines:
+                if line.startswith(b"."):
+                    line = b"." + line
+                buffer.append(line)
+                size += len(line)
+                if size >= SEND_BUFFER_SIZE:
+                    server.send(b"".join(buffer))
+                    buffer.clear()
+                    size = 0
+            buffer.append(b".\r\n")
+            server.send(b"".join(buffer))
+        except Exception:
+            # The server would take anything sent next as part of the message,
+            # so drop the connection, e.g. when rendering a body failed.
+            server.close()
+            self.close()
+            raise
+        code, response = server.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+
+    def send(self, sender, recipient, subject, html_body, text_body):
+        """Send email using SMTP."""
+        self._send_message(sender, recipient, subject, html_body, text_body)
+
+    def send_many(self, messages):
+        """Send several emails over one authenticated connection."""
+        for message in messages:
+            self._send_message(**message)
+
+    def close(self):
+        """Say goodbye to the server and close the connection, if open."""
+        if self._connection is not None:
+            self._server = None
+            connection, self._connection = self._connection, None
+            connection.close()
@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from feedmailer.utils.files import atomic_write
+
+# Per-feed timings in seconds, in the order they happen.
+FEED_TIMINGS = ("wait", "dns", "connect", "ttfb", "download", "parse", "total")
+
+
+class Metrics:
+    """Timings and sizes of one run.
+
+    Run-level phases (load, fetch, render, send, save) are summed over the
+    run; every fetched feed gets a record with its timings, response status,
+    body size and entry counts. Collected values are written as JSON, or in
+    the text format of the Prometheus node exporter's textfile collector.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.phases = {}
+        # Feed url -> {"status": ..., "bytes": ..., "dns": seconds, ...}
+        self.feeds = {}
+        # Phases are also timed in the threads mail is delivered from.
+        self._lock = threading.Lock()
+
+    def feed(self, url):
+        """Return the record of a feed, to be filled in while it is fetched."""
+        return self.feeds.setdefault(url, {})
+
+    def add(self, phase, seconds):
+        """Add seconds to the total of a run-level phase."""
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as part of a run-level phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed(self, name, iterable):
+        """Yield from iterable, timing the iteration as part of a phase.
+
+        Used for templates rendered while their output is being sent.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(name, time.perf_counter() - start)
+            yield item
+
+    def as_dict(self):
+        return {
+            "started": self.started,
+            "duration": time.time() - self.started,
+            "phases": dict(self.phases),
+            "feeds": self.feeds,
+        }
+
+    def write_json(self, path):
+        """Write the metrics to a JSON file, replacing it atomically."""
+        with atomic_write(path) as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def write_prometheus(self, path):
+        """Write the metrics for the textfile collector, replacing it atomically."""
+        data = self.as_dict()
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP feedmailer_{name} {help_text}")
+            lines.append(f"# TYPE feedmailer_{name} gauge")
+            for labels, value in samples:
+                label_text = ",".join(
+                    f'{key}="{_escape_label(str(label))}"'
+                    for key, label in labels.items()
+                )
+                if label_text:
+                    label_text = f"{{{label_text}}}"
+                lines.append(f"feedmailer_{name}{label_text} {value}")
+
+        metric(
+            "last_run_timestamp_seconds",
+            "Time the last run started.",
+            [({}, data["started"])],
+        )
+        metric(
+            "run_duration_seconds",
+            "Duration of the last run.",
+            [({}, data["duration"])],
+        )
+        metric(
+            "phase_duration_seconds",
+            "Time the last run spent in each phase.",
+            [({"phase": phase}, seconds) for phase, seconds in data["phases"].items()],
+        )
+        feeds = data["feeds"].items()
+        metric(
+            "feed_duration_seconds",
+            "Time fetching a feed spent in each stage.",
+            [
+                ({"url": url, "stage": stage}, record[stage])
+                for url, record in feeds
+                for stage in FEED_TIMINGS
+                if stage in record
+            ],
+        )
+        for key, help_text in (
+            ("status", "HTTP status of the feed's response."),
+            ("bytes", "Size of the feed's response body."),
+            ("entries", "Entries in the feed."),
+            ("new_entries", "Entries in the feed that are new."),
+        ):
+            metric(
+                f"feed_{key}",
+                help_text,
+                [({"url": url}, record[key]) for url, record in feeds if key in record],
+            )
+        metric(
+            "feed_up",
+            "Whether the feed was fetched and parsed successfully.",
+            [({"url": url}, int("error" not in record)) for url, record in feeds],
+        )
+
+        with atomic_write(path) as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def create_trace_config():
+    """Record DNS, connect and time-to-first-byte timings of HTTP requests.
+
+    The feed record to fill in is passed to the request as trace_request_ctx.
+    Requests over a reused connection, or to a host in aiohttp's DNS cache,
+    have no connect or dns timing.
+    """
+    import aiohttp
+
+    def starter(attribute):
+        async def on_start(session, context, params):
+            setattr(context, attribute, time.perf_counter())
+
+        return on_start
+
+    def ender(attribute, key):
+        async def on_end(session, context, params):
+            record = context.trace_request_ctx
+            start = getattr(context, attribute, None)
+            if isinstance(record, dict) and start is not None:
+                record[key] = time.perf_counter() - start
+
+        return on_end
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(starter("request_start"))
+    trace_config.on_request_end.append(ender("request_start", "ttfb"))
+    trace_config.on_dns_resolvehost_start.append(starter("dns_start"))
+    trace_config.on_dns_resolvehost_end.append(ender("dns_start", "dns"))
+    trace_config.on_connection_create_start.append(starter("connect_start"))
+    trace_config.on_connection_create_end.append(ender("connect_start", "connect"))
+    return trace_config
@@ -0,0 +1,87 @@
+import calendar
+import re
+import statistics
+from email.utils import parsedate_to_datetime
+
+MAX_AGE_RE = re.compile(r"(?:^|,)\s*(?:s-)?max-age\s*=\s*\"?(\d+)", re.IGNORECASE)
+
+# Number of most recent entries used to estimate how often a feed publishes.
+CADENCE_ENTRIES = 10
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def cache_lifetime(headers, now):
+    """Seconds the response may be cached for according to its HTTP headers."""
+    cache_control = headers.get("Cache-Control") or ""
+    if "no-cache" in cache_control.lower() or "no-store" in cache_control.lower():
+        return 0
+    match = MAX_AGE_RE.search(cache_control)
+    if match:
+        return int(match.group(1))
+
+    expires = _http_date(headers.get("Expires"))
+    if expires is not None:
+        date = _http_date(headers.get("Date"))
+        return max(expires - (now if date is None else date), 0)
+    return None
+
+
+def feed_ttl(feed):
+    """Seconds from the RSS <ttl> element, which is given in minutes."""
+    try:
+        return int(feed.get("ttl")) * 60
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def published_time(entry):
+    """Timestamp an entry was published or last updated, if known."""
+    value = getattr(entry, "published_parsed", None) or getattr(
+        entry, "updated_parsed", None
+    )
+    try:
+        return calendar.timegm(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def publish_cadence(entries):
+    """Median number of seconds between the most recent entries, if known."""
+    published = sorted(
+        (
+            timestamp
+            for timestamp in map(published_time, entries)
+            if timestamp is not None
+        ),
+        reverse=True,
+    )[:CADENCE_ENTRIES]
+    gaps = [
+        newer - older for newer, older in zip(published, published[1:], strict=False)
+    ]
+    gaps = [gap for gap in gaps if gap > 0]
+    return statistics.median(gaps) if gaps else None
+
+
+def learn_interval(headers, feed, entries, now, min_interval, max_interval):
+    """Estimate how long to wait before polling a feed again.
+
+    Polls twice per typical gap between entries, but never sooner than the
+    server's caching hints (Cache-Control, Expires, RSS <ttl>) allow.
+
+    Returns:
+        The interval in seconds, between min_interval and max_interval
+    """
+    cadence = publish_cadence(entries)
+    hints = [
+        cache_lifetime(headers, now),
+        feed_ttl(feed),
+        None if cadence is None else cadence / 2,
+    ]
+    interval = max((hint for hint in hints if hint is not None), default=min_interval)
+    return min(max(interval, min_interval), max_interval)
@@ -0,0 +1,138 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+
+logger = logging.getLogger(__name__)
+
+# Functions listed in the report, by cumulative time.
+REPORT_FUNCTIONS = 40
+# Tasks listed in the report, by time spent running on the event loop.
+REPORT_TASKS = 20
+
+ASYNCIO_DIRECTORY = os.path.dirname(asyncio.__file__)
+
+
+class Profiler:
+    """Profile one run and write the results to a directory.
+
+    Python code running on the main thread is profiled with cProfile, which
+    covers the synchronous phases as well as the event loop. While profiling,
+    every event loop callback is timed: the time each task ran on the loop is
+    summed, and callbacks that blocked the loop longer than a threshold are
+    listed as slow. The parse pool's and the mail delivery threads are not
+    profiled.
+
+    The results are written as <prefix>.prof, for pstats or a viewer like
+    snakeviz, and as a readable report, <prefix>.txt.
+    """
+
+    def __init__(self, directory, slow_callback=0.1):
+        """Initialize the profiler.
+
+        Args:
+            directory: Directory to write the results to
+            slow_callback: Seconds a callback may block the event loop before
+                it is reported as slow
+        """
+        self.directory = directory
+        self.slow_callback = slow_callback
+        self.profile = cProfile.Profile()
+        # Task -> [seconds running, steps, first step start, last step end]
+        self.tasks = {}
+        # (seconds, description) of the callbacks that blocked the loop.
+        self.slow = []
+        self.started = None
+        self._handle_run = None
+
+    def start(self):
+        self.started = time.time()
+        self._handle_run = asyncio.events.Handle._run
+        original, record = self._handle_run, self._record
+
+        def _run(handle):
+            start = time.perf_counter()
+            try:
+                return original(handle)
+            finally:
+                record(handle, start, time.perf_counter())
+
+        asyncio.events.Handle._run = _run
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        asyncio.events.Handle._run = self._handle_run
+
+    def _record(self, handle, start, end):
+        # Task steps and wakeups are methods bound to their task.
+        task = getattr(handle._callback, "__self__", None)
+        if not isinstance(task, asyncio.Task):
+            task = None
+        else:
+            stats = self.tasks.setdefault(task, [0.0, 0, start, end])
+            stats[0] += end - start
+            stats[1] += 1
+            stats[3] = end
+        if end - start >= self.slow_callback:
+            description = _describe_task(task) if task else repr(handle)
+            self.slow.append((end - start, description))
+
+    def write(self):
+        """Write the results and return the path of the report."""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        prefix = os.path.join(self.directory, f"feedmailer-{stamp}-{os.getpid()}")
+        self.profile.dump_stats(f"{prefix}.prof")
+        with open(f"{prefix}.txt", "w") as f:
+            f.write(self.report())
+        logger.info("Wrote the profile of the run to %s.txt", prefix)
+        return f"{prefix}.txt"
+
+    def report(self):
+        lines = [f"Callbacks that blocked the event loop over {self.slow_callback}s:"]
+        for seconds, description in sorted(self.slow, reverse=True):
+            lines.append(f"  {seconds:8.3f}s  {description}")
+        if not self.slow:
+            lines.append("  none")
+
+        lines += ["", "Tasks by time running on the event loop:"]
+        lines.append(f"  {'running':>9}  {'steps':>6}  {'elapsed':>9}  task")
+        tasks = sorted(self.tasks.items(), key=lambda item: item[1][0], reverse=True)
+        for task, (running, steps, first, last) in tasks[:REPORT_TASKS]:
+            lines.append(
+                f"  {running:8.3f}s  {steps:6d}  {last - first:8.3f}s  "
+                f"{_task_name(task)}"
+            )
+        if len(tasks) > REPORT_TASKS:
+            lines.append(f"  ... and {len(tasks) - REPORT_TASKS} more")
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(REPORT_FUNCTIONS)
+        lines += ["", "Functions on the main thread by cumulative time:", ""]
+        return "\n".join(lines) + stream.getvalue()
+
+
+def _task_name(task):
+    coro = task.get_coro()
+    name = getattr(coro, "__qualname__", repr(coro))
+    return f"{task.get_name()} ({name})"
+
+
+def _describe_task(task):
+    """Name a task, and where its slow step left off if it is not done."""
+    coro, frame = task.get_coro(), None
+    # Follow the awaited coroutines down to the one that was suspended,
+    # leaving out asyncio's own.
+    while getattr(coro, "cr_frame", None) is not None:
+        if not coro.cr_frame.f_code.co_filename.startswith(ASYNCIO_DIRECTORY):
+            frame = coro.cr_frame
+        coro = coro.cr_await
+    if frame is None:
+        return _task_name(task)
+    filename = os.path.basename(frame.f_code.co_filename)
+    return f"{_task_name(task)}, suspended at {filename}:{frame.f_lineno}"
@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import time
+import uuid
+
+from feedmailer.utils.files import atomic_write, fsync_directory
+
+logger = logging.getLogger(__name__)
+
+
+class Spool:
+    """Durable outbox of emails waiting to be delivered.
+
+    Every email is a JSON file in the spool directory, holding the keyword
+    arguments of MailBackend.send, the number of failed delivery attempts and
+    the time of the next attempt. Files are written atomically, so an email
+    is either fully spooled or not at all.
+    """
+
+    def __init__(self, directory, backoff=300, max_backoff=6 * 60 * 60):
+        """Initialize the spool.
+
+        Args:
+            directory: Directory holding the spooled emails, created if needed
+            backoff: Seconds before retrying a failed email; doubled on every
+                further failure
+            max_backoff: Longest time in seconds between two attempts
+        """
+        self.directory = directory
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def add(self, message, now=None):
+        """Spool an email for delivery.
+
+        Bodies given as chunks are joined, as the spool stores them as text.
+
+        Args:
+            message: Dict with the keyword arguments of MailBackend.send
+            now: Time the email was spooled (default: current time)
+        """
+        now = time.time() if now is None else now
+        message = dict(message)
+        for key in ("html_body", "text_body"):
+            if not isinstance(message[key], str):
+                message[key] = "".join(message[key])
+        os.makedirs(self.directory, exist_ok=True)
+        # Names sort in the order the emails were spooled.
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex}.json"
+        self._write(
+            os.path.join(self.directory, name),
+            {"message": message, "attempts": 0, "next_attempt": now},
+        )
+
+    def due(self, now=None):
+        """Return the spooled emails to attempt now, oldest first.
+
+        Returns:
+            List of (path, record) tuples; record["message"] holds the email
+        """
+        now = time.time() if now is None else now
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return []
+
+        due = []
+        for name in names:
+            if name.startswith(".") or not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                logger.warning("Skipping unreadable spool file %s", path)
+                continue
+            if record["next_attempt"] <= now:
+                due.append((path, record))
+        return due
+
+    def delivered(self, path):
+        """Remove a delivered email from the spool."""
+        os.remove(path)
+        fsync_directory(self.directory)
+
+    def failed(self, path, record, now=None):
+        """Schedule the next attempt of an email that could not be delivered."""
+        now = time.time() if now is None else now
+        record["attempts"] += 1
+        backoff = self.backoff * 2 ** (record["attempts"] - 1)
+        record["next_attempt"] = now + min(backoff, self.max_backoff)
+        self._write(path, record)
+
+    def __len__(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        return sum(
+            1 for name in names if name.endswith(".json") and not name.startswith(".")
+        )
+
+    def _write(self, path, record):
+        with atomic_write(path) as f:
+            json.dump(record, f)
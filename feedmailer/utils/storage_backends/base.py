@@ -0,0 +1,112 @@
+import time
+from abc import ABC, abstractmethod
+
+
+class StorageBackend(ABC):
+    """Abstract base class for storage backends.
+
+    Links are recorded per feed with the time they were first and last seen
+    in that feed. A last seen time of None means the link was present when
+    the feed was last parsed; the feed's "parsed" time applies to it then.
+    Links without a feed (from status files written before links were
+    recorded per feed) are kept as "legacy" links until they show up in a
+    feed or the retention period has passed.
+
+    The links stored are the identity keys of the entries (see
+    feedmailer.utils.identity), or the entries' links themselves in status
+    files written before entries were keyed.
+    """
+
+    def __init__(self, path, retention=None):
+        """Initialize the backend.
+
+        Args:
+            path: Path of the status file
+            retention: Seconds to remember links that are no longer in their
+                feed, or None to remember them forever
+        """
+        self.path = path
+        self.retention = retention
+        # Per-feed state keyed by url, e.g. HTTP validators for conditional GETs.
+        self.feeds = {}
+
+    @abstractmethod
+    def load(self):
+        """Load the feed state and return the seen links.
+
+        Returns:
+            A container of seen links that supports the `in` operator
+        """
+        pass
+
+    @abstractmethod
+    def save(self, seen_links):
+        """Replace the stored seen links and write the feed state.
+
+        Args:
+            seen_links: All links that have been seen, not attributed to a feed
+        """
+        pass
+
+    @abstractmethod
+    def commit(self, observed=None, now=None, renamed=None):
+        """Record the links present in freshly parsed feeds and write the state.
+
+        Args:
+            observed: Mapping of feed url to all links currently in that feed
+            now: Timestamp of the observation (default: current time)
+            renamed: Mapping of feed url to {old link: new link} of links to
+                store under a new name, keeping their first seen time
+        """
+        pass
+
+    def close(self):  # noqa: B027
+        """Release resources held by the backend."""
+        pass
+
+    def _now(self, now):
+        return time.time() if now is None else now
+
+    def _cutoff(self, now):
+        """Links last seen before the returned time are forgotten."""
+        return None if self.retention is None else now - self.retention
+
+    def _diff_links(self, records, links):
+        """Compare stored records of a feed with the links now in it.
+
+        Args:
+            records: Mapping of link to its last seen time (None if present)
+            links: All links currently in the feed
+
+        Returns:
+            Tuple of (added, reappeared, dropped) link lists
+        """
+        present = set(links)
+        added = [link for link in present if link not in records]
+        reappeared = [
+            link for link in present if link in records and records[link] is not None
+        ]
+        dropped = [
+            link
+            for link, last_seen in records.items()
+            if last_seen is None and link not in present
+        ]
+        return added, reappeared, dropped
+
+    def _stale_feeds(self, cutoff):
+        """Urls of feeds that have not been polled within the retention period.
+
+        A feed counts as polled when it was parsed, and when it was contacted
+        without its links being observed here (unchanged, backing off after
+        failures, or parsed for other status files only).
+        """
+        stale = []
+        for url, state in self.feeds.items():
+            polled = [
+                state[key]
+                for key in ("parsed", "contacted")
+                if state.get(key) is not None
+            ]
+            if polled and max(polled) < cutoff:
+                stale.append(url)
+        return stale
@@ -0,0 +1,265 @@
+import json
+import os
+from contextlib import suppress
+
+from feedmailer.utils.files import append_durably, atomic_write
+from feedmailer.utils.storage_backends.base import StorageBackend
+
+
+class JSONFileBackend(StorageBackend):
+    """Storage backend keeping all state in a single JSON file.
+
+    The file is replaced atomically on every write. With the journal enabled,
+    commits only append their changes to "<path>.journal", which is folded
+    into the file after compact_after commits. Every compaction starts a new
+    generation, recorded in the file and in each journal line, so a journal
+    left over from before the last compaction is never replayed.
+    """
+
+    def __init__(self, path, retention=None, journal=False, compact_after=50):
+        super().__init__(path, retention)
+        self.journal = journal
+        self.compact_after = compact_after
+        self.journal_path = f"{path}.journal"
+        # Union of all recorded and legacy links, handed out by load().
+        self.seen_links = set()
+        self.legacy_links = set()
+        self.legacy_since = None
+        self.generation = None
+        # Feed url -> {link: [first_seen, last_seen]}
+        self.links = {}
+
+        self._journal_entries = 0
+        self._needs_compaction = True
+        # Serialized feed state as last written, to journal only changed feeds.
+        self._written_feeds = {}
+        self._pending = self._no_changes()
+
+    def _no_changes(self):
+        return {"links": {}, "legacy_removed": [], "legacy_cleared": False}
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        self.feeds = data.get("feeds", {})
+        self.legacy_links = set(data.get("seen_links", []))
+        self.legacy_since = data.get("legacy_since")
+        self.generation = data.get("generation")
+        self.links = data.get("links", {})
+        self._needs_compaction = "links" not in data
+        self._pending = self._no_changes()
+
+        if "links" not in data and self.legacy_links:
+            # Status file from before links were recorded per feed. Drop the
+            # validators so every feed is parsed once and adopts its links.
+            self.legacy_since = self._now(None)
+            for state in self.feeds.values():
+                state.pop("etag", None)
+                state.pop("last_modified", None)
+
+        self._replay_journal()
+        self._written_feeds = self._serialize_feeds()
+        self._rebuild_seen()
+        return self.seen_links
+
+    def _replay_journal(self):
+        """Apply the changes journaled since the file was last compacted.
+
+        A partial line ends the replay, and lines of an earlier generation are
+        skipped; either way the next write compacts, so nothing is appended to
+        a journal that can't be read back.
+        """
+        self._journal_entries = 0
+        try:
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        changes = json.loads(line)
+                    except json.JSONDecodeError:
+                        changes = None
+                    if changes is None or not line.endswith("\n"):
+                        # Partial line of a write that was interrupted.
+                        self._needs_compaction = True
+                        break
+                    if changes.get("generation") != self.generation:
+                        # Left over from before the last compaction.
+                        self._needs_compaction = True
+                        continue
+                    self._apply(changes)
+                    self._journal_entries += 1
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, changes):
+        for url, records in changes["links"].items():
+            feed_links = self.links.setdefault(url, {})
+            for link, record in records.items():
+                if record is None:
+                    feed_links.pop(link, None)
+                else:
+                    feed_links[link] = record
+        for url, state in changes["feeds"].items():
+            if state is None:
+                self.feeds.pop(url, None)
+                self.links.pop(url, None)
+            else:
+                self.feeds[url] = state
+        self.legacy_links.difference_update(changes["legacy_removed"])
+        if changes["legacy_cleared"]:
+            self.legacy_links = set()
+            self.legacy_since = None
+
+    def _rebuild_seen(self):
+        """Refresh the seen set in place, so references handed out stay valid."""
+        self.seen_links.clear()
+        self.seen_links.update(self.legacy_links)
+        for records in self.links.values():
+            self.seen_links.update(records)
+
+    def _serialize_feeds(self):
+        return {url: json.dumps(state) for url, state in self.feeds.items()}
+
+    def _compact(self):
+        """Write all state to the file and discard the journal."""
+        generation = (self.generation or 0) + 1
+        with atomic_write(self.path) as f:
+            json.dump(
+                {
+                    "seen_links": list(self.legacy_links),
+                    "legacy_since": self.legacy_since,
+                    "feeds": self.feeds,
+                    "links": self.links,
+                    "generation": generation,
+                },
+                f,
+            )
+        self.generation = generation
+        with suppress(FileNotFoundError):
+            os.remove(self.journal_path)
+        self._journal_entries = 0
+        self._needs_compaction = False
+        self._written_feeds = self._serialize_feeds()
+
+    def _append_journal(self):
+        """Append the changes since the last write to the journal."""
+        current = self._serialize_feeds()
+        feeds = {
+            url: self.feeds[url]
+            for url, state in current.items()
+            if self._written_feeds.get(url) != state
+        }
+        feeds.update({url: None for url in self._written_feeds if url not in current})
+        changes = {**self._pending, "feeds": feeds, "generation": self.generation}
+        append_durably(self.journal_path, json.dumps(changes) + "\n")
+        self._journal_entries += 1
+        self._written_feeds = current
+
+    def _write(self):
+        if (
+            not self.journal
+            or self._needs_compaction
+            or self._journal_entries >= self.compact_after
+        ):
+            self._compact()
+        else:
+            self._append_journal()
+        self._pending = self._no_changes()
+
+    def save(self, seen_links):
+        self.legacy_links = set(seen_links)
+        self.legacy_since = self._now(None) if self.legacy_links else None
+        self.links = {}
+        self._rebuild_seen()
+        self._compact()
+        self._pending = self._no_changes()
+
+    def _record(self, url, link, record):
+        self._pending["links"].setdefault(url, {})[link] = record
+
+    def _rename(self, url, names):
+        records = self.links.setdefault(url, {})
+        for old, new in names.items():
+            if old in records:
+                record = records.pop(old)
+                self._record(url, old, None)
+                if new not in records:
+                    records[new] = record
+                    self._record(url, new, record)
+            if old in self.legacy_links:
+                self.legacy_links.discard(old)
+                self._pending["legacy_removed"].append(old)
+            # The old name stays in the seen set until the next load.
+            self.seen_links.add(new)
+
+    def _observe(self, url, links, now):
+        records = self.links.setdefault(url, {})
+        state = self.feeds.setdefault(url, {})
+        added, reappeared, dropped = self._diff_links(
+            {link: record[1] for link, record in records.items()}, links
+        )
+        for link in added:
+            records[link] = [now, None]
+        for link in reappeared:
+            records[link][1] = None
+        for link in dropped:
+            records[link][1] = state.get("parsed", now)
+        for link in added + reappeared + dropped:
+            self._record(url, link, records[link])
+        self.seen_links.update(added)
+
+        adopted = self.legacy_links.intersection(added)
+        self.legacy_links.difference_update(adopted)
+        self._pending["legacy_removed"].extend(adopted)
+        state["parsed"] = now
+
+    def _prune(self, now):
+        """Forget links and feeds past the retention period.
+
+        Returns:
+            The forgotten links, or None if the seen set must be rebuilt
+        """
+        cutoff = self._cutoff(now)
+        if cutoff is None:
+            return []
+
+        forgotten = []
+        stale_feeds = self._stale_feeds(cutoff)
+        for url in stale_feeds:
+            del self.feeds[url]
+            self.links.pop(url, None)
+            self._pending["links"].pop(url, None)
+        for url, records in self.links.items():
+            for link in [
+                link
+                for link, (_first_seen, last_seen) in records.items()
+                if last_seen is not None and last_seen < cutoff
+            ]:
+                del records[link]
+                self._record(url, link, None)
+                forgotten.append(link)
+        if self.legacy_since is not None and self.legacy_since < cutoff:
+            self.legacy_links = set()
+            self.legacy_since = None
+            self._pending["legacy_cleared"] = True
+            return None
+        return None if stale_feeds else forgotten
+
+    def commit(self, observed=None, now=None, renamed=None):
+        now = self._now(now)
+        for url, names in (renamed or {}).items():
+            self._rename(url, names)
+        for url, links in (observed or {}).items():
+            self._observe(url, links, now)
+
+        forgotten = self._prune(now)
+        if forgotten is None:
+            self._rebuild_seen()
+        for link in forgotten or ():
+            if link not in self.legacy_links and not any(
+                link in records for records in self.links.values()
+            ):
+                self.seen_links.discard(link)
+        self._write()
@@ -0,0 +1,350 @@
+import json
+import os
+import shutil
+import sqlite3
+import uuid
+from contextlib import suppress
+
+from feedmailer.utils.bloom import BloomFilter
+from feedmailer.utils.storage_backends.base import StorageBackend
+from feedmailer.utils.storage_backends.json_file import JSONFileBackend
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Smallest number of links a Bloom filter is built for.
+MIN_BLOOM_CAPACITY = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_links (link TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS links (
+    feed TEXT NOT NULL,
+    link TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL,
+    PRIMARY KEY (feed, link)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS links_link ON links (link);
+CREATE TABLE IF NOT EXISTS feeds (url TEXT PRIMARY KEY, state TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class SeenLinks:
+    """Set-like view on the stored links, answered by indexed lookups.
+
+    With a Bloom filter, links it has certainly not seen are answered
+    without querying the database.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.connection = backend.connection
+
+    def __contains__(self, link):
+        bloom = self.backend.bloom
+        if bloom is not None and link not in bloom:
+            return False
+        row = self.connection.execute(
+            "SELECT 1 FROM links WHERE link = ? "
+            "UNION ALL SELECT 1 FROM seen_links WHERE link = ? LIMIT 1",
+            (link, link),
+        ).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        for (link,) in self.connection.execute(
+            "SELECT link FROM links UNION SELECT link FROM seen_links"
+        ):
+            yield link
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM (SELECT link FROM links UNION SELECT link FROM seen_links)"
+        ).fetchone()[0]
+
+
+class SQLiteBackend(StorageBackend):
+    """Storage backend using a SQLite database with incremental writes.
+
+    A JSON status file found at the database path is converted in place; the
+    original file is kept next to it with a ".json.bak" suffix.
+
+    With bloom, the stored links are also added to a Bloom filter in
+    "<path>.bloom", which answers most lookups of new links. Links are added
+    to the filter before they are committed, so it never misses one; a
+    random token in the database and in the filter ties them together, and
+    the filter is rebuilt from the database when they differ or when it has
+    filled up.
+    """
+
+    def __init__(self, path, retention=None, bloom=False):
+        super().__init__(path, retention)
+        self.connection = None
+        self.use_bloom = bloom
+        self.bloom = None
+        self.bloom_path = f"{path}.bloom"
+        # Serialized feed state as last written, to only write changed feeds.
+        self._written_feeds = {}
+
+    def _is_json_status(self):
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(len(SQLITE_HEADER))
+        except FileNotFoundError:
+            return False
+        return bool(header) and header != SQLITE_HEADER
+
+    def _connect(self):
+        if self.connection is None:
+            if self._is_json_status():
+                self._migrate()
+
+            self.connection = sqlite3.connect(self.path)
+            had_links = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'links'"
+            ).fetchone()
+            self.connection.executescript(SCHEMA)
+
+            if not had_links and self._count("seen_links"):
+                self._start_legacy_period()
+
+            if self.use_bloom:
+                self._open_bloom()
+            elif self._get_meta("bloom_token") is not None:
+                # The filter would miss the links committed without it.
+                with self.connection:
+                    self.connection.execute(
+                        "DELETE FROM meta WHERE key = 'bloom_token'"
+                    )
+        return self.connection
+
+    def _open_bloom(self):
+        token = self._get_meta("bloom_token")
+        try:
+            self.bloom = BloomFilter(self.bloom_path)
+        except (OSError, ValueError):
+            self._rebuild_bloom()
+            return
+        if self.bloom.token.hex() != token or self.bloom.count > self.bloom.capacity:
+            self._rebuild_bloom()
+
+    def _rebuild_bloom(self):
+        """Build a new Bloom filter of all stored links."""
+        if self.bloom is not None:
+            self.bloom.close()
+        links = self.connection.execute(
+            "SELECT COUNT(*) FROM (SELECT link FROM links UNION SELECT link FROM seen_links)"
+        ).fetchone()[0]
+        token = uuid.uuid4().bytes
+        path = f"{self.bloom_path}.tmp"
+        bloom = BloomFilter.create(path, max(2 * links, MIN_BLOOM_CAPACITY), token)
+        for (link,) in self.connection.execute(
+            "SELECT link FROM links UNION SELECT link FROM seen_links"
+        ):
+            bloom.add(link)
+        bloom.flush()
+        bloom.close()
+        os.replace(path, self.bloom_path)
+        self.bloom = BloomFilter(self.bloom_path)
+        with self.connection:
+            self._set_meta("bloom_token", token.hex())
+
+    def _add_to_bloom(self, links):
+        """Add links to the Bloom filter before they are committed."""
+        if self.bloom is None:
+            return
+        for link in links:
+            self.bloom.add(link)
+        self.bloom.flush()
+
+    def _count(self, table):
+        return self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def _start_legacy_period(self):
+        """Treat links stored without a feed as legacy links.
+
+        The validators are dropped so every feed is parsed once and adopts
+        its links.
+        """
+        with self.connection:
+            self._set_meta("legacy_since", self._now(None))
+            for url, state in self.connection.execute(
+                "SELECT url, state FROM feeds"
+            ).fetchall():
+                state = json.loads(state)
+                state.pop("etag", None)
+                state.pop("last_modified", None)
+                self.connection.execute(
+                    "UPDATE feeds SET state = ? WHERE url = ?", (json.dumps(state), url)
+                )
+
+    def _migrate(self):
+        """Convert the JSON status file at the database path.
+
+        The database is built next to it and only replaces it once complete,
+        so an interrupted conversion is started over by the next run.
+        """
+        legacy = JSONFileBackend(self.path)
+        legacy.load()
+        temp_path = f"{self.path}.tmp"
+        with suppress(FileNotFoundError):
+            os.remove(temp_path)
+
+        self.connection = sqlite3.connect(temp_path)
+        try:
+            self.connection.executescript(SCHEMA)
+            self._import(legacy)
+        finally:
+            self.connection.close()
+            self.connection = None
+        shutil.copy2(self.path, self.path + ".json.bak")
+        os.replace(temp_path, self.path)
+
+    def _import(self, legacy):
+        """Copy all state of a JSON file backend into the database."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO seen_links (link) VALUES (?)",
+                ((link,) for link in legacy.legacy_links),
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO links VALUES (?, ?, ?, ?)",
+                (
+                    (url, link, first_seen, last_seen)
+                    for url, records in legacy.links.items()
+                    for link, (first_seen, last_seen) in records.items()
+                ),
+            )
+            self.feeds = legacy.feeds
+            self._write_feeds()
+            self._set_meta("legacy_since", legacy.legacy_since)
+
+    def _get_meta(self, key):
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _set_meta(self, key, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value)),
+        )
+
+    def load(self):
+        connection = self._connect()
+        rows = connection.execute("SELECT url, state FROM feeds").fetchall()
+        self._written_feeds = dict(rows)
+        self.feeds = {url: json.loads(state) for url, state in rows}
+        return SeenLinks(self)
+
+    def _write_feeds(self):
+        """Write the state of feeds that changed since the last write."""
+        current = {url: json.dumps(state) for url, state in self.feeds.items()}
+        changed = [
+            (url, state)
+            for url, state in current.items()
+            if self._written_feeds.get(url) != state
+        ]
+        removed = [(url,) for url in self._written_feeds if url not in current]
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO feeds (url, state) VALUES (?, ?)", changed
+        )
+        self.connection.executemany("DELETE FROM feeds WHERE url = ?", removed)
+        self._written_feeds = current
+
+    def save(self, seen_links):
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM links")
+            connection.execute("DELETE FROM seen_links")
+            connection.executemany(
+                "INSERT OR IGNORE INTO seen_links (link) VALUES (?)",
+                ((link,) for link in seen_links),
+            )
+            self._set_meta("legacy_since", self._now(None) if seen_links else None)
+            self._write_feeds()
+        if self.bloom is not None:
+            self._rebuild_bloom()
+
+    def _rename(self, url, names):
+        self.connection.executemany(
+            "UPDATE OR IGNORE links SET link = ? WHERE feed = ? AND link = ?",
+            ((new, url, old) for old, new in names.items()),
+        )
+        # Left over where the new name was already stored.
+        self.connection.executemany(
+            "DELETE FROM links WHERE feed = ? AND link = ?",
+            ((url, old) for old in names),
+        )
+        self.connection.executemany(
+            "DELETE FROM seen_links WHERE link = ?", ((old,) for old in names)
+        )
+
+    def _observe(self, url, links, now):
+        state = self.feeds.setdefault(url, {})
+        records = dict(
+            self.connection.execute(
+                "SELECT link, last_seen FROM links WHERE feed = ?", (url,)
+            )
+        )
+        added, reappeared, dropped = self._diff_links(records, links)
+        self.connection.executemany(
+            "INSERT INTO links VALUES (?, ?, ?, NULL)",
+            ((url, link, now) for link in added),
+        )
+        self.connection.executemany(
+            "DELETE FROM seen_links WHERE link = ?", ((link,) for link in added)
+        )
+        self.connection.executemany(
+            "UPDATE links SET last_seen = NULL WHERE feed = ? AND link = ?",
+            ((url, link) for link in reappeared),
+        )
+        self.connection.executemany(
+            "UPDATE links SET last_seen = ? WHERE feed = ? AND link = ?",
+            ((state.get("parsed", now), url, link) for link in dropped),
+        )
+        state["parsed"] = now
+
+    def _prune(self, now):
+        cutoff = self._cutoff(now)
+        if cutoff is None:
+            return
+
+        for url in self._stale_feeds(cutoff):
+            del self.feeds[url]
+            self.connection.execute("DELETE FROM links WHERE feed = ?", (url,))
+        self.connection.execute(
+            "DELETE FROM links WHERE last_seen IS NOT NULL AND last_seen < ?",
+            (cutoff,),
+        )
+        legacy_since = self._get_meta("legacy_since")
+        if legacy_since is not None and legacy_since < cutoff:
+            self.connection.execute("DELETE FROM seen_links")
+            self._set_meta("legacy_since", None)
+
+    def commit(self, observed=None, now=None, renamed=None):
+        """Record the changes of the observed feeds in a single transaction."""
+        connection = self._connect()
+        now = self._now(now)
+        self._add_to_bloom(
+            [link for links in (observed or {}).values() for link in links]
+            + [new for names in (renamed or {}).values() for new in names.values()]
+        )
+        with connection:
+            for url, names in (renamed or {}).items():
+                self._rename(url, names)
+            for url, links in (observed or {}).items():
+                self._observe(url, links, now)
+            self._prune(now)
+            self._write_feeds()
+        if self.bloom is not None and self.bloom.count > self.bloom.capacity:
+            self._rebuild_bloom()
+
+    def close(self):
+        if self.bloom is not None:
+            self.bloom.close()
+            self.bloom = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None